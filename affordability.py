@@ -0,0 +1,78 @@
+"""Vectorized EMI / affordability maths.
+
+All functions broadcast over NumPy arrays, so a whole grid of amounts,
+tenures and rates is priced in one call. Rates are annual percentages,
+tenures are in months.
+"""
+import numpy as np
+
+DEFAULT_RATE = 11.0
+EMI_INCOME_RATIO = 0.5  # EMI may use up to 50% of income minus existing EMIs
+
+
+def emi_factor(months, rate=DEFAULT_RATE):
+    """EMI per unit of principal: r(1+r)^n / ((1+r)^n - 1). Zero-rate safe."""
+    months = np.asarray(months, dtype=float)
+    r = np.asarray(rate, dtype=float) / 100 / 12
+    growth = np.power(1 + r, months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(r == 0, 1 / months, r * growth / (growth - 1))
+    return np.where(months > 0, factor, 0.0)
+
+
+def emi(principal, months, rate=DEFAULT_RATE):
+    """EMI for (broadcast) principal/months/rate arrays."""
+    return np.asarray(principal, dtype=float) * emi_factor(months, rate)
+
+
+def emi_grid(amounts, tenures, rates=(DEFAULT_RATE,)):
+    """EMIs for every combination; result shape is (amounts, tenures, rates)."""
+    a = np.asarray(amounts, dtype=float)[:, None, None]
+    t = np.asarray(tenures, dtype=float)[None, :, None]
+    r = np.asarray(rates, dtype=float)[None, None, :]
+    return emi(a, t, r)
+
+
+def allowed_emi(income, existing_emi=0.0, ratio=EMI_INCOME_RATIO):
+    """EMI headroom: ratio * income - existing EMIs, floored at zero."""
+    return np.maximum(0.0, ratio * np.asarray(income, dtype=float) - np.asarray(existing_emi, dtype=float))
+
+
+def max_principal(income, existing_emi, tenures, rate=DEFAULT_RATE, ratio=EMI_INCOME_RATIO):
+    """Largest principal whose EMI fits the headroom, for each tenure.
+
+    ``income``/``existing_emi`` may be arrays (one per customer); the result
+    then has shape (customers, tenures).
+    """
+    headroom = allowed_emi(income, existing_emi, ratio)[..., None]
+    factor = emi_factor(np.asarray(tenures, dtype=float), rate)
+    with np.errstate(divide="ignore"):
+        return np.where(factor > 0, headroom / factor, 0.0)
+
+
+def max_eligible_loan(income, existing_emi, months, rate=DEFAULT_RATE):
+    """Scalar convenience wrapper used by the chatbot."""
+    return float(max_principal(income, existing_emi, [months], rate).ravel()[0])
+
+
+def amortization_schedule(principal, months, rate=DEFAULT_RATE):
+    """Month-by-month schedule as arrays: month, emi, interest, principal, balance."""
+    months = int(months)
+    r = rate / 100 / 12
+    k = np.arange(1, months + 1, dtype=float)
+    payment = float(emi(principal, months, rate))
+    if r == 0:
+        balance = principal - payment * k
+    else:
+        growth = np.power(1 + r, k)
+        balance = principal * growth - payment * (growth - 1) / r
+    balance = np.maximum(balance, 0.0)
+    opening = np.concatenate(([float(principal)], balance[:-1]))
+    interest = opening * r
+    return {
+        "month": k.astype(int),
+        "emi": np.full(months, payment),
+        "interest": interest,
+        "principal": payment - interest,
+        "balance": balance,
+    }
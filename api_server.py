@@ -0,0 +1,317 @@
+"""Headless asyncio JSON API for the chatbot (backs web/index.html).
+
+    python api_server.py --port 8080     # then open http://localhost:8080/
+
+Endpoints (JSON in/out unless noted):
+
+    POST /api/signup    {name, password, income, age, employment} -> {customer_id}
+    POST /api/login     {customer_id, password} -> {session_id, reply, ...}
+    POST /api/chat      {session_id, message, submission_id?} -> {reply, state, awaiting_upload, sanction}
+    POST /api/upload?session_id=..&filename=..   raw file body -> same as /api/chat
+    GET  /api/sanction?session_id=..   PDF (200), {"status": "pending"} (202) or 404
+    POST /api/logout    {session_id}
+    GET  /metrics       Prometheus text (enable with BFSI_METRICS=1)
+
+Blocking work (store I/O, salary extraction, PDF rendering) runs on a thread
+pool; the event loop only parses HTTP and shuttles bytes. Conversations live
+in a server-side pool of MasterAgents and, when SESSION_STORE points at a
+shared file/sqlite store, are saved after every turn so another worker can
+pick them up.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from config import get_settings
+from chatbot import MasterAgent, create_customer, get_customer_by_cid
+from salary_extract import MAX_UPLOAD_BYTES
+from session_store import decode_session, encode_session, open_session_store
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web")
+MAX_HEADER_BYTES = 16 * 1024
+MAX_JSON_BYTES = 64 * 1024
+READ_CHUNK = 64 * 1024
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ------------------ Sessions ------------------
+class _Session:
+    __slots__ = ("agent", "history", "lock")
+
+    def __init__(self, agent, history):
+        self.agent = agent
+        self.history = history
+        self.lock = asyncio.Lock()  # one turn at a time per conversation
+
+
+class SessionPool:
+    """Live agents for this worker (LRU-capped), backed by a session store."""
+
+    def __init__(self, store, max_live=5_000):
+        self.store = store
+        self.max_live = max_live
+        self._live = OrderedDict()
+
+    def create(self, agent, history):
+        sid = uuid.uuid4().hex
+        agent.session_id = sid
+        self._live[sid] = _Session(agent, history)
+        self._trim()
+        return sid
+
+    def live(self, sid):
+        session = self._live.get(sid)
+        if session is not None:
+            self._live.move_to_end(sid)
+        return session
+
+    def load(self, sid):
+        """Blocking: fetch a conversation from the store (runs on the executor)."""
+        blob = self.store.get(sid) if sid else None
+        if blob is None:
+            raise HttpError(401, "Unknown or expired session")
+        agent_blob, history = decode_session(blob)
+        return _Session(MasterAgent.from_bytes(agent_blob, sid), history)
+
+    def adopt(self, sid, session):
+        # another request may have loaded it meanwhile; keep the first
+        session = self._live.setdefault(sid, session)
+        self._trim()
+        return session
+
+    def save(self, sid, session):
+        self.store.put(sid, encode_session(session.agent.to_bytes(), session.history))
+
+    def drop(self, sid):
+        self._live.pop(sid, None)
+        self.store.delete(sid)
+
+    def _trim(self):
+        while len(self._live) > self.max_live:
+            self._live.popitem(last=False)  # still in the store; reloaded on demand
+
+
+# ------------------ App ------------------
+class ChatApi:
+    def __init__(self, session_store="memory", workers=8):
+        self.pool = SessionPool(open_session_store(session_store))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    async def run_blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def session(self, sid):
+        session = self.pool.live(sid)
+        if session is None:
+            session = self.pool.adopt(sid, await self.run_blocking(self.pool.load, sid))
+        return session
+
+    def _turn_payload(self, session, reply):
+        agent = session.agent
+        status = agent.poll_sanction()
+        return {
+            "reply": reply,
+            "state": agent.state,
+            "awaiting_upload": agent.state == "await_salary_upload",
+            "sanction": "ready" if agent.last_sanction else status,
+        }
+
+    async def signup(self, body):
+        try:
+            args = (str(body["name"]), str(body["password"]), float(body.get("income") or 0),
+                    int(body.get("age") or 18), str(body.get("employment") or "Salaried"))
+        except (KeyError, TypeError, ValueError):
+            raise HttpError(400, "name, password, income, age, employment required")
+        if not args[0] or not args[1]:
+            raise HttpError(400, "Enter name and password")
+        return 200, {"customer_id": await self.run_blocking(create_customer, *args)}
+
+    async def login(self, body):
+        cid = str(body.get("customer_id", ""))
+        cust = await self.run_blocking(get_customer_by_cid, cid)
+        if not cust or cust["password"] != body.get("password"):
+            raise HttpError(401, "Invalid credentials")
+        agent = MasterAgent(cid)
+        greeting = await self.run_blocking(agent.start_chat)
+        sid = self.pool.create(agent, [("bot", greeting)])
+        session = self.pool.live(sid)
+        await self.run_blocking(self.pool.save, sid, session)
+        return 200, {"session_id": sid, "customer_id": cid, **self._turn_payload(session, greeting)}
+
+    async def chat(self, body):
+        sid = body.get("session_id")
+        message = str(body.get("message", "")).strip()
+        if not message:
+            raise HttpError(400, "message required")
+        session = await self.session(sid)
+        async with session.lock:
+            # a retry carrying the same submission_id gets the first reply back
+            reply = await self.run_blocking(session.agent.reply, message, body.get("submission_id"))
+            session.history += [("user", message), ("bot", reply)]
+            await self.run_blocking(self.pool.save, sid, session)
+            return 200, self._turn_payload(session, reply)
+
+    async def upload(self, query, file_bytes):
+        sid = query.get("session_id")
+        session = await self.session(sid)
+        async with session.lock:
+            reply = await self.run_blocking(session.agent.process_salary_upload, file_bytes, query.get("filename", ""))
+            session.history.append(("bot", reply))
+            await self.run_blocking(self.pool.save, sid, session)
+            return 200, self._turn_payload(session, reply)
+
+    async def sanction(self, query):
+        session = await self.session(query.get("session_id"))
+        status = session.agent.poll_sanction()
+        letter = await self.run_blocking(session.agent.sanction_letter)
+        if letter:
+            file_name, pdf_bytes = letter
+            return 200, (pdf_bytes, "application/pdf", {"Content-Disposition": f'attachment; filename="{file_name}"'})
+        if status == "pending":
+            return 202, {"status": "pending"}
+        raise HttpError(404, "No sanction letter available")
+
+    async def logout(self, body):
+        await self.run_blocking(self.pool.drop, body.get("session_id"))
+        return 200, {"ok": True}
+
+    # ---------- HTTP plumbing ----------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 413, {"error": "Headers too large"}, keep_alive=False)
+                    return
+                keep_alive = True
+                try:
+                    method, target, headers = _parse_head(head)
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload = await self.dispatch(method, target, headers, reader)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                    # body may be unread after 400/413; don't reuse the connection
+                    keep_alive = keep_alive and e.status not in (400, 413)
+                except Exception as e:  # keep the connection loop alive
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, reader):
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        length = int(headers.get("content-length") or 0)
+
+        if path == "/api/upload" and method == "POST":
+            return await self.upload(query, await _read_body(reader, length, MAX_UPLOAD_BYTES))
+        body = await _read_body(reader, length, MAX_JSON_BYTES)
+        if method == "GET":
+            if path == "/api/sanction":
+                return await self.sanction(query)
+            if path == "/metrics":
+                return 200, (metrics.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4", {})
+            return await self.run_blocking(_static, path)
+        if method != "POST":
+            raise HttpError(405, "Method not allowed")
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Invalid JSON")
+        route = {"/api/signup": self.signup, "/api/login": self.login,
+                 "/api/chat": self.chat, "/api/logout": self.logout}.get(path)
+        if route is None:
+            raise HttpError(404, "Not found")
+        return await route(data)
+
+    async def _send(self, writer, status, payload, keep_alive):
+        extra = {}
+        if isinstance(payload, tuple):
+            data, ctype, extra = payload
+        else:
+            data, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                f"Content-Type: {ctype}", f"Content-Length: {len(data)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{k}: {v}" for k, v in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+
+def _parse_head(head):
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "Bad request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    return method.upper(), target, headers
+
+
+async def _read_body(reader, length, limit):
+    if length > limit:
+        raise HttpError(413, f"Body larger than {limit} bytes")
+    body = bytearray()
+    while len(body) < length:
+        chunk = await reader.read(min(READ_CHUNK, length - len(body)))
+        if not chunk:
+            raise HttpError(400, "Truncated body")
+        body += chunk
+    return bytes(body)
+
+
+def _static(path):
+    name = "index.html" if path in ("/", "") else path.lstrip("/")
+    full = os.path.realpath(os.path.join(WEB_DIR, name))
+    if not full.startswith(os.path.realpath(WEB_DIR) + os.sep) or not os.path.isfile(full):
+        raise HttpError(404, "Not found")
+    with open(full, "rb") as f:
+        data = f.read()
+    return 200, (data, mimetypes.guess_type(full)[0] or "application/octet-stream", {})
+
+
+async def serve(host="127.0.0.1", port=8080, session_store="memory", workers=8):
+    api = ChatApi(session_store, workers)
+    server = await asyncio.start_server(api.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Chat API listening on http://{host}:{port}/", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the chatbot JSON API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--session-store", default=get_settings().session_store)
+    ap.add_argument("--workers", type=int, default=8, help="threads for blocking work")
+    args = ap.parse_args(argv)
+    asyncio.run(serve(args.host, args.port, args.session_store, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,24 @@
 # app.py (FIXED: Signup & Login show Customer ID; Go to Chat click; salary warning handled)
 import streamlit as st
-from chatbot import create_customer, get_customer_by_cid, MasterAgent
-import os
+from config import get_settings
+from chatbot import create_customer, get_store, MasterAgent
+from session_store import open_session_store, encode_session, decode_session, encode_history, decode_history, history_page_key
+import time
 
 st.set_page_config(page_title="Tata Loan Assistant", layout="centered")
 
+CHAT_WINDOW = 20   # messages rendered per page of the chat view
+HISTORY_CAP = 200  # messages kept in st.session_state; older ones are archived
+PAGE_SIZE = 100    # messages per archived history page
+
 # --- Init session state ---
 for key, default in {
     "logged_in": False,
     "show_signup": False,
     "agent": None,
     "chat_history": [],
-    "_last_processed_input": None,
-    "_last_input_time": 0.0,
+    "history_pages": 0,
+    "earlier_shown": 0,
     "processing": False,
     "awaiting_upload": False,
     "customer_id": None,
@@ -22,6 +28,79 @@ for key, default in {
     if key not in st.session_state:
         st.session_state[key] = default
 
+# ---------- Session store ----------
+# SESSION_STORE=memory | file:<dir> | sqlite:<path>; a shared file/sqlite store
+# lets any worker resume a conversation via the ?sid= query parameter
+@st.cache_resource
+def get_session_store():
+    return open_session_store(get_settings().session_store)
+
+@st.cache_resource
+def get_customer_store():
+    # One store per server process, shared by every session; its index is
+    # built here rather than during someone's first login
+    store = get_store()
+    len(store)
+    return store
+
+def spill_history(sid):
+    """Move the oldest turns past HISTORY_CAP into compressed pages in the session store."""
+    hist = st.session_state.chat_history
+    while len(hist) > HISTORY_CAP:
+        page = st.session_state.history_pages
+        get_session_store().put(history_page_key(sid, page), encode_history(hist[:PAGE_SIZE]))
+        st.session_state.history_pages = page + 1
+        del hist[:PAGE_SIZE]
+
+def visible_history():
+    """Last CHAT_WINDOW * (1 + earlier_shown) messages, reading archived pages
+    only when asked to. Returns (messages, more_available)."""
+    hist = st.session_state.chat_history
+    want = CHAT_WINDOW * (1 + st.session_state.earlier_shown)
+    if want <= len(hist):
+        return hist[-want:], want < len(hist) or st.session_state.history_pages > 0
+    extra = want - len(hist)
+    sid = st.query_params.get("sid")
+    older, page = [], st.session_state.history_pages - 1
+    while len(older) < extra and page >= 0 and sid:
+        blob = get_session_store().get(history_page_key(sid, page))
+        older = (decode_history(blob) if blob else []) + older
+        page -= 1
+    return older[-extra:] + hist, page >= 0 or len(older) > extra
+
+def save_session():
+    sid = st.query_params.get("sid")
+    agent = st.session_state.agent
+    if sid and agent is not None:
+        spill_history(sid)
+        get_session_store().put(sid, encode_session(agent.to_bytes(), st.session_state.chat_history))
+
+def delete_session(sid):
+    store = get_session_store()
+    for page in range(st.session_state.history_pages):
+        store.delete(history_page_key(sid, page))
+    store.delete(sid)
+
+def restore_session():
+    sid = st.query_params.get("sid")
+    if not sid or st.session_state.logged_in:
+        return
+    blob = get_session_store().get(sid)
+    if blob is None:
+        return
+    agent_blob, history = decode_session(blob)
+    agent = MasterAgent.from_bytes(agent_blob, sid)
+    pages = 0
+    while get_session_store().get(history_page_key(sid, pages)) is not None:
+        pages += 1
+    st.session_state.agent = agent
+    st.session_state.chat_history = history
+    st.session_state.history_pages = pages
+    st.session_state.earlier_shown = 0
+    st.session_state.customer_id = agent.cid
+    st.session_state.awaiting_upload = agent.state == "await_salary_upload"
+    st.session_state.logged_in = True
+
 # ---------- Helpers ----------
 def header():
     st.markdown("## 🏦 Tata Capital Loan Assistant")
@@ -47,16 +126,19 @@ def login_page():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Login"):
-            cust = get_customer_by_cid(cid)
+            cust = get_customer_store().get(cid)
             if cust and cust["password"] == pwd:
                 st.session_state.logged_in = True
                 st.session_state.customer_id = cid
                 st.session_state.agent = MasterAgent(cid)
                 st.session_state.chat_history = [("bot", st.session_state.agent.start_chat())]
-                st.session_state._last_processed_input = None
+                st.session_state.history_pages = 0
+                st.session_state.earlier_shown = 0
                 st.session_state.processing = False
                 st.session_state.awaiting_upload = False
                 st.session_state.show_chat_button = True
+                st.query_params["sid"] = st.session_state.agent.session_id
+                save_session()
                 st.success(f"Logged in successfully! Customer ID: {cid}")
             else:
                 st.error("Invalid credentials")
@@ -101,25 +183,37 @@ def chat_page():
     st.markdown(f"**Logged in as Customer ID:** {st.session_state.customer_id}")
     agent = st.session_state.agent
 
-    # Show chat history
-    for sender, msg in st.session_state.chat_history:
+    # Show the most recent messages; older ones load a page at a time
+    messages, more = visible_history()
+    if more and st.button("⬆️ Load earlier messages"):
+        st.session_state.earlier_shown += 1
+        st.rerun()
+    for sender, msg in messages:
         if sender == "bot":
             st.chat_message("assistant").markdown(msg)
         else:
             st.chat_message("user").write(msg)
 
+    # Sanction letter is rendered in the background; poll until it is ready
+    sanction_status = agent.poll_sanction()
+    if sanction_status == "pending":
+        st.info("📄 Preparing your sanction letter…")
+    elif sanction_status == "failed":
+        st.error("Could not generate the sanction letter. Please contact support.")
+
     # PDF Download
-    if agent.last_sanction_path:
-        pdf_path = agent.last_sanction_path
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
+    letter = agent.sanction_letter()
+    if letter:
+        file_name, pdf_bytes = letter
         st.download_button(
             label="📄 Download Sanction Letter",
             data=pdf_bytes,
-            file_name=os.path.basename(pdf_path),
+            file_name=file_name,
             mime="application/pdf",
         )
-        agent.last_sanction_path = None
+        agent.last_sanction = None
+    if sanction_status in ("done", "failed"):
+        save_session()
 
     # Salary slip uploader
     if agent.state == "await_salary_upload":
@@ -147,12 +241,14 @@ def chat_page():
                     append_bot(reply)
 
             st.session_state.awaiting_upload = (agent.state == "await_salary_upload")
+            save_session()
             st.rerun()
 
         st.chat_input(disabled=True)
         if st.button("Cancel Upload"):
             st.session_state.awaiting_upload = False
             agent.state = "idle"
+            save_session()
             st.rerun()
         return
 
@@ -178,18 +274,30 @@ def chat_page():
                     append_bot(reply)
 
             st.session_state.processing = False
+            save_session()
             st.rerun()
 
     if st.button("Logout"):
+        if st.query_params.get("sid"):
+            delete_session(st.query_params["sid"])
+            del st.query_params["sid"]
         st.session_state.logged_in = False
         st.session_state.agent = None
         st.session_state.chat_history = []
+        st.session_state.history_pages = 0
+        st.session_state.earlier_shown = 0
         st.session_state.customer_id = None
         st.session_state.show_chat_button = False
         st.rerun()
 
+    if sanction_status == "pending":
+        time.sleep(0.5)
+        st.rerun()
+
 # ---------- Router ----------
 def main():
+    get_customer_store()
+    restore_session()
     if st.session_state.logged_in and not st.session_state.show_chat_button:
         chat_page()
     elif st.session_state.show_signup:
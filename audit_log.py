@@ -0,0 +1,225 @@
+"""Append-only event log of applications and loan decisions.
+
+One compact JSON record per line in daily segments::
+
+    <audit_dir>/events-20261017.jsonl
+    {"ts":1792223209.12,"ev":"decision","cid":"100004","app":"9f3c...","outcome":"rejected","reason":"emi",...}
+
+``ts``, ``ev`` and ``cid`` are always present; ``app`` (application ID) is
+present for events that belong to an application. Logging never blocks a
+reply: records are queued and a background writer appends whatever has
+accumulated as one write and one fsync (group commit). Call ``flush`` to wait
+for durability, e.g. before exit.
+
+Events:
+    customer_created  row            (customer row, password null)
+    profile_update    set            (CSV column -> new value)
+    application       amount, tenure, income, existing_emi, employment
+    decision          outcome (eligible | rejected | salary_required |
+                      manual_review | verified | sanctioned | cancelled), reason, emi, ...
+
+Offline:
+    python audit_log.py cat [--event decision] [--cid 100004] [--since 2026-10-01]
+    python audit_log.py stats
+    python audit_log.py replay --into rebuilt.csv   # rebuild the customer store
+"""
+import argparse
+import atexit
+import json
+import os
+import secrets
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import get_settings
+from customer_store import FIELDS, GroupCommitter, is_sqlite_path, migrate_csv_to_sqlite, open_store
+
+SEGMENT_PREFIX = "events-"
+LOCKED_PASSWORD = "!locked-"  # prefix of the random password given to replayed customers
+_PASSWORD = FIELDS.index("password")
+MAX_RETRY_ROWS = 100_000  # records kept in memory while the disk is failing
+
+
+def _segment_day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+
+class AuditLog:
+    def __init__(self, directory, max_batch=1000):
+        self.directory = directory
+        self._committer = GroupCommitter(self._write_batch, max_batch, name="audit-log-writer")
+        self._retry = []
+        self._made_dir = False
+
+    def log(self, event, cid, **fields):
+        """Queue one record; returns immediately."""
+        record = {"ts": round(time.time(), 3), "ev": event, "cid": str(cid)}
+        for k, v in fields.items():
+            if v is not None:
+                record[k] = round(v, 2) if isinstance(v, float) else v
+        self._committer.submit(record, wait=False)
+
+    def flush(self):
+        self._committer.flush()
+
+    def _write_batch(self, records):
+        records = self._retry + records
+        self._retry = []
+        by_day = {}
+        for rec in records:
+            by_day.setdefault(_segment_day(rec["ts"]), []).append(rec)
+        try:
+            if not self._made_dir:
+                os.makedirs(self.directory, exist_ok=True)
+                self._made_dir = True
+            for day, recs in by_day.items():
+                data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in recs).encode("utf-8")
+                with open(os.path.join(self.directory, f"{SEGMENT_PREFIX}{day}.jsonl"), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                del by_day[day][:]
+        except OSError as e:
+            # keep what was not written and try again with the next batch
+            self._retry = [r for recs in by_day.values() for r in recs][-MAX_RETRY_ROWS:]
+            print(f"audit log write failed ({e}); {len(self._retry)} records pending", file=sys.stderr)
+
+
+# ------------------ Reading ------------------
+def segments(directory):
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX) and n.endswith(".jsonl"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in names]
+
+
+def iter_events(directory, since=None, until=None, event=None, cid=None):
+    """Stream records oldest first, one segment and one line at a time.
+    ``since``/``until`` are epoch seconds; segments outside the range are skipped."""
+    first_day = _segment_day(since) if since is not None else None
+    last_day = _segment_day(until) if until is not None else None
+    for path in segments(directory):
+        day = os.path.basename(path)[len(SEGMENT_PREFIX):-len(".jsonl")]
+        if (first_day and day < first_day) or (last_day and day > last_day):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                if since is not None and rec["ts"] < since:
+                    continue
+                if until is not None and rec["ts"] >= until:
+                    continue
+                if (event and rec["ev"] != event) or (cid and rec["cid"] != cid):
+                    continue
+                yield rec
+
+
+def replay_customers(directory, store, since=None, batch_size=10_000):
+    """Apply customer_created / profile_update events (from ``since``) to a
+    store, e.g. a restored snapshot. Updates carry absolute values, so
+    replaying an overlapping range is harmless. Passwords are not logged, so
+    replayed customers get a random LOCKED_PASSWORD and need a reset before
+    they can log in. Returns (customers_added, updates_applied)."""
+    added, updated, batch, pending = 0, 0, [], set()
+
+    def write():
+        nonlocal added, batch
+        if batch:
+            store.add_many(batch)
+            added += len(batch)
+            batch = []
+            pending.clear()
+
+    for rec in iter_events(directory, since=since):
+        if rec["ev"] == "customer_created":
+            row = list(rec["row"])
+            if row[_PASSWORD] is None:
+                row[_PASSWORD] = LOCKED_PASSWORD + secrets.token_hex(16)
+            batch.append(row)
+            pending.add(rec["cid"])
+        elif rec["ev"] == "profile_update":
+            if rec["cid"] in pending:  # created in the batch not written yet
+                write()
+            store.update(rec["cid"], rec["set"])
+            updated += 1
+        if len(batch) >= batch_size:
+            write()
+    write()
+    return added, updated
+
+
+# ------------------ Process-wide log ------------------
+class _NullLog:
+    def log(self, event, cid, **fields):
+        pass
+
+    def flush(self):
+        pass
+
+
+_audit = None
+_audit_lock = threading.Lock()
+
+
+def get_audit_log():
+    """Log at the configured audit_dir (a no-op when it is set to empty)."""
+    global _audit
+    with _audit_lock:
+        if _audit is None:
+            directory = get_settings().audit_dir
+            _audit = AuditLog(directory) if directory else _NullLog()
+            atexit.register(_audit.flush)
+        return _audit
+
+
+def _day(text):
+    return datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() if text else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Read or replay the decision/audit log")
+    ap.add_argument("--dir", default=get_settings().audit_dir or "audit")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    cat = sub.add_parser("cat", help="print matching records as JSON lines")
+    cat.add_argument("--event")
+    cat.add_argument("--cid")
+    cat.add_argument("--since", help="YYYY-MM-DD (UTC)")
+    cat.add_argument("--until", help="YYYY-MM-DD (UTC, exclusive)")
+    sub.add_parser("stats", help="count events and decision outcomes")
+    replay = sub.add_parser("replay", help="rebuild a customer store from the log")
+    replay.add_argument("--into", required=True, help="new customer store (CSV or SQLite)")
+    replay.add_argument("--base", help="snapshot to start from (copied into --into first)")
+    replay.add_argument("--since", help="YYYY-MM-DD (UTC): only events from the snapshot date on")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "cat":
+        for rec in iter_events(args.dir, _day(args.since), _day(args.until), args.event, args.cid):
+            print(json.dumps(rec, separators=(",", ":")))
+    elif args.cmd == "stats":
+        counts = {}
+        for rec in iter_events(args.dir):
+            key = rec["ev"] + (f":{rec['outcome']}" if "outcome" in rec else "")
+            counts[key] = counts.get(key, 0) + 1
+        for key, n in sorted(counts.items()):
+            print(f"{key:<32}{n:>10}")
+    else:
+        if os.path.exists(args.into):
+            ap.error(f"{args.into} already exists")
+        if args.base and is_sqlite_path(args.into) and not is_sqlite_path(args.base):
+            migrate_csv_to_sqlite(args.base, args.into)
+        elif args.base:
+            shutil.copyfile(args.base, args.into)
+        store = open_store(args.into)
+        added, updated = replay_customers(args.dir, store, since=_day(args.since))
+        print(f"Rebuilt {args.into}: {added} customers, {updated} profile updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Bulk sanction-letter generation from a JSONL file of applications.
+
+Each input line is one application, e.g.::
+
+    {"application_id": "A-1", "cid": "100002", "loan_amount": 200000, "tenure": 24,
+     "id_number": "ABCDE1234F", "dob": "01-01-1999", "income": 51000, "employment": "Salaried"}
+
+``product`` (a product in flows.json, default the personal loan), ``rate`` and
+``emi`` are optional: missing ones are priced from the product's rate card
+(or ``--rate-card``) for the customer's employment, score and the amount, as
+in the chat. ``application_id`` defaults to the line number. Records are joined against the customer store,
+rendered in parallel across all cores and written in shards of
+``--shard-size`` letters, either as directories or as one zip per shard.
+A ``manifest.jsonl`` in the output directory records every letter written;
+re-running the same command skips applications already in the manifest, so a
+crashed run can simply be restarted.
+
+    python batch_sanctions.py applications.jsonl --out letters/ [--zip]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from config import get_settings
+from customer_store import open_store
+from dialogue_flow import get_flow
+from rate_card import get_rate_card
+from sanction_generator import render_sanction_pdf
+
+MANIFEST = "manifest.jsonl"
+
+
+def _price(rec, customer, amount, tenure, rate_card):
+    """(product label, rate, emi) for one record; rate and emi taken from the
+    record when given, otherwise quoted from the rate card."""
+    product = get_flow().product(rec.get("product"))
+    card = get_rate_card(rate_card or product.rate_card)
+    quote = card.quote(amount, tenure, rec.get("employment", customer["employment"]), customer["credit_score"])
+    rate = float(rec["rate"]) if rec.get("rate") is not None else quote["rate"]
+    if rec.get("emi") is not None:
+        emi = float(rec["emi"])
+    elif rate == quote["rate"]:
+        emi = quote["emi"]
+    else:
+        import affordability
+        emi = amount * float(affordability.emi_factor(tenure, rate))
+    return product.label, rate, emi
+
+
+def _render(job):
+    # Runs in a worker process
+    app_id, file_name, customer, kyc, amount, tenure, emi = job
+    return app_id, file_name, customer["cid"], render_sanction_pdf(customer, kyc, amount, tenure, emi)
+
+
+def read_manifest(out_dir):
+    """Application IDs already written, and the next free shard number."""
+    done, next_shard = set(), 0
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.isfile(path):
+        return done, next_shard
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            done.add(rec["application_id"])
+            next_shard = max(next_shard, rec["shard"] + 1)
+    return done, next_shard
+
+
+def iter_jobs(input_path, store, done, skipped, rate_card=None):
+    with open(input_path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            app_id = str(rec.get("application_id", lineno))
+            if app_id in done:
+                skipped["resumed"] += 1
+                continue
+            customer = store.get(rec["cid"])
+            if customer is None:
+                skipped["unknown_customer"] += 1
+                continue
+            amount = float(rec["loan_amount"])
+            tenure = int(rec["tenure"])
+            label, rate, emi = _price(rec, customer, amount, tenure, rate_card)
+            kyc = {
+                "id_number": rec.get("id_number", "N/A"),
+                "dob": rec.get("dob", "N/A"),
+                "income": float(rec.get("income", customer["income"])),
+                "employment": rec.get("employment", customer["employment"]),
+                "rate": rate,
+                "product_label": label,
+            }
+            safe_id = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in app_id)[:40]
+            file_name = f"sanction_{str(customer['cid'])[:10]}_{safe_id}.pdf"
+            yield app_id, file_name, customer, kyc, amount, tenure, emi
+
+
+def _ordered_results(pool, jobs, window):
+    """Like pool.map but keeps at most ``window`` jobs in flight, so the input
+    file is streamed instead of loaded up front."""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(_render, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class ShardWriter:
+    """Writes letters into numbered shards and appends to the manifest once
+    each letter (dir mode) or each closed zip (zip mode) is on disk."""
+
+    def __init__(self, out_dir, shard_size, use_zip, first_shard):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.use_zip = use_zip
+        self.shard = first_shard
+        self.count = 0
+        self._zip = None
+        self._pending = []
+        self._manifest = open(os.path.join(out_dir, MANIFEST), "a", encoding="utf-8")
+
+    def _shard_name(self):
+        return f"shard_{self.shard:05d}" + (".zip" if self.use_zip else "")
+
+    def _log(self, entries):
+        for entry in entries:
+            self._manifest.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+
+    def write(self, app_id, file_name, cid, pdf_bytes):
+        name = self._shard_name()
+        entry = {
+            "application_id": app_id, "cid": cid, "shard": self.shard,
+            "path": f"{name}/{file_name}", "bytes": len(pdf_bytes),
+            "sha256": hashlib.sha256(pdf_bytes).hexdigest(),
+        }
+        if self.use_zip:
+            if self._zip is None:
+                # An unfinished zip from a crashed run is simply overwritten
+                self._zip = zipfile.ZipFile(os.path.join(self.out_dir, name), "w", zipfile.ZIP_STORED)
+            self._zip.writestr(file_name, pdf_bytes)
+            self._pending.append(entry)
+        else:
+            shard_dir = os.path.join(self.out_dir, name)
+            os.makedirs(shard_dir, exist_ok=True)
+            path = os.path.join(shard_dir, file_name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(path + ".tmp", path)
+            self._log([entry])
+        self.count += 1
+        if self.count % self.shard_size == 0:
+            self._close_shard()
+
+    def _close_shard(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            self._log(self._pending)
+            self._pending = []
+        self.shard += 1
+
+    def close(self):
+        if self.count % self.shard_size:
+            self._close_shard()
+        self._manifest.close()
+
+
+def run(input_path, out_dir, customers, use_zip=False, shard_size=1000,
+        workers=None, rate_card=None, report_every=1000):
+    os.makedirs(out_dir, exist_ok=True)
+    store = open_store(customers)
+    done, first_shard = read_manifest(out_dir)
+    skipped = {"resumed": 0, "unknown_customer": 0}
+    writer = ShardWriter(out_dir, shard_size, use_zip, first_shard)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = iter_jobs(input_path, store, done, skipped, rate_card)
+            for result in _ordered_results(pool, jobs, window=workers * 8):
+                writer.write(*result)
+                if writer.count % report_every == 0:
+                    _report(writer.count, start)
+    finally:
+        writer.close()
+    elapsed = _report(writer.count, start)
+    print(f"Skipped: {skipped['resumed']} already done, {skipped['unknown_customer']} unknown customer")
+    return {"written": writer.count, "elapsed": elapsed, **skipped}
+
+
+def _report(count, start):
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"{count} letters in {elapsed:.1f}s ({rate:.1f}/s, {rate * 3600:,.0f}/hour)", flush=True)
+    return elapsed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate sanction letters in bulk from JSONL")
+    ap.add_argument("input", help="JSONL file of applications")
+    ap.add_argument("--out", required=True, help="output directory (shards + manifest.jsonl)")
+    ap.add_argument("--customers", default=get_settings().customer_file, help="customer store (CSV or SQLite)")
+    ap.add_argument("--zip", action="store_true", help="write one zip per shard instead of directories")
+    ap.add_argument("--shard-size", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=None, help="default: all cores")
+    ap.add_argument("--rate-card", default=None,
+                    help="price records without a rate from this card (default: each product's card)")
+    args = ap.parse_args(argv)
+    run(args.input, args.out, args.customers, args.zip, args.shard_size, args.workers, args.rate_card)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
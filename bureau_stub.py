@@ -0,0 +1,148 @@
+"""Local stand-in credit bureau, for tests and benchmarks.
+
+Speaks the bulk protocol of credit_bureau.py over HTTP/1.1 keep-alive. Seeded
+from a customer store it serves that store's credit_score column (other IDs
+are unknown); unseeded, every ID gets a deterministic score.
+
+    python bureau_stub.py serve --port 8765 [--customers customers.csv] [--latency-ms 20]
+    python bureau_stub.py bench [--url http://127.0.0.1:8765] --lookups 2000 --concurrency 16
+
+``bench`` compares a new connection per lookup, the pooled client with
+concurrent single lookups (coalesced into bulk requests), and one bulk call.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from credit_bureau import SCORES_PATH, BureauClient
+
+
+def stub_score(cid):
+    """Deterministic 550-900 score for IDs the stub was not seeded with."""
+    return 550 + int.from_bytes(hashlib.sha256(str(cid).encode()).digest()[:4], "big") % 351
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # header and body go out as separate writes
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.rstrip("/") != SCORES_PATH:
+            return self._send(404, {"error": "not found"})
+        if server.latency:
+            time.sleep(server.latency)
+        try:
+            ids = [str(c) for c in json.loads(body)["ids"]]
+        except (ValueError, KeyError, TypeError):
+            return self._send(400, {"error": "expected {\"ids\": [...]}"})
+        known = server.scores
+        scores = {c: known[c] for c in ids if c in known} if known else {c: stub_score(c) for c in ids}
+        server.requests += 1
+        self._send(200, {"scores": scores})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # benchmarks open many connections at once
+
+
+def start_stub(host="127.0.0.1", port=0, scores=None, latency_ms=0.0):
+    """Run the stand-in bureau on a background thread; returns (server, url).
+    ``scores`` (cid -> score) limits it to known customers; without it every
+    ID gets a deterministic score."""
+    server = _StubServer((host, port), _StubHandler)
+    server.scores = {str(k): int(v) for k, v in (scores or {}).items()}
+    server.latency = latency_ms / 1000
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, name="bureau-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def scores_from_store(path):
+    """cid -> credit_score from a customer store, to seed the stub."""
+    from preapproval import iter_chunks
+    scores = {}
+    for cid, _, _, score, _ in iter_chunks(path):
+        scores.update(zip((str(c) for c in cid.tolist()), score.tolist()))
+    return scores
+
+
+def _bench(url, lookups, concurrency):
+    ids = [str(100000 + i) for i in range(lookups)]
+
+    def unpooled(cid):
+        parts = urlsplit(url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+        conn.request("POST", SCORES_PATH, json.dumps({"ids": [cid]}), {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        conn.close()
+
+    results = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(unpooled, ids))
+        results["new connection per lookup"] = time.perf_counter() - start
+        client = BureauClient(url, ttl=0, pool_size=concurrency)
+        start = time.perf_counter()
+        list(pool.map(client.score, ids))
+        results["pooled, coalesced singles"] = time.perf_counter() - start
+    client = BureauClient(url, ttl=0, pool_size=concurrency)
+    start = time.perf_counter()
+    client.scores(ids)
+    results["bulk"] = time.perf_counter() - start
+    for name, secs in results.items():
+        print(f"{name:<28}{lookups / secs:>10.0f} lookups/s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stand-in credit bureau and client benchmark")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    serve = sub.add_parser("serve", help="run the stub bureau")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--customers", help="serve the credit_score column of this store (others are unknown)")
+    serve.add_argument("--latency-ms", type=float, default=0.0, help="added delay per request")
+    bench = sub.add_parser("bench", help="compare per-lookup connections, pooled and bulk lookups")
+    bench.add_argument("--url", help="bureau to hit (default: start a local stub)")
+    bench.add_argument("--lookups", type=int, default=2000)
+    bench.add_argument("--concurrency", type=int, default=16)
+    bench.add_argument("--latency-ms", type=float, default=2.0, help="latency of the local stub")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        scores = scores_from_store(args.customers) if args.customers else None
+        server, url = start_stub(args.host, args.port, scores, args.latency_ms)
+        print(f"Stub bureau on {url} ({len(server.scores) or 'any'} customers)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        url = args.url or start_stub(latency_ms=args.latency_ms)[1]
+        try:
+            _bench(url, args.lookups, args.concurrency)
+        except OSError as e:
+            raise SystemExit(f"bench failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
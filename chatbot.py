@@ -1,197 +1,271 @@
-import csv
 import os
 import random
-import re
-from datetime import datetime
-from sanction_generator import generate_sanction_pdf
+import threading
+import time
+import uuid
+import zlib
+import metrics
+from contextlib import contextmanager
+from audit_log import get_audit_log
+from config import get_settings
+from credit_bureau import lookup_score
+from customer_store import open_store, file_lock, FIELDS, PROFILE_COLUMNS
+from dialogue_flow import get_flow
+from idempotency import get_sanction_ledger, get_turn_cache, turn_digest
+from rate_card import get_rate_card
+from salary_extract import extract_salary
+from verification_cache import VerificationCache, slip_key
+from session_store import encode_agent, decode_agent
 
-CUSTOMER_FILE = "customers.csv"
+# NumPy (affordability, preapproval) and fpdf (sanction_jobs) are imported on
+# first use, so a worker that only answers eligibility questions never loads fpdf
+MIN_SALARY_CONFIDENCE = 0.25  # below this the slip figure is not trusted: manual review
+CONFIDENT_SALARY = 0.7        # labelled Net/Gross figure: safe to save as the profile income
+PASSWORD_COLUMN = FIELDS.index("password")
 
-# Ensure customer file exists
-if not os.path.isfile(CUSTOMER_FILE):
-    with open(CUSTOMER_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "customer_id", "name", "password", "monthly_income", "age",
-            "employment_type", "existing_emi", "credit_score"
-        ])
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Customer store at config.customer_file, opened on first use. The index
+    is built on the first lookup and refreshed on size/mtime change (see customer_store)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = open_store(get_settings().customer_file)
+    return _store
 
 # ------------------ Customer Functions ------------------
 def create_customer(name, password, income, age, employment):
-    cid = str(100000 + random.randint(1, 899999))
-    credit_score = random.randint(650, 850)
-    with open(CUSTOMER_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([cid, name, password, income, age, employment, 0, credit_score])
+    store = get_store()
+    cid = store.allocate_id()
+    credit_score = lookup_score(cid, fallback=random.randint(650, 850))
+    row = [cid, name, password, income, age, employment, 0, credit_score]
+    store.add(row)
+    # the audit log never sees the password (replay locks the account instead)
+    record_event("customer_created", cid, row=[None if i == PASSWORD_COLUMN else str(v) for i, v in enumerate(row)])
     return cid
 
+@metrics.timed("customer_lookup_seconds")
 def get_customer_by_cid(cid):
-    if not os.path.isfile(CUSTOMER_FILE):
+    return get_store().get(cid)
+
+def get_customer_version(cid):
+    return get_store().version(cid)
+
+_preapproval = None
+_verification_cache = None
+_update_locks = [threading.RLock() for _ in range(64)]  # re-entered by _do_sanction -> update_customer
+SANCTION_LOCK_STRIPES = 16
+
+def get_verification_cache():
+    global _verification_cache
+    if _verification_cache is None:
+        _verification_cache = VerificationCache(disk_path=get_settings().verification_cache)
+    return _verification_cache
+
+def get_preapproval(cid):
+    """Precomputed pre-approval row, or None if there is no table for this store.
+    The row may predate a profile change; compare its inputs before using it."""
+    global _preapproval
+    settings = get_settings()
+    if _preapproval is None or _preapproval.is_stale():  # first use, or rebuilt since
+        if not os.path.isfile(settings.preapproval_file):
+            _preapproval = None
+            return None
+        import preapproval
+        _preapproval = preapproval.PreapprovalTable(settings.preapproval_file)
+    if not _preapproval.is_for(settings.customer_file):
         return None
-    with open(CUSTOMER_FILE, "r", newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get("customer_id") == str(cid):
-                return {
-                    "cid": row["customer_id"],
-                    "name": row["name"],
-                    "password": row["password"],
-                    "income": float(row.get("monthly_income") or 0),
-                    "age": int(row.get("age") or 0),
-                    "employment": row.get("employment_type"),
-                    "existing_emi": float(row.get("existing_emi") or 0),
-                    "credit_score": int(row.get("credit_score") or 0),
-                }
-    return None
+    return _preapproval.get(cid)
+
+def update_customer(cid, **fields):
+    """Update profile fields (e.g. income=..., existing_emi=...) for a customer.
+    Appends to the store's update log; the CSV itself is compacted in the background."""
+    changes = {PROFILE_COLUMNS[k]: v for k, v in fields.items()}
+    # same per-customer order in the store and the audit log, so replay ends on the same value
+    with _update_locks[hash(str(cid)) % len(_update_locks)]:
+        get_store().update(cid, changes)
+        record_event("profile_update", cid, set={k: str(v) for k, v in changes.items()})
+
+@contextmanager
+def sanction_lock(cid):
+    """Hold one customer's EMI headroom while a sanction checks and spends it:
+    the in-process update lock plus a striped lock file next to the customer
+    store, so workers sharing the store take turns too."""
+    stripe = zlib.crc32(str(cid).encode("utf-8")) % SANCTION_LOCK_STRIPES
+    with _update_locks[hash(str(cid)) % len(_update_locks)]:
+        with file_lock(f"{get_settings().customer_file}.sanction-{stripe:02d}"):
+            yield
+
+def record_event(event, cid, **fields):
+    """Append to the decision/audit log (queued; never waits for disk)."""
+    get_audit_log().log(event, cid, **fields)
 
 # ------------------ Master Agent ------------------
 class MasterAgent:
-    def __init__(self, cid):
+    __slots__ = ("cid", "session_id", "state", "temp", "last_sanction", "sanction_job",
+                 "_profile", "_profile_version", "_turn_lock")
+
+    def __init__(self, cid, session_id=None):
         self.cid = cid
+        self.session_id = session_id or uuid.uuid4().hex
         self.state = "idle"
         self.temp = {}
-        self.last_sanction_path = None
+        self.last_sanction = None
+        self.sanction_job = None
+        self._profile = None
+        self._profile_version = None
+        self._turn_lock = threading.Lock()
 
     def start_chat(self):
         self.state = "idle"
         self.temp = {}
-        self.last_sanction_path = None
+        self.last_sanction = None
+        self.sanction_job = None
+        self.invalidate_profile()
+        self._get_profile()
         return "Hello! I'm your Tata Capital Loan Assistant. Type **'Apply loan'** to begin or **'Check eligibility'**."
 
-    def reply(self, message):
+    def _idempotent(self, digest, handler, *args, submission=False):
+        """Run a turn once; a repeat of the session's last turn (nothing in
+        between) within the idempotency window gets the first reply back.
+
+        A client retry of one submission (``submission``: the digest is its
+        ID) is always replayed. A repeat of the same text is replayed only if
+        the first turn moved the conversation on: a reply that leaves the
+        state alone ("reply yes again", new terms to confirm, a validation
+        error) expects the customer to send the same thing again."""
+        cache = get_turn_cache()
+        with self._turn_lock:  # a racing duplicate waits here, then hits the cache
+            cached = cache.get(self.session_id, digest, self.state)
+            if cached is not None:
+                if metrics.ENABLED:
+                    metrics.inc("chat_turns_deduplicated_total")
+                return cached
+            state = self.state
+            reply = handler(*args)
+            if submission or self.state != state:
+                cache.put(self.session_id, digest, reply, self.state)
+            return reply
+
+    def reply(self, message, submission_id=None):
+        """Answer one chat message. ``submission_id`` is the client's ID for
+        this send; a retry with the same ID gets the first reply back."""
+        if submission_id:
+            return self._idempotent(turn_digest("submission", submission_id), self._measured_reply, message,
+                                    submission=True)
+        return self._idempotent(turn_digest(str(message).strip().lower()), self._measured_reply, message)
+
+    def _measured_reply(self, message):
+        if not metrics.ENABLED:
+            return self._reply(message)
+        state = self.state
+        start = time.perf_counter()
+        try:
+            return self._reply(message)
+        finally:
+            metrics.observe("chat_reply_seconds", time.perf_counter() - start, state=state)
+            metrics.transition(state, self.state)
+
+    def _reply(self, message):
         text = str(message).strip().lower()
-        # Quick commands
-        if text in ("offers", "show offers", "discounts"):
+        flow = get_flow()
+        # Quick commands work in any state
+        if flow.commands.get(text) == "offers":
             return self._show_offers()
-        if self.state == "idle" and "elig" in text:
+        handler = self._STATE_HANDLERS.get(self.state)
+        if handler is not None:
+            return handler(self, flow, text)
+        step = flow.steps.get(self.state)
+        if step is not None:
+            return self._on_step(step, text)
+        return flow.messages["fallback"]
+
+    def _on_idle(self, flow, text):
+        intent, product = flow.classify(text)
+        if intent == "eligibility":
             return self._quick_eligibility()
-        # Idle state
-        if self.state == "idle":
-            if any(word in text for word in ["apply", "loan", "start"]):
-                self.state = "ask_amount"
-                return "Sure — what loan amount do you need?"
-            return "Type **'Apply loan'** to start or **'Check eligibility'**."
-        # Ask loan amount
-        if self.state == "ask_amount":
-            amt = self._parse_number(text)
-            if amt is None or amt <= 0:
-                return "Please enter a valid numeric loan amount."
-            self.temp["loan_amount"] = float(amt)
-            self.state = "ask_tenure"
-            return "Enter tenure in months (6–84)."
-        if self.state == "ask_tenure":
-            months = self._parse_number(text)
-            if months is None:
-                return "Enter tenure as number (6–84)."
-            months = int(months)
-            if months < 6 or months > 84:
-                return "Tenure must be between 6 and 84 months."
-            self.temp["tenure"] = months
-            self.state = "ask_name"
-            return "Enter your Full Name (as per KYC)."
-        if self.state == "ask_name":
-            if not re.search(r"[A-Za-z]", text):
-                return "Name seems invalid — enter your Full Name."
-            self.temp["full_name"] = text.title()
-            self.state = "ask_dob"
-            return "Enter Date of Birth (DD-MM-YYYY)."
-        if self.state == "ask_dob":
-            try:
-                dt = datetime.strptime(text, "%d-%m-%Y")
-                if dt.year < 1900 or dt > datetime.now():
-                    return "DOB seems invalid."
-            except:
-                return "Invalid DOB format. Use DD-MM-YYYY."
-            self.temp["dob"] = text
-            self.state = "ask_id"
-            return "Enter PAN or Aadhaar number."
-        if self.state == "ask_id":
-            if len(text) < 6:
-                return "Enter valid PAN/Aadhaar (at least 6 chars)."
-            self.temp["id_number"] = text
-            self.state = "ask_income"
-            return "Enter monthly income."
-        if self.state == "ask_income":
-            inc = self._parse_number(text)
-            if inc is None or inc <= 0:
-                return "Enter monthly income as a number."
-            self.temp["income"] = float(inc)
-            self.state = "ask_employment"
-            return "Employment Type? (**Salaried** / **Self-Employed**)"
-        if self.state == "ask_employment":
-            if "salar" in text:
-                self.temp["employment"] = "Salaried"
-            elif "self" in text:
-                self.temp["employment"] = "Self-Employed"
-            else:
-                return "Please reply **'Salaried'** or **'Self-Employed'**."
-            self.state = "ask_existing_emi"
-            return "Existing EMI (0 if none)?"
-        if self.state == "ask_existing_emi":
-            emi = self._parse_number(text)
-            if emi is None or emi < 0:
-                return "Enter existing EMI as a number (0 if none)."
-            self.temp["existing_emi"] = float(emi)
+        if intent == "apply":
+            product = flow.product(product)
+            self.temp = {"application_id": uuid.uuid4().hex[:16]}
+            if product.name != flow.default:
+                self.temp["product"] = product.name
+            self.state = product.first.state
+            return product.first.prompt
+        return flow.messages["idle_help"]
+
+    def _on_step(self, step, text):
+        value, error = step.check(text)
+        if error is not None:
+            return error
+        self.temp[step.field] = value
+        if step.next is None:
             return self._final_check()
-        if self.state == "confirm":
-            if text in ("yes", "y"):
-                return self._do_sanction()
-            else:
-                self.state = "idle"
-                self.temp = {}
-                return "❌ Application cancelled."
-        if self.state == "await_salary_upload":
-            return "Please upload your salary slip using the upload box shown by the assistant."
-        return "I didn't understand. Please follow the prompts."
+        self.state = step.next.state
+        return step.next.prompt
+
+    def _on_confirm(self, flow, text):
+        if text in flow.confirm_words:
+            return self._do_sanction()
+        self._decision("cancelled")
+        self.state = "idle"
+        self.temp = {}
+        return flow.messages["cancelled"]
+
+    def _on_await_upload(self, flow, text):
+        return flow.messages["await_upload"]
+
+    _STATE_HANDLERS = {"idle": _on_idle, "confirm": _on_confirm, "await_salary_upload": _on_await_upload}
 
     # ------------------- FIXED SALARY PROCESSING -------------------
     def process_salary_upload(self, file_bytes, filename):
+        return self._idempotent(turn_digest("upload", file_bytes or b"", filename),
+                                self._process_salary_upload, file_bytes, filename)
+
+    @metrics.timed("salary_upload_seconds")
+    def _process_salary_upload(self, file_bytes, filename):
         if self.state != "await_salary_upload":
             return "No salary slip required at this time."
+        if metrics.ENABLED:
+            metrics.inc("salary_upload_bytes_total", len(file_bytes or b""))
 
-        master = get_customer_by_cid(self.cid)
+        master = self._get_profile()
         registered_income = master.get("income", 0) if master else self.temp.get("income", 0)
 
-        # Attempt numeric extraction from filename
-        nums = re.findall(r"\d{3,9}", filename or "")
-        extracted_salary = None
-        if nums:
-            extracted_salary = float(max(nums, key=len))
-        else:
-            # Try decoding PDF/text bytes (best-effort)
-            try:
-                text = None
-                for enc in ("utf-8", "latin-1", "iso-8859-1"):
-                    try:
-                        text = file_bytes.decode(enc)
-                        break
-                    except:
-                        text = None
-                if text:
-                    nums2 = re.findall(r"\d{3,9}", text)
-                    if nums2:
-                        extracted_salary = float(max(nums2, key=len))
-            except:
-                extracted_salary = None
+        # Same document re-uploaded by the same customer: reuse the earlier extraction
+        key = slip_key(file_bytes, self.cid)
+        cached = get_verification_cache().get(key)
+        # Figure comes from the document itself, never from its file name
+        extraction = cached["extraction"] if cached else extract_salary(file_bytes)
 
         # ---------- NEW: Normalize & Align ----------
-        extracted_salary = self._normalize_salary(extracted_salary)
-        aligned_salary, note = self._align_salary(extracted_salary, registered_income)
+        extracted_salary = self._normalize_salary(extraction["salary"])
+        aligned_salary, note = self._align_salary(extracted_salary, registered_income, extraction["confidence"])
+        self.temp["salary_confidence"] = extraction["confidence"]
+        record = {
+            "extraction": extraction, "registered_income": registered_income,
+            "aligned_salary": aligned_salary, "note": note, "filename": filename,
+        }
 
-        # Tolerance ±30%
-        diff = abs(aligned_salary - registered_income)
-        allowed = registered_income * 0.30
-
-        if diff > allowed:
+        # Tolerance ±30%; a slip with no legible figure proves nothing either way
+        if aligned_salary is None or abs(aligned_salary - registered_income) > registered_income * 0.30:
             # Do NOT hard fail; send for manual review
             self.state = "confirm"
+            self.temp["salary_verified"] = "manual_review"
             self.temp["emi"] = self._compute_emi(
                 self.temp.get("loan_amount"),
                 self.temp.get("tenure")
             )
+            get_verification_cache().put(key, {**record, "decision": "manual_review"})
+            self._decision("manual_review", detected=aligned_salary, registered=registered_income,
+                           confidence=extraction["confidence"], emi=self.temp["emi"])
+            detected = ("no legible salary figure" if aligned_salary is None
+                        else f"₹{aligned_salary:,.0f}")
             return (
                 "⚠️ **Salary discrepancy detected**\n\n"
-                f"• Detected (after normalization): ₹{aligned_salary:,.0f}\n"
+                f"• Detected (after normalization): {detected}\n"
                 f"• Registered income: ₹{registered_income:,.0f}\n"
                 f"• Action: Sent for **manual verification**\n\n"
                 "✅ You may still proceed with the application.\n\n"
@@ -202,16 +276,27 @@ class MasterAgent:
         loan = self.temp.get("loan_amount")
         months = self.temp.get("tenure")
         income = registered_income
-        existing = self.temp.get("existing_emi", 0)
+        existing = max(self.temp.get("existing_emi", 0), master.get("existing_emi", 0) if master else 0)
         emi = self._compute_emi(loan, months)
         allowed_emi = max(0, 0.5 * income - existing)
 
         if emi > allowed_emi:
+            offer = self._max_loan_offer(income, existing, months)
+            get_verification_cache().put(key, {**record, "decision": "rejected"})
+            self._decision("rejected", reason="salary_emi", emi=emi, allowed=allowed_emi)
             self.state = "idle"
             self.temp = {}
-            return f"❌ **Loan rejected after salary verification**: EMI ₹{emi:.0f} exceeds allowed ₹{allowed_emi:.0f}."
+            return f"❌ **Loan rejected after salary verification**: EMI ₹{emi:.0f} exceeds allowed ₹{allowed_emi:.0f}.{offer}"
+
+        if (master and extraction["confidence"] >= CONFIDENT_SALARY
+                and round(aligned_salary) != round(registered_income)):
+            update_customer(self.cid, income=round(aligned_salary, 2))
+            self.invalidate_profile()
+        get_verification_cache().put(key, {**record, "decision": "verified"})
+        self._decision("verified", detected=aligned_salary, confidence=extraction["confidence"], emi=emi)
 
         self.temp["emi"] = emi
+        self.temp["salary_verified"] = "verified"
         self.state = "confirm"
         return (
             f"✅ Salary slip verified. \n\n"
@@ -231,92 +316,268 @@ class MasterAgent:
             return None
         return value
 
-    def _align_salary(self, detected, registered):
-        if detected is None:
-            return registered, "OCR fallback"
+    def _align_salary(self, detected, registered, confidence=1.0):
+        if detected is None or confidence < MIN_SALARY_CONFIDENCE:
+            return None, "Unreadable"
         # Annual slip detected
         if detected > registered * 8:
             return detected / 12, "Annual→Monthly adjusted"
         return detected, "Monthly matched"
 
+    # ------------------ Session serialization ------------------
+    def to_bytes(self):
+        """Compact binary snapshot (see session_store). A letter that is still
+        rendering is not included; save again once poll_sanction() reports done.
+        Neither the salary slip nor the letter bytes are part of it."""
+        self.poll_sanction()
+        return encode_agent(self.cid, self.state, self.temp, self.last_sanction)
+
+    @classmethod
+    def from_bytes(cls, blob, session_id=None):
+        fields, _ = decode_agent(blob)
+        agent = cls(fields["cid"], session_id)
+        agent.state = fields["state"]
+        agent.temp = fields["temp"]
+        agent.last_sanction = fields["last_sanction"]
+        return agent
+
+    # ------------------ Profile snapshot ------------------
+    def _get_profile(self):
+        """Master record loaded once per conversation and reused by every step."""
+        if self._profile is None:
+            self._profile_version = get_customer_version(self.cid)
+            self._profile = get_customer_by_cid(self.cid)
+        return self._profile
+
+    def invalidate_profile(self):
+        """Drop the snapshot; call after writing this customer's profile."""
+        self._profile = None
+        self._profile_version = None
+
+    def _profile_is_stale(self):
+        return self._profile is not None and get_customer_version(self.cid) != self._profile_version
+
     # ------------------ OTHER EXISTING FUNCTIONS ------------------
     def _do_sanction(self):
-        master = get_customer_by_cid(self.cid)
+        # Check and record the new EMI under the customer's lock, so two sessions
+        # of one customer (in any worker sharing the store) cannot both spend
+        # the same EMI headroom
+        with sanction_lock(self.cid):
+            return self._sanction_locked()
+
+    def _sanction_locked(self):
+        if self._profile is None or self._profile_is_stale():
+            # Profile changed (or was never seen) since the offer: decide again on the fresh record
+            self.invalidate_profile()
+            offered = self.temp.get("emi")
+            reply = self._final_check(recheck=True)
+            if self.state != "confirm" or offered is None or round(self.temp["emi"]) != round(offered):
+                return reply  # rejected, or new terms the customer has to confirm again
+        master = self._get_profile()
         if not master:
             self.state = "idle"
             return "Master profile missing."
 
-        pdf_path = generate_sanction_pdf(master, self.temp, self.temp["loan_amount"], self.temp["tenure"], self.temp["emi"])
-        self.last_sanction_path = pdf_path
-        
-        pdf_filename = os.path.basename(pdf_path)
+        # One sanction per application, even if the confirming turn runs twice
+        # (another worker, a restored snapshot)
+        app_id = self.temp.get("application_id")
+        if app_id and not get_sanction_ledger().claim(app_id, self.cid):
+            self.state = "idle"
+            self.temp = {}
+            return "✅ This application has already been sanctioned. Your sanction letter is on its way."
+
+        # Letter is rendered by the worker pool; chat_page polls self.sanction_job
+        from sanction_jobs import get_sanction_queue, QueueFull
+        try:
+            self.sanction_job = get_sanction_queue().submit(
+                master, {**self.temp, "product_label": self._product().label},
+                self.temp["loan_amount"], self.temp["tenure"], self.temp["emi"]
+            )
+        except QueueFull:
+            if app_id:
+                get_sanction_ledger().release(app_id)
+            return "⏳ We're issuing a lot of sanction letters right now. Please reply **yes** again in a moment."
+        self._decision("sanctioned", amount=self.temp["loan_amount"], tenure=self.temp["tenure"],
+                       emi=self.temp["emi"], rate=self.temp.get("rate"), job=self.sanction_job.id)
+        update_customer(self.cid, existing_emi=round(master.get("existing_emi", 0) + self.temp["emi"], 2))
+        self.invalidate_profile()
+
         self.state = "idle"
         self.temp = {}
-        return f"🎉 **Loan sanctioned successfully!**\n\n**📄 {pdf_filename}**\n\n**Download button appears below the chat!**\n\nThank you for choosing Tata Capital! 🎊"
+        return "🎉 **Loan sanctioned successfully!**\n\n**📄 Your sanction letter is being prepared.**\n\n**Download button appears below the chat!**\n\nThank you for choosing Tata Capital! 🎊"
 
-    def _parse_number(self, txt):
-        cleaned = re.sub(r"[^\d.]", "", txt)
-        if cleaned == "":
+    def poll_sanction(self):
+        """Check the pending letter job. Returns "pending", "done" ((file_name, letter_id)
+        is then in last_sanction; see sanction_letter), "failed", or None when there is no job."""
+        job = self.sanction_job
+        if job is None:
             return None
-        try:
-            return float(cleaned)
-        except:
+        status = job.status()
+        if status == "done":
+            file_name, letter_id, _ = job.result()
+            self.last_sanction = (file_name, letter_id)
+            self.sanction_job = None
+        elif status == "failed":
+            self.sanction_job = None
+        return status
+
+    def sanction_letter(self):
+        """(file_name, pdf_bytes) of the last sanction letter, read from the archive, or None."""
+        if not self.last_sanction:
             return None
+        from sanction_archive import get_archive
+        return get_archive().get(self.last_sanction[1])
 
     def _quick_eligibility(self):
-        c = get_customer_by_cid(self.cid)
+        c = self._get_profile()
         if not c:
             return "No profile found. Signup first."
-        limit = c["income"] * 12
-        return f"✅ **Credit score**: {c['credit_score']}\n💰 **Pre-approved**: INR {limit:,.0f}"
+        score = lookup_score(self.cid, fallback=c["credit_score"])
+        pre = get_preapproval(self.cid)
+        import preapproval
+        rate = preapproval.segment_rates(c["employment"], score)
+        if pre is None or (pre["credit_score"], pre["income"], pre["existing_emi"], pre["rate"]) != (
+                score, c["income"], c["existing_emi"], rate):
+            eligible, limit, _ = preapproval.evaluate(c["income"], c["existing_emi"], score, rate)
+            pre = {"eligible": bool(eligible), "pre_approved": float(limit)}
+        if not pre["eligible"]:
+            return f"✅ **Credit score**: {score}\n💰 **Pre-approved**: not available right now"
+        return f"✅ **Credit score**: {score}\n💰 **Pre-approved**: INR {pre['pre_approved']:,.0f}"
+
+    def _product(self):
+        """Product of the application in progress (the default product if none)."""
+        return get_flow().product(self.temp.get("product"))
+
+    def _collateral_limit(self, product):
+        """Largest loan the pledged collateral supports, or None for unsecured products."""
+        collateral = product.collateral
+        if not collateral:
+            return None
+        value = float(self.temp.get(collateral["field"], 0)) * collateral.get("unit_value", 1)
+        return value * collateral["max_ltv"]
+
+    def _quote(self, principal, months, score=None):
+        """Price from the product's rate card for this customer's segment; remembers the rate in temp."""
+        profile = self._get_profile() or {}
+        quote = get_rate_card(self._product().rate_card).quote(
+            principal, months,
+            employment=self.temp.get("employment") or profile.get("employment"),
+            score=profile.get("credit_score", 0) if score is None else score,
+        )
+        self.temp["rate"] = quote["rate"]
+        return quote
 
-    def _compute_emi(self, principal, months, rate=11.0):
-        r = rate / 100 / 12
+    def _compute_emi(self, principal, months):
         if months <= 0:
             return 0
-        return principal * r * (1 + r) ** months / ((1 + r) ** months - 1)
+        return float(self._quote(principal, months)["emi"])
 
-    def _final_check(self):
+    def _max_loan_offer(self, income, existing, months):
+        """Counter-offer line for an EMI rejection, or "" if nothing is affordable."""
+        import affordability
+        product = self._product()
+        card = get_rate_card(product.rate_card)
+        rate = self.temp.get("rate", card.base_rate)
+        cap = self._collateral_limit(product)
+        cap = float("inf") if cap is None else cap
+        best = min(cap, affordability.max_eligible_loan(income, existing, months, rate))
+        if best < 1000:
+            return ""
+        longest = min(cap, affordability.max_eligible_loan(income, existing, card.max_tenure, rate))
+        line = f"\n\n💡 You qualify for up to **INR {best:,.0f}** over {months} months"
+        if months < card.max_tenure and longest > best:
+            line += f" (or up to INR {longest:,.0f} over {card.max_tenure} months)"
+        return line + f". Type **'Apply {product.label.lower()}'** to try again."
+
+    @metrics.timed("final_check_seconds")
+    def _final_check(self, recheck=False):
+        """Decide the application and quote it. ``recheck`` is the sanction's second
+        look at an offer already made: the application is not logged again, and
+        neither is an offer whose EMI did not change."""
+        offered = self.temp.get("emi") if recheck else None
         loan = self.temp["loan_amount"]
         months = self.temp["tenure"]
         income = self.temp["income"]
-        existing = self.temp.get("existing_emi", 0)
-        master = get_customer_by_cid(self.cid) or {}
-        score = master.get("credit_score", random.randint(650, 820))
+        master = self._get_profile() or {}
+        # Sanctioned loans are recorded on the profile, so count them even if not declared
+        existing = max(self.temp.get("existing_emi", 0), master.get("existing_emi", 0))
+        score = lookup_score(self.cid, fallback=master.get("credit_score", random.randint(650, 820)))
+        product = self._product()
 
-        emi = self._compute_emi(loan, months)
+        quote = self._quote(loan, months, score)
+        emi = quote["emi"]
         allowed = max(0, 0.5 * income - existing)
+        if not recheck:
+            record_event("application", self.cid, app=self.temp.get("application_id"), amount=loan, tenure=months,
+                         income=income, existing_emi=existing, employment=self.temp.get("employment"),
+                         product=self.temp.get("product"))
+
+        # Score and collateral gates come first: a salary slip cannot lift either
+        if score < product.min_credit_score:
+            self._decision("rejected", reason="credit_score", score=score)
+            self.state = "idle"
+            self.temp = {}
+            return f"❌ **Loan rejected**: credit score {score} below minimum."
+
+        limit = self._collateral_limit(product)
+        if limit is not None and loan > limit:
+            collateral = product.collateral
+            self._decision("rejected", reason="ltv", limit=limit)
+            self.state = "idle"
+            self.temp = {}
+            return (f"❌ **Loan rejected**: the amount is above {collateral['max_ltv']:.0%} of the "
+                    f"{collateral.get('label', 'collateral')} value (up to INR {limit:,.0f} available).")
 
         registered_income = master.get("income", income)
-        if registered_income and loan > 20 * registered_income:
+        if (not self.temp.get("salary_verified") and registered_income
+                and loan > product.salary_slip_income_multiple * registered_income):
             self.state = "await_salary_upload"
             self.temp["emi"] = emi
+            self._decision("salary_required", emi=emi, registered=registered_income)
             return (
                 "Your requested loan amount is large compared to your registered income. "
                 "Please upload your salary slip to proceed. [[UPLOAD_SALARY_SLIP]]"
             )
 
-        if score < 700:
-            self.state = "idle"
-            self.temp = {}
-            return f"❌ **Loan rejected**: credit score {score} below minimum."
-
         if emi > allowed:
+            offer = self._max_loan_offer(income, existing, months)
+            self._decision("rejected", reason="emi", emi=emi, allowed=allowed)
             self.state = "idle"
             self.temp = {}
-            return f"❌ **Loan rejected**: EMI ₹{emi:.0f} exceeds allowed ₹{allowed:.0f}."
+            return f"❌ **Loan rejected**: EMI ₹{emi:.0f} exceeds allowed ₹{allowed:.0f}.{offer}"
 
         self.temp["emi"] = emi
+        self.temp["processing_fee"] = quote["processing_fee"]
+        if offered is None or round(emi) != round(offered):
+            self._decision("eligible", emi=emi, score=score, rate=quote["rate"], fee=quote["processing_fee"])
         self.state = "confirm"
+        promos = f"🏷️ **Offers applied**: {', '.join(quote['promotions'])}\n" if quote["promotions"] else ""
         return (
-            f"✅ **Eligible for loan!**\n\n"
+            f"✅ **Eligible for {product.label.lower()}!**\n\n"
             f"💰 **Loan**: INR {loan:,.0f}\n"
             f"📅 **Tenure**: {months} months\n"
+            f"📈 **Rate**: {quote['rate']:g}% p.a.\n"
             f"💳 **EMI**: INR {emi:,.0f}\n"
-            f"⭐ **Credit score**: {score}\n\n"
+            f"🧾 **Processing fee**: INR {quote['processing_fee']:,.0f}\n"
+            f"⭐ **Credit score**: {score}\n"
+            f"{promos}\n"
             f"**Do you want to proceed?** (yes/no)"
         )
 
+    def _decision(self, outcome, **fields):
+        record_event("decision", self.cid, app=self.temp.get("application_id"), outcome=outcome, **fields)
+
     def _show_offers(self):
-        return "🔥 **Current Offers**:\n• Personal Loan @11% p.a.\n• Women special -0.5%\n• Fee discount above ₹300k"
+        flow = get_flow()
+        card = get_rate_card(flow.product(None).rate_card)
+        lines = ["🔥 **Current Offers**:"] + card.describe()
+        profile = self._get_profile()
+        if profile:
+            rate = card.rate_for(profile.get("employment"), profile.get("credit_score", 0))
+            lines.append(f"• Your rate: from **{rate:g}% p.a.**")
+        for name in flow.product_order:
+            product = flow.products[name]
+            if name != flow.default:
+                lines.append(get_rate_card(product.rate_card).describe()[0])
+        return "\n".join(lines)
 
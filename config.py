@@ -0,0 +1,104 @@
+"""Storage locations, read once from the environment.
+
+    BFSI_DATA_DIR            base directory for the files below (default: CWD at first use)
+    BFSI_CUSTOMER_FILE       customer store, CSV or .db/.sqlite (default: customers.csv)
+    BFSI_SANCTION_DIR        sanction letter archive (default: sanctions)
+    BFSI_SANCTION_COLD_DIR   cold storage for letters past retention (default: none, evict = delete)
+    BFSI_SANCTION_RETENTION_DAYS  default age limit for `sanction_archive.py retain`
+    BFSI_AUDIT_DIR           decision/audit event log; empty disables it (default: audit)
+    BFSI_PREAPPROVAL_FILE    table written by preapproval.py (default: preapproval.npy)
+    BFSI_VERIFICATION_CACHE  slip verification cache; empty keeps it in memory only
+                             (default: verification_cache.db)
+    BFSI_RATE_CARD           pricing rules (default: rate_card.json next to this file)
+    BFSI_FLOWS               dialogue flows and products (default: flows.json next to this file)
+    BFSI_BUREAU_URL          credit bureau base URL; empty uses stored profile scores (default: empty)
+    BFSI_BUREAU_TIMEOUT      seconds per bureau request (default: 2)
+    BFSI_BUREAU_TTL          seconds a bureau score is cached (default: 3600)
+    SESSION_STORE            memory | file:<dir> | sqlite:<path> (default: memory)
+    BFSI_SANCTION_LEDGER     one-sanction-per-application ledger, file:<dir> | sqlite:<path>;
+                             must be durable and shared by all workers (default: sqlite:sanction_ledger.db)
+    BFSI_IDEMPOTENCY_WINDOW  seconds a repeated chat turn gets the cached reply; 0 disables (default: 5)
+
+Relative paths are resolved against BFSI_DATA_DIR. Nothing is created here;
+each module creates its files or directories on first use. Call
+``configure(...)`` before the first use to override settings from code
+(tests, batch jobs).
+"""
+import os
+import threading
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_DEFAULT_RATE_CARD = os.path.join(_HERE, "rate_card.json")
+_DEFAULT_FLOWS = os.path.join(_HERE, "flows.json")
+
+
+class Settings:
+    __slots__ = ("data_dir", "customer_file", "sanction_dir", "sanction_cold_dir", "sanction_retention_days",
+                 "audit_dir", "preapproval_file", "verification_cache", "rate_card", "flows", "bureau_url", "bureau_timeout", "bureau_ttl",
+                 "session_store", "sanction_ledger", "idempotency_window")
+
+    def __init__(self, data_dir=None, customer_file=None, sanction_dir=None, sanction_cold_dir=None,
+                 sanction_retention_days=None, audit_dir=None, preapproval_file=None, verification_cache=None,
+                 rate_card=None, flows=None, bureau_url=None, bureau_timeout=None, bureau_ttl=None,
+                 session_store=None, sanction_ledger=None, idempotency_window=None):
+        env = os.environ.get
+        self.data_dir = os.path.abspath(data_dir or env("BFSI_DATA_DIR") or os.getcwd())
+        self.customer_file = self._path(customer_file or env("BFSI_CUSTOMER_FILE") or "customers.csv")
+        self.sanction_dir = self._path(sanction_dir or env("BFSI_SANCTION_DIR") or "sanctions")
+        cold = sanction_cold_dir or env("BFSI_SANCTION_COLD_DIR")
+        self.sanction_cold_dir = self._path(cold) if cold else None
+        days = sanction_retention_days or env("BFSI_SANCTION_RETENTION_DAYS")
+        self.sanction_retention_days = float(days) if days else None
+        if audit_dir is None:
+            audit_dir = env("BFSI_AUDIT_DIR", "audit")
+        self.audit_dir = self._path(audit_dir) if audit_dir else None
+        self.preapproval_file = self._path(preapproval_file or env("BFSI_PREAPPROVAL_FILE") or "preapproval.npy")
+        if verification_cache is None:
+            verification_cache = env("BFSI_VERIFICATION_CACHE", "verification_cache.db")
+        self.verification_cache = self._path(verification_cache) if verification_cache else None
+        self.rate_card = rate_card or env("BFSI_RATE_CARD") or _DEFAULT_RATE_CARD
+        self.flows = flows or env("BFSI_FLOWS") or _DEFAULT_FLOWS
+        self.bureau_url = bureau_url or env("BFSI_BUREAU_URL") or None
+        self.bureau_timeout = float(bureau_timeout or env("BFSI_BUREAU_TIMEOUT") or 2.0)
+        self.bureau_ttl = float(bureau_ttl if bureau_ttl is not None else env("BFSI_BUREAU_TTL") or 3600.0)
+        self.session_store = session_store or env("SESSION_STORE") or "memory"
+        kind, _, arg = (sanction_ledger or env("BFSI_SANCTION_LEDGER") or "sqlite:sanction_ledger.db").partition(":")
+        self.sanction_ledger = f"{kind}:{self._path(arg)}" if arg else kind
+        if idempotency_window is None:
+            idempotency_window = env("BFSI_IDEMPOTENCY_WINDOW") or 5.0
+        self.idempotency_window = float(idempotency_window)
+
+    def _path(self, path):
+        return os.path.join(self.data_dir, path)
+
+    def overrides(self):
+        """``configure`` arguments that rebuild these settings (e.g. in a worker process)."""
+        values = {k: getattr(self, k) for k in self.__slots__}
+        for k in ("audit_dir", "verification_cache"):
+            if values[k] is None:
+                values[k] = ""  # disabled, rather than the default location
+        return values
+
+    def __repr__(self):
+        return "Settings(" + ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__) + ")"
+
+
+_settings = None
+_lock = threading.Lock()
+
+
+def get_settings():
+    """Process-wide settings, read from the environment on first call."""
+    global _settings
+    with _lock:
+        if _settings is None:
+            _settings = Settings()
+        return _settings
+
+
+def configure(**overrides):
+    """Replace the process-wide settings (unset fields still come from the environment)."""
+    global _settings
+    with _lock:
+        _settings = Settings(**overrides)
+        return _settings
@@ -0,0 +1,242 @@
+"""Credit-bureau client: pooled, batched, cached and circuit-broken.
+
+Scores come from an HTTP bureau (config bureau_url, BFSI_BUREAU_URL) through
+one bulk endpoint::
+
+    POST /v1/scores  {"ids": ["100004", ...]}  ->  {"scores": {"100004": 781, ...}}
+
+Unknown IDs are simply absent from the answer. The client keeps a small
+pool of keep-alive connections, and single lookups from concurrent chat
+turns are coalesced into one bulk request (the same group-commit pattern as
+the customer store). Answers are cached for ``ttl`` seconds. Requests have a
+timeout; after ``breaker_threshold`` consecutive failures the circuit opens
+and lookups fail fast with BureauUnavailable for ``breaker_reset`` seconds,
+then one trial request is let through. Callers fall back to the stored
+profile score.
+
+bureau_stub.py is a local stand-in bureau for tests and benchmarks. Nothing
+network-related is imported until a client is created, so importing this
+module costs nothing when no bureau is configured.
+"""
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import metrics
+from config import get_settings
+from customer_store import GroupCommitter
+
+SCORES_PATH = "/v1/scores"
+MAX_BATCH = 500  # IDs per bulk request
+
+
+class BureauUnavailable(RuntimeError):
+    """The bureau did not answer (timeout, error, or the circuit is open)."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.reset_after:
+                self._trial = True  # half-open: one request decides
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures, self._opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at, self._trial = time.monotonic(), False
+
+
+class _TTLCache:
+    def __init__(self, ttl, max_entries=1_000_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # cid -> (expires_at, score), in expiry order
+
+    def get(self, cid):
+        entry = self._data.get(cid)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put_many(self, scores):
+        if self.ttl <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for cid, score in scores.items():
+                self._data[cid] = (expires, score)
+                self._data.move_to_end(cid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class BureauClient:
+    def __init__(self, url, timeout=2.0, ttl=3600.0, pool_size=8, max_batch=MAX_BATCH,
+                 breaker_threshold=5, breaker_reset=30.0):
+        import http.client
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.cache = _TTLCache(ttl)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._pool = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._pool_size = pool_size
+        self._executor = None
+        self._coalescer = GroupCommitter(self._lookup_batch, max_batch, name="bureau-coalescer")
+
+    # ---------- connections ----------
+    def _request(self, ids):
+        """One bulk request on a pooled keep-alive connection."""
+        if not self.breaker.allow():
+            raise BureauUnavailable("circuit open")
+        body = json.dumps({"ids": ids}).encode("utf-8")
+        start = time.perf_counter()
+        ok = False
+        try:
+            with self._slots:
+                try:
+                    conn = self._pool.get_nowait()
+                except queue.Empty:
+                    conn = self._conn_class(self.host, self.port, timeout=self.timeout)
+                try:
+                    conn.request("POST", self.prefix + SCORES_PATH, body, {"Content-Type": "application/json"})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    if resp.status != 200:
+                        raise BureauUnavailable(f"bureau answered {resp.status}")
+                    scores = {str(cid): int(score) for cid, score in json.loads(data)["scores"].items()}
+                except Exception as e:  # a malformed answer counts as a failure too
+                    conn.close()
+                    if isinstance(e, BureauUnavailable):
+                        raise
+                    raise BureauUnavailable(f"bureau request failed: {e!r}") from e
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._pool.put(conn)
+            ok = True
+        finally:
+            # every request that got past allow() settles the breaker (and a half-open trial)
+            if ok:
+                self.breaker.success()
+            else:
+                self.breaker.failure()
+                if metrics.ENABLED:
+                    metrics.inc("bureau_errors_total")
+        if metrics.ENABLED:
+            metrics.observe("bureau_request_seconds", time.perf_counter() - start)
+        return scores
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # ---------- lookups ----------
+    def scores(self, cids):
+        """Scores for many customers: cached ones are served locally, the rest
+        fetched in bulk requests of max_batch IDs, several in parallel."""
+        found, missing = {}, []
+        for cid in dict.fromkeys(str(c) for c in cids):
+            score = self.cache.get(cid)
+            if score is None:
+                missing.append(cid)
+            else:
+                found[cid] = score
+        if metrics.ENABLED and found:
+            metrics.inc("bureau_cache_hits_total", len(found))
+        chunks = [missing[i:i + self.max_batch] for i in range(0, len(missing), self.max_batch)]
+        if len(chunks) > 1:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self._pool_size, thread_name_prefix="bureau")
+            results = list(self._executor.map(self._request, chunks))
+        else:
+            results = [self._request(chunk) for chunk in chunks]
+        for fetched in results:
+            self.cache.put_many(fetched)
+            found.update(fetched)
+        return found
+
+    def score(self, cid):
+        """One customer's score (None if the bureau does not know them).
+        Concurrent callers share bulk requests."""
+        cid = str(cid)
+        score = self.cache.get(cid)
+        if score is not None:
+            if metrics.ENABLED:
+                metrics.inc("bureau_cache_hits_total")
+            return score
+        row = {"cid": cid}
+        self._coalescer.submit(row)
+        return row.get("score")
+
+    def _lookup_batch(self, rows):
+        fetched = self.scores([row["cid"] for row in rows])
+        for row in rows:
+            row["score"] = fetched.get(row["cid"])
+
+    async def ascore(self, cid):
+        """``score`` for asyncio callers (runs on the loop's default executor)."""
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.score, cid)
+
+    async def ascores(self, cids):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.scores, list(cids))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_bureau():
+    """Client for the configured bureau_url, or None when no bureau is configured."""
+    global _client
+    settings = get_settings()
+    if not settings.bureau_url:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = BureauClient(settings.bureau_url, settings.bureau_timeout, settings.bureau_ttl)
+        return _client
+
+
+def lookup_score(cid, fallback=None):
+    """Bureau score for a customer, or ``fallback`` (e.g. the stored profile
+    score) when no bureau is configured, it is down, or it has no record."""
+    bureau = get_bureau()
+    if bureau is None:
+        return fallback
+    try:
+        score = bureau.score(cid)
+    except BureauUnavailable:
+        return fallback
+    return fallback if score is None else score
@@ -0,0 +1,555 @@
+import csv
+import io
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FIELDS = [
+    "customer_id", "name", "password", "monthly_income", "age",
+    "employment_type", "existing_emi", "credit_score"
+]
+
+
+def row_to_customer(row):
+    """Map a raw customers.csv row (dict) to the profile dict used by the agent."""
+    return {
+        "cid": row["customer_id"],
+        "name": row["name"],
+        "password": row["password"],
+        "income": float(row.get("monthly_income") or 0),
+        "age": int(row.get("age") or 0),
+        "employment": row.get("employment_type"),
+        "existing_emi": float(row.get("existing_emi") or 0),
+        "credit_score": int(row.get("credit_score") or 0),
+    }
+
+
+def ensure_csv(path):
+    if not os.path.isfile(path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(FIELDS)
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock on a sidecar ``<path>.lock`` file."""
+    with open(path + ".lock", "a+b") as lf:
+        if fcntl:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        else:
+            lf.seek(0)
+            msvcrt.locking(lf.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+            else:
+                lf.seek(0)
+                msvcrt.locking(lf.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# ------------------ Customer ID allocation ------------------
+class IdAllocator:
+    """Hands out unique customer IDs from a persisted sequence (``<path>.seq``).
+
+    Each process reserves a block of IDs under the file lock and then serves
+    them from memory, so allocation is O(1) and never collides across workers.
+    The sequence starts above the highest ID already in the store, which also
+    keeps clear of the old randomly chosen IDs.
+    """
+
+    START = 100001
+
+    def __init__(self, path, max_existing_id, block_size=100):
+        self.path = path
+        self.seq_path = path + ".seq"
+        self._max_existing_id = max_existing_id
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve_block(self):
+        with file_lock(self.seq_path):
+            try:
+                with open(self.seq_path, "r", encoding="utf-8") as f:
+                    start = int(f.read().strip())
+            except (FileNotFoundError, ValueError):
+                start = max(self.START, self._max_existing_id() + 1)
+            end = start + self.block_size
+            tmp = self.seq_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(str(end))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.seq_path)
+        self._next, self._end = start, end
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            cid = self._next
+            self._next += 1
+            return str(cid)
+
+
+# ------------------ Group commit ------------------
+_FLUSH = object()
+
+
+class GroupCommitter:
+    """Batches concurrent appends into one write + one fsync.
+
+    Callers block in ``submit`` until their row is durable, unless they pass
+    ``wait=False`` (fire-and-forget; ``flush`` then waits for everything
+    queued so far). A single writer thread drains whatever has queued up
+    since the last flush and hands the whole batch to ``write_batch``.
+    """
+
+    def __init__(self, write_batch, max_batch=1000, name="customer-group-commit"):
+        self._write_batch = write_batch
+        self.max_batch = max_batch
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, row, wait=True):
+        self._ensure_thread()
+        done = threading.Event() if wait else None
+        slot = {"row": row, "done": done, "error": None}
+        self._queue.put(slot)
+        if not wait:
+            return
+        done.wait()
+        if slot["error"] is not None:
+            raise slot["error"]
+
+    def flush(self):
+        """Block until every row submitted before this call has been written."""
+        self.submit(_FLUSH)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [slot["row"] for slot in batch if slot["row"] is not _FLUSH]
+            try:
+                if rows:
+                    self._write_batch(rows)
+            except Exception as e:
+                for slot in batch:
+                    slot["error"] = e
+            for slot in batch:
+                if slot["done"] is not None:
+                    slot["done"].set()
+
+
+# ------------------ CSV + in-process hash index ------------------
+PROFILE_COLUMNS = {
+    "name": "name",
+    "password": "password",
+    "income": "monthly_income",
+    "age": "age",
+    "employment": "employment_type",
+    "existing_emi": "existing_emi",
+    "credit_score": "credit_score",
+}
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _is_append(prev, sig):
+    return prev is not None and sig is not None and sig[0] == prev[0] and sig[1] > prev[1]
+
+
+def _complete_lines(path, offset):
+    """Bytes from ``offset`` up to the last newline (a line still being
+    appended is picked up on the next refresh)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        chunk = f.read()
+    return chunk[:chunk.rfind(b"\n") + 1]
+
+
+class CsvCustomerStore:
+    """customers.csv with a dict index keyed by customer_id.
+
+    The index is built on first use and refreshed when the file's size or
+    mtime changes. Pure appends are parsed from the last known offset; any
+    other change (shrink, rewrite, replaced inode) triggers a full rebuild.
+
+    Profile updates never rewrite the CSV. They are appended to an update log
+    (``<path>.updates``, one JSON record of absolute field values per line)
+    and overlaid on the indexed row at read time. ``compact`` folds the log
+    into a fresh base file and swaps it in atomically; because log records
+    hold absolute values, replaying a log over an already-compacted base is
+    harmless, so a crash mid-compaction loses nothing.
+    """
+
+    def __init__(self, path, compact_bytes=1_000_000):
+        self.path = path
+        self.log_path = path + ".updates"
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._index = {}
+        self._overlay = {}  # cid -> {column: value} from the update log
+        self._versions = {}
+        self._header = None
+        self._columns = {}
+        self._offset = 0
+        self._log_offset = 0
+        self._sig = None  # (inode, size, mtime_ns) of the last indexed version
+        self._log_sig = None
+        self._committer = GroupCommitter(self.add_many)
+        self._log_committer = GroupCommitter(self._append_updates)
+        self._ids = IdAllocator(path, self.max_id)
+        self._compacting = threading.Lock()
+
+    def _refresh(self):
+        sig, log_sig = _stat(self.path), _stat(self.log_path)
+        if sig == self._sig and log_sig == self._log_sig:
+            return
+        old_index, old_overlay = self._index, dict(self._overlay)
+        rebuilt = False
+        if sig != self._sig:
+            if _is_append(self._sig, sig):
+                self._scan_from(self._offset)
+            else:
+                self._index, self._header, self._offset = {}, None, 0
+                if sig:
+                    self._scan_from(0)
+                rebuilt = True
+            self._sig = sig
+        if log_sig != self._log_sig:
+            if _is_append(self._log_sig, log_sig):
+                for cid in self._scan_log(self._log_offset):
+                    self._bump(cid)
+            else:
+                self._overlay, self._log_offset = {}, 0
+                if log_sig:
+                    self._scan_log(0)
+                rebuilt = True
+            self._log_sig = log_sig
+        if rebuilt:
+            changed = {c for c, v in self._index.items() if old_index.get(c, v) != v}
+            for cid in changed | old_overlay.keys() | self._overlay.keys():
+                if self._effective(old_index, old_overlay, cid) != self._effective(self._index, self._overlay, cid):
+                    self._bump(cid)
+
+    def _scan_from(self, offset):
+        data = _complete_lines(self.path, offset)
+        if not data:
+            return
+        reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+        if self._header is None:
+            self._header = next(reader, None) or FIELDS
+            self._columns = {col: i for i, col in enumerate(self._header)}
+        rows = 0
+        for values in reader:
+            if not values:
+                continue
+            rows += 1
+            cid = values[0]
+            if cid not in self._index:  # first row wins, like the old linear scan
+                self._index[cid] = tuple(values)
+        self._offset = offset + len(data)
+        if metrics.ENABLED:
+            metrics.inc("customer_rows_scanned_total", rows, file="base")
+            metrics.inc("customer_bytes_read_total", len(data), file="base")
+
+    def _scan_log(self, offset):
+        data = _complete_lines(self.log_path, offset)
+        touched = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            cid = rec["cid"]
+            # new dict per record so snapshots taken in _refresh stay intact
+            self._overlay[cid] = {**self._overlay.get(cid, {}), **rec["set"]}
+            touched.append(cid)
+        self._log_offset = offset + len(data)
+        if metrics.ENABLED:
+            metrics.inc("customer_rows_scanned_total", len(touched), file="updates")
+            metrics.inc("customer_bytes_read_total", len(data), file="updates")
+        return touched
+
+    def _effective(self, index, overlay, cid):
+        values = index.get(cid)
+        changes = overlay.get(cid)
+        if values is None or not changes:
+            return values
+        values = list(values)
+        for col, value in changes.items():
+            i = self._columns.get(col)
+            if i is not None and i < len(values):
+                values[i] = str(value)
+        return tuple(values)
+
+    def _bump(self, cid):
+        self._versions[cid] = self._versions.get(cid, 0) + 1
+
+    def version(self, cid):
+        """Generation counter for one customer; changes whenever their row does."""
+        with self._lock:
+            self._refresh()
+            return self._versions.get(str(cid), 0)
+
+    def get(self, cid):
+        with self._lock:
+            self._refresh()
+            values = self._effective(self._index, self._overlay, str(cid))
+            header = self._header
+        if values is None:
+            return None
+        return row_to_customer(dict(zip(header, values)))
+
+    def max_id(self):
+        with self._lock:
+            self._refresh()
+            return max((int(c) for c in self._index if c.isdigit()), default=0)
+
+    def allocate_id(self):
+        return self._ids.allocate()
+
+    def add(self, row):
+        """Append one row; returns once it is on disk (group-committed)."""
+        self._committer.submit(row)
+
+    def add_many(self, rows):
+        buf = io.StringIO(newline="")
+        csv.writer(buf).writerows(rows)
+        data = buf.getvalue().encode("utf-8")
+        with file_lock(self.path):
+            ensure_csv(self.path)
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ---------- Updates ----------
+    def update(self, cid, changes):
+        """Set columns (CSV column names) for one customer. Costs one
+        group-committed log append; returns once the record is durable."""
+        unknown = set(changes) - set(FIELDS[1:])
+        if unknown:
+            raise ValueError(f"Unknown customer fields: {sorted(unknown)}")
+        self._log_committer.submit({"cid": str(cid), "set": {k: str(v) for k, v in changes.items()}})
+
+    def _append_updates(self, records):
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode("utf-8")
+        with file_lock(self.path):
+            with open(self.log_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        if size >= self.compact_bytes:
+            self.compact_in_background()
+
+    def compact(self):
+        """Fold the update log into a fresh customers.csv (atomic swap)."""
+        with file_lock(self.path):
+            with self._lock:
+                self._refresh()
+                if not self._overlay:
+                    return False
+                rows = [self._effective(self._index, self._overlay, cid) for cid in self._index]
+                header = self._header or FIELDS
+            tmp = self.path + ".compact.tmp"
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            # A crash here leaves the old log; replaying it is idempotent
+            tmp_log = self.log_path + ".tmp"
+            open(tmp_log, "wb").close()
+            os.replace(tmp_log, self.log_path)
+        return True
+
+    def compact_in_background(self):
+        if not self._compacting.acquire(blocking=False):
+            return  # already running
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name="customer-compaction", daemon=True).start()
+
+    def updated_ids(self):
+        """Customer IDs with changes still in the update log (not yet compacted)."""
+        with self._lock:
+            self._refresh()
+            return list(self._overlay)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+
+# ------------------ SQLite backend ------------------
+class SqliteCustomerStore:
+    """Same interface as CsvCustomerStore, backed by a SQLite table whose
+    primary key is customer_id."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._committer = GroupCommitter(self.add_many)
+        self._ids = IdAllocator(path, self.max_id)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS customers ("
+                "customer_id TEXT PRIMARY KEY, name TEXT, password TEXT, "
+                "monthly_income REAL, age INTEGER, employment_type TEXT, "
+                "existing_emi REAL, credit_score INTEGER, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def get(self, cid):
+        row = self._conn().execute(
+            "SELECT * FROM customers WHERE customer_id = ?", (str(cid),)
+        ).fetchone()
+        if row is None:
+            return None
+        return row_to_customer(dict(row))
+
+    def version(self, cid):
+        row = self._conn().execute(
+            "SELECT version FROM customers WHERE customer_id = ?", (str(cid),)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def max_id(self):
+        row = self._conn().execute(
+            "SELECT MAX(CAST(customer_id AS INTEGER)) FROM customers"
+        ).fetchone()
+        return row[0] or 0
+
+    def allocate_id(self):
+        return self._ids.allocate()
+
+    def add(self, row):
+        self._committer.submit(row)
+
+    def add_many(self, rows):
+        # One transaction (and one WAL sync) per batch
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT INTO customers ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                [[str(v) if i == 0 else v for i, v in enumerate(row)] for row in rows],
+            )
+
+    def update(self, cid, changes):
+        unknown = set(changes) - set(FIELDS[1:])
+        if unknown:
+            raise ValueError(f"Unknown customer fields: {sorted(unknown)}")
+        assignments = ", ".join(f"{k} = ?" for k in changes)
+        with self._conn() as conn:
+            conn.execute(
+                f"UPDATE customers SET {assignments}, version = version + 1 WHERE customer_id = ?",
+                [*changes.values(), str(cid)],
+            )
+
+    def compact(self):
+        # Indexed in place already; just fold the WAL back into the database
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+
+
+def is_sqlite_path(path):
+    return os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3")
+
+
+def open_store(path):
+    """Pick the backend from the file extension (.db/.sqlite -> SQLite, else CSV)."""
+    if is_sqlite_path(path):
+        return SqliteCustomerStore(path)
+    ensure_csv(path)
+    return CsvCustomerStore(path)
+
+
+# ------------------ Migration ------------------
+def migrate_csv_to_sqlite(csv_path, db_path, batch_size=10_000):
+    """Copy every row of customers.csv into a SQLite store. Safe to re-run:
+    rows whose customer_id already exists are skipped. Returns rows inserted."""
+    store = SqliteCustomerStore(db_path)
+    conn = store._conn()
+    sql = (
+        f"INSERT OR IGNORE INTO customers ({', '.join(FIELDS)}) "
+        f"VALUES ({', '.join('?' * len(FIELDS))})"
+    )
+    before = len(store)
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        batch = []
+        for row in reader:
+            batch.append([row.get(k) for k in FIELDS])
+            if len(batch) >= batch_size:
+                with conn:
+                    conn.executemany(sql, batch)
+                batch = []
+        if batch:
+            with conn:
+                conn.executemany(sql, batch)
+    return len(store) - before
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("usage: python customer_store.py migrate customers.csv customers.db")
+        sys.exit(1)
+    n = migrate_csv_to_sqlite(sys.argv[2], sys.argv[3])
+    print(f"Migrated {n} customers into {sys.argv[3]}")
@@ -0,0 +1,276 @@
+"""Declarative dialogue flows compiled into dispatch tables (flows.json).
+
+The spec lists reusable steps (the field they fill, the prompt that asks for
+it, and a validator), the products built from them, the quick commands and
+the idle intents. ``load_flow`` compiles it into:
+
+* ``steps``: dialogue state -> compiled step (validator closure with its
+  regex / limits bound, prompt, next step), so a turn is one dict lookup
+  whatever the number of products or states;
+* ``commands``: exact text -> command name;
+* a keyword automaton (Aho-Corasick) that finds every intent and product
+  keyword in one pass over the message.
+
+The default product's states keep the bare step names ("ask_amount"); other
+products prefix them ("home:ask_amount"), so several product flows run side
+by side. A step entry in a product may be ``{"use": <step>, ...}`` to
+override the prompt or validator settings for that product.
+
+The spec is compiled on first use (config ``flows``, BFSI_FLOWS); unlike
+the rate card it is not reloaded while running, since a live conversation
+could be left in a state that no longer exists.
+"""
+import json
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import get_settings
+
+_NON_NUMERIC = re.compile(r"[^\d.]")
+
+
+class FlowSpecError(ValueError):
+    """The flow spec is missing fields or refers to unknown steps."""
+
+
+def parse_number(text):
+    cleaned = _NON_NUMERIC.sub("", text)
+    if not cleaned:
+        return None
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+# ------------------ Validators ------------------
+# Each builder binds its settings once and returns check(text) -> (value, error);
+# error is None when the input is accepted.
+def _number(spec):
+    error = spec["error"]
+    range_error = spec.get("range_error", error)
+    integer = spec.get("integer", False)
+    gt = spec.get("gt")
+    lo, hi = spec.get("min"), spec.get("max")
+
+    def check(text):
+        value = parse_number(text)
+        if value is None or (gt is not None and value <= gt):
+            return None, error
+        if integer:
+            value = int(value)
+        if (lo is not None and value < lo) or (hi is not None and value > hi):
+            return None, range_error
+        return value, None
+    return check
+
+
+def _pattern(spec):
+    search = re.compile(spec["pattern"]).search
+    error = spec["error"]
+    title = spec.get("transform") == "title"
+
+    def check(text):
+        if not search(text):
+            return None, error
+        return (text.title() if title else text), None
+    return check
+
+
+def _date(spec):
+    fmt, error = spec["format"], spec["error"]
+    range_error = spec.get("range_error", error)
+    min_year = spec.get("min_year", 1)
+
+    def check(text):
+        try:
+            dt = datetime.strptime(text, fmt)
+        except ValueError:
+            return None, error
+        if dt.year < min_year or dt > datetime.now():
+            return None, range_error
+        return text, None
+    return check
+
+
+def _text(spec):
+    min_length, error = spec.get("min_length", 1), spec["error"]
+
+    def check(text):
+        if len(text) < min_length:
+            return None, error
+        return text, None
+    return check
+
+
+def _choice(spec):
+    options = [(str(k), v) for k, v in spec["options"]]
+    error = spec["error"]
+
+    def check(text):
+        for keyword, value in options:
+            if keyword in text:
+                return value, None
+        return None, error
+    return check
+
+
+VALIDATORS = {"number": _number, "pattern": _pattern, "date": _date, "text": _text, "choice": _choice}
+
+
+# ------------------ Keyword automaton ------------------
+class KeywordAutomaton:
+    """Aho-Corasick matcher: every keyword occurring anywhere in a text, in
+    one pass over its characters however many keywords there are."""
+
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, label)
+        self._goto = [{}]
+        self._out = [set()]
+        for word, label in keywords:
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(set())
+                node = nxt
+            self._out[node].add(label)
+        # breadth-first failure links; outputs inherit along them
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())  # depth-1 nodes fail to the root
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                self._out[child] |= self._out[self._fail[child]]
+        self._out = [frozenset(o) for o in self._out]
+
+    def scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        found, node = set(), 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+# ------------------ Compiled flow ------------------
+class Step:
+    __slots__ = ("state", "product", "field", "prompt", "check", "next")
+
+    def __init__(self, state, product, field, prompt, check):
+        self.state = state
+        self.product = product
+        self.field = field
+        self.prompt = prompt
+        self.check = check
+        self.next = None  # None: the application is complete
+
+
+class Product:
+    __slots__ = ("name", "label", "first", "rate_card", "collateral", "min_credit_score",
+                 "salary_slip_income_multiple")
+
+    def __init__(self, name, spec, first, rate_card):
+        self.name = name
+        self.label = spec.get("label", name.title())
+        self.first = first
+        self.rate_card = rate_card  # None: the configured default card
+        self.collateral = spec.get("collateral")
+        self.min_credit_score = spec.get("min_credit_score", 700)
+        self.salary_slip_income_multiple = spec.get("salary_slip_income_multiple", 20)
+
+
+class Flow:
+    def __init__(self, spec, base_dir="."):
+        try:
+            self.messages = spec["messages"]
+            self.default = spec["default_product"]
+            self.confirm_words = frozenset(spec.get("confirm_words", ("yes", "y")))
+            self.commands = {text: name for name, texts in spec.get("commands", {}).items() for text in texts}
+            self.intent_priority = [intent["name"] for intent in spec.get("intents", [])]
+            keywords = [(kw, ("intent", intent["name"])) for intent in spec.get("intents", [])
+                        for kw in intent["keywords"]]
+            self.steps, self.products, self.product_order = {}, {}, []
+            for name, product in spec["products"].items():
+                self.products[name] = self._compile_product(name, product, spec["steps"], base_dir)
+                self.product_order.append(name)
+                keywords += [(kw, ("product", name)) for kw in product.get("keywords", ())]
+        except (KeyError, TypeError) as e:
+            raise FlowSpecError(f"Invalid flow spec: {e!r}") from e
+        if self.default not in self.products:
+            raise FlowSpecError(f"Unknown default product {self.default!r}")
+        self.automaton = KeywordAutomaton(keywords)
+
+    def _compile_product(self, name, spec, library, base_dir):
+        prefix = "" if name == self.default else f"{name}:"
+        compiled = []
+        for entry in spec["steps"]:
+            if isinstance(entry, str):
+                entry = {"use": entry}
+            base = library.get(entry["use"])
+            if base is None:
+                raise FlowSpecError(f"Product {name!r} uses unknown step {entry['use']!r}")
+            validate = {**base["validate"], **entry.get("validate", {})}
+            kind = validate.get("type")
+            if kind not in VALIDATORS:
+                raise FlowSpecError(f"Step {entry['use']!r} has unknown validator {kind!r}")
+            step = Step(prefix + entry["use"], name, entry.get("field", base["field"]),
+                        entry.get("prompt", base["prompt"]), VALIDATORS[kind](validate))
+            if step.state in self.steps:
+                raise FlowSpecError(f"Product {name!r} repeats step {entry['use']!r}")
+            if compiled:
+                compiled[-1].next = step
+            compiled.append(step)
+            self.steps[step.state] = step
+        if not compiled:
+            raise FlowSpecError(f"Product {name!r} has no steps")
+        card = spec.get("rate_card")
+        return Product(name, spec, compiled[0], os.path.join(base_dir, card) if card else None)
+
+    def classify(self, text):
+        """(intent, product) for an idle message: the highest-priority intent
+        found and the first product (spec order) named, either may be None."""
+        found = self.automaton.scan(text)
+        intent = next((i for i in self.intent_priority if ("intent", i) in found), None)
+        product = next((p for p in self.product_order if ("product", p) in found), None)
+        return intent, product
+
+    def product(self, name):
+        return self.products.get(name) or self.products[self.default]
+
+
+def load_flow(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        raise FlowSpecError(f"Cannot read flow spec {path}: {e}") from e
+    return Flow(spec, os.path.dirname(os.path.abspath(path)))
+
+
+_flow = None
+_flow_lock = threading.Lock()
+
+
+def get_flow():
+    """Flow compiled from config ``flows``, once per process."""
+    global _flow
+    if _flow is None:
+        with _flow_lock:
+            if _flow is None:
+                _flow = load_flow(get_settings().flows)
+    return _flow
@@ -0,0 +1,103 @@
+"""Safe retries for chat turns and sanctions.
+
+Turn cache: the last turn of each session is kept as (hash of the input,
+reply, state it left the conversation in). A repeat of that input within
+the idempotency window - a Streamlit rerun, a double-submitted "yes", a
+client retry racing the first request - gets the first reply back instead
+of being processed again, as long as no other turn came in between and the
+conversation is still where that turn left it. The agent decides what is
+worth keeping: turns that carry a client submission ID, and otherwise only
+turns that moved the conversation on (see MasterAgent._idempotent). The
+cache is per process.
+
+Sanction ledger: one sanction per application ID. Claims are put-if-absent
+writes to their own durable store (config sanction_ledger, a SQLite file by
+default), never to the in-memory session LRU, where a claim could be evicted
+and the application sanctioned again. Point every worker at the same ledger
+(file:<shared dir> or one SQLite file) and the guarantee holds across them.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_settings
+from session_store import open_session_store
+
+
+def turn_digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class TurnCache:
+    def __init__(self, window=5.0, max_entries=100_000):
+        self.window = window
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # session -> (expires_at, digest, reply, state after the turn)
+
+    def get(self, session_id, digest, current_state):
+        """Cached reply if this input repeats the session's last turn, or None."""
+        if self.window <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+        if entry is None or entry[0] < time.monotonic() or entry[1] != digest or entry[3] != current_state:
+            return None
+        return entry[2]
+
+    def put(self, session_id, digest, reply, new_state):
+        if self.window <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[session_id] = (now + self.window, digest, reply, new_state)
+            self._entries.move_to_end(session_id)
+            # entries are in expiry order, so expired ones are at the front
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or next(iter(self._entries.values()))[0] < now):
+                self._entries.popitem(last=False)
+
+
+class SanctionLedger:
+    PREFIX = "sanction-"
+
+    def __init__(self, store):
+        self.store = store
+
+    def claim(self, application_id, cid):
+        """True for the first claim of an application; False if it was already sanctioned."""
+        return self.store.add(self.PREFIX + application_id, f"{cid}:{time.time():.3f}".encode("ascii"))
+
+    def release(self, application_id):
+        """Give a claim back when the sanction could not be issued after all."""
+        self.store.delete(self.PREFIX + application_id)
+
+
+_turn_cache = None
+_ledger = None
+_lock = threading.Lock()
+
+
+def get_turn_cache():
+    global _turn_cache
+    with _lock:
+        if _turn_cache is None:
+            _turn_cache = TurnCache(get_settings().idempotency_window)
+        return _turn_cache
+
+
+def get_sanction_ledger():
+    """Ledger on the configured sanction_ledger store, opened on first use."""
+    global _ledger
+    with _lock:
+        if _ledger is None:
+            spec = get_settings().sanction_ledger
+            if spec.partition(":")[0] == "memory":
+                raise ValueError("The sanction ledger needs a durable store (file:<dir> or sqlite:<path>)")
+            _ledger = SanctionLedger(open_session_store(spec))
+        return _ledger
@@ -0,0 +1,259 @@
+"""Conversation replay load test for MasterAgent.
+
+Generates scripted conversations (every ask_* state, salary-upload branches,
+confirms and cancels) and drives them through many concurrent MasterAgent
+instances against a scratch customer file of any size:
+
+    python loadtest.py --customers 1000000 --conversations 5000 --concurrency 64 \\
+        --out bench_results.json --compare previous.json
+
+Reports p50/p95/p99 latency per dialogue state, sanction-letter throughput
+and peak memory, and writes them as JSON for run-to-run comparison.
+``--bureau-latency-ms 20`` takes credit scores from a local stub bureau
+(bureau_stub.py) to see what a networked bureau adds to the final check.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HEADER = ["customer_id", "name", "password", "monthly_income", "age",
+          "employment_type", "existing_emi", "credit_score"]
+
+
+# ------------------ Scratch data ------------------
+def build_customers(path, n, seed=0):
+    """Copy the repo's customers.csv and pad it with synthetic rows up to n.
+    Returns the rows as (cid, income, existing_emi, credit_score)."""
+    rng = random.Random(seed)
+    rows = []
+    src = os.path.join(REPO_DIR, "customers.csv")
+    if os.path.isfile(src):
+        with open(src, "r", newline="", encoding="utf-8") as f:
+            rows = [[r[k] for k in HEADER] for r in csv.DictReader(f)][:n]
+    next_id = 200001
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+        batch = []
+        for _ in range(n - len(rows)):
+            row = [str(next_id), f"Load{next_id}", "pw", rng.randrange(20_000, 200_000, 500),
+                   rng.randint(21, 60), rng.choice(["Salaried", "Self-Employed"]),
+                   rng.choice([0, 0, 0, 2000, 5000]), rng.randint(620, 850)]
+            next_id += 1
+            batch.append(row)
+            rows.append(row)
+            if len(batch) >= 50_000:
+                writer.writerows(batch)
+                batch = []
+        writer.writerows(batch)
+    return [(str(r[0]), float(r[3]), float(r[6]), int(r[7])) for r in rows]
+
+
+# ------------------ Scripts ------------------
+def make_script(rng, customer):
+    """One conversation as a list of ("msg", text) / ("upload", bytes, name) steps."""
+    cid, income, existing, score = customer
+    kind = rng.choices(
+        ["apply_confirm", "apply_cancel", "salary_verified", "salary_discrepancy", "eligibility", "invalid_inputs"],
+        weights=[35, 10, 15, 10, 20, 10],
+    )[0]
+    steps = []
+    if kind == "eligibility":
+        return kind, [("msg", "check eligibility"), ("msg", "offers")]
+    amount = max(10_000, int(income * (25 if kind.startswith("salary") else rng.uniform(1, 6))))
+    if kind == "invalid_inputs":
+        steps += [("msg", "apply loan"), ("msg", "lots"), ("msg", str(amount)), ("msg", "3"),
+                  ("msg", "24"), ("msg", "123"), ("msg", "Load Tester"), ("msg", "31-31-2000"),
+                  ("msg", "01-01-1990"), ("msg", "x"), ("msg", "ABCDE1234F"), ("msg", f"{income:.0f}"),
+                  ("msg", "freelance"), ("msg", "salaried"), ("msg", f"{existing:.0f}"), ("msg", "no")]
+        return kind, steps
+    steps += [("msg", "apply loan"), ("msg", str(amount)), ("msg", str(rng.choice([12, 24, 36, 60, 84]))),
+              ("msg", "Load Tester"), ("msg", "01-01-1990"), ("msg", "ABCDE1234F"),
+              ("msg", f"{income:.0f}"), ("msg", "salaried"), ("msg", f"{existing:.0f}")]
+    if kind == "salary_verified":
+        steps.append(("upload", f"Salary slip\nNet Pay: {income:,.0f}\n".encode(), "slip.txt"))
+    elif kind == "salary_discrepancy":
+        steps.append(("upload", f"Salary slip\nNet Pay: {income * 3:,.0f}\n".encode(), "slip.txt"))
+    steps.append(("msg", "no" if kind == "apply_cancel" else "yes"))
+    return kind, steps
+
+
+# ------------------ Runner ------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.jobs = []
+
+    def record(self, key, seconds):
+        with self._lock:
+            self.latencies.setdefault(key, []).append(seconds)
+
+
+def run_conversation(chatbot, customer, script, rec):
+    agent = chatbot.MasterAgent(customer[0])
+    t = time.perf_counter()
+    agent.start_chat()
+    rec.record("start_chat", time.perf_counter() - t)
+    for step in script:
+        state = agent.state
+        t = time.perf_counter()
+        if step[0] == "msg":
+            agent.reply(step[1])
+            key = state
+        else:
+            agent.process_salary_upload(step[1], step[2])
+            key = "process_salary_upload"
+        rec.record(key, time.perf_counter() - t)
+        if agent.sanction_job is not None:
+            with rec._lock:
+                rec.jobs.append(agent.sanction_job)
+            agent.sanction_job = None
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"count": len(values), "mean_ms": 1e3 * sum(values) / len(values),
+            "p50_ms": 1e3 * pick(0.50), "p95_ms": 1e3 * pick(0.95), "p99_ms": 1e3 * pick(0.99),
+            "max_ms": 1e3 * values[-1]}
+
+
+def run(n_customers, n_conversations, concurrency, seed=0, trace_memory=False, keep_scratch=False,
+        collect_metrics=False, bureau_latency_ms=None):
+    scratch = tempfile.mkdtemp(prefix="bfsi-loadtest-")
+    sys.path.insert(0, REPO_DIR)
+    try:
+        t = time.perf_counter()
+        customers = build_customers(os.path.join(scratch, "customers.csv"), n_customers, seed)
+        setup_s = time.perf_counter() - t
+        import config
+        bureau_url = None
+        if bureau_latency_ms is not None:
+            # stand-in bureau serving the scratch customers' scores
+            import bureau_stub
+            scores = bureau_stub.scores_from_store(os.path.join(scratch, "customers.csv"))
+            bureau_url = bureau_stub.start_stub(scores=scores, latency_ms=bureau_latency_ms)[1]
+        config.configure(data_dir=scratch, bureau_url=bureau_url)  # every data file goes to the scratch dir
+        if trace_memory:
+            tracemalloc.start()
+        import chatbot
+        import metrics
+        if collect_metrics:
+            metrics.enable()
+
+        rng = random.Random(seed)
+        scripts = []
+        for _ in range(n_conversations):
+            customer = customers[rng.randrange(len(customers))]
+            scripts.append((customer,) + make_script(rng, customer))
+        rec = Recorder()
+        kinds = {}
+        for _, kind, _ in scripts:
+            kinds[kind] = kinds.get(kind, 0) + 1
+
+        t = time.perf_counter()
+        chatbot.get_customer_by_cid(customers[0][0])  # first lookup builds the index
+        index_build_s = time.perf_counter() - t
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for f in [pool.submit(run_conversation, chatbot, c, steps, rec) for c, _, steps in scripts]:
+                f.result()
+        chat_s = time.perf_counter() - start
+        for job in rec.jobs:
+            try:
+                job.result(timeout=120)
+            except Exception:
+                pass
+        total_s = time.perf_counter() - start
+        letters = sum(1 for j in rec.jobs if j.status() == "done")
+
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        turns = sum(len(v) for v in rec.latencies.values())
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {"customers": n_customers, "conversations": n_conversations,
+                       "concurrency": concurrency, "seed": seed,
+                       "python": platform.python_version(), "cpus": os.cpu_count()},
+            "conversation_mix": kinds,
+            "setup_s": setup_s,
+            "index_build_s": index_build_s,
+            "chat_wall_s": chat_s,
+            "turns": turns,
+            "turns_per_s": turns / chat_s if chat_s else 0.0,
+            "states": {k: percentiles(v) for k, v in sorted(rec.latencies.items())},
+            "sanctions": {"submitted": len(rec.jobs), "completed": letters,
+                          "per_s": letters / total_s if total_s else 0.0},
+            "peak_rss_mb": rss_kb / 1024 if sys.platform != "darwin" else rss_kb / 1024 / 1024,
+            "traced_peak_mb": traced_peak / 1e6 if traced_peak is not None else None,
+            "metrics": metrics.snapshot() if collect_metrics else None,
+        }
+    finally:
+        if keep_scratch:
+            print(f"Scratch data kept in {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def print_report(result, baseline=None):
+    cfg = result["config"]
+    print(f"{cfg['conversations']} conversations, {cfg['customers']:,} customers, concurrency {cfg['concurrency']}")
+    print(f"index build {result['index_build_s']:.2f}s, {result['turns']} turns in {result['chat_wall_s']:.2f}s "
+          f"({result['turns_per_s']:.0f}/s), peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"{'state':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" + ("   p95 vs base" if baseline else ""))
+    for state, s in result["states"].items():
+        line = f"{state:<24}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+        base = (baseline or {}).get("states", {}).get(state)
+        if base and base["p95_ms"]:
+            line += f"   {100 * (s['p95_ms'] / base['p95_ms'] - 1):+.1f}%"
+        print(line)
+    sc = result["sanctions"]
+    print(f"sanction letters: {sc['completed']}/{sc['submitted']} ({sc['per_s']:.1f}/s)")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay scripted conversations against MasterAgent")
+    ap.add_argument("--customers", type=int, default=20, help="rows in the scratch customers.csv")
+    ap.add_argument("--conversations", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--trace-memory", action="store_true", help="tracemalloc peak (slower)")
+    ap.add_argument("--keep-scratch", action="store_true")
+    ap.add_argument("--metrics", action="store_true", help="enable instrumentation and include its snapshot")
+    ap.add_argument("--bureau-latency-ms", type=float, metavar="MS",
+                    help="fetch credit scores from a local stub bureau with this latency")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="earlier results JSON to diff p95 against")
+    args = ap.parse_args(argv)
+
+    result = run(args.customers, args.conversations, args.concurrency, args.seed,
+                 args.trace_memory, args.keep_scratch, args.metrics, args.bureau_latency_ms)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
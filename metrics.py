@@ -0,0 +1,167 @@
+"""Opt-in hot-path instrumentation for the loan flow.
+
+Disabled unless BFSI_METRICS=1 (or ``enable()`` is called). When disabled,
+``timed`` functions pay one attribute check per call and the counting helpers
+are skipped by callers testing ``metrics.ENABLED`` first.
+
+Collected:
+    *_seconds histograms   latency of lookups, reply states, uploads, rendering
+    *_total counters        rows scanned, bytes read, letters rendered, ...
+    chat_transitions_total  state -> state funnel
+
+Export with ``render_prometheus()`` (served at GET /metrics by api_server) or
+``start_json_dump(path, interval)``; BFSI_METRICS_DUMP=<path> starts the dump
+at import (BFSI_METRICS_INTERVAL seconds, default 60).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get("BFSI_METRICS", "") not in ("", "0")
+
+# seconds; chat turns are sub-millisecond, rendering and uploads tens of ms
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}    # (name, labels) -> value
+_dumper = None
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    i = bisect_left(BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        h[i] += 1
+        h[-1] += seconds
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def transition(from_state, to_state):
+    inc("chat_transitions_total", **{"from": from_state, "to": to_state})
+
+
+def timed(name, **labels):
+    """Decorator: record the call's wall time into histogram ``name``."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return inner
+    return wrap
+
+
+# ------------------ Export ------------------
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def snapshot():
+    """Plain-dict copy of every metric (what the JSON dump writes)."""
+    with _lock:
+        hists = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    out = {"timestamp": time.time(), "histograms": [], "counters": []}
+    for (name, labels), h in sorted(hists.items()):
+        count = sum(h[:-1])
+        out["histograms"].append({
+            "name": name, "labels": dict(labels), "count": count, "sum": h[-1],
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h[:-1])),
+        })
+    for (name, labels), value in sorted(counters.items()):
+        out["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    return out
+
+
+def render_prometheus():
+    """Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        hists = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines, typed = [], set()
+    for (name, labels), h in sorted(hists.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, n in zip([str(b) for b in BUCKETS] + ["+Inf"], h[:-1]):
+            cumulative += n
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def start_json_dump(path, interval=60.0):
+    """Rewrite ``path`` with a snapshot every ``interval`` seconds (daemon thread)."""
+    global _dumper
+    if _dumper is not None:
+        return _dumper
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_json(path)
+            except OSError:
+                pass  # try again next tick
+
+    _dumper = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    _dumper.start()
+    return _dumper
+
+
+if ENABLED and os.environ.get("BFSI_METRICS_DUMP"):
+    start_json_dump(os.environ["BFSI_METRICS_DUMP"], float(os.environ.get("BFSI_METRICS_INTERVAL", "60")))
@@ -0,0 +1,327 @@
+"""Offline pre-approval pipeline over the whole customer base.
+
+Streams the customer store in chunks, applies the chatbot's eligibility rules
+in vectorized form and writes a compact table (``preapproval.npy``) that the
+chatbot can look up in O(1). Limits are priced from the configured rate card
+(see ``segment_rates``), like the chatbot's final terms:
+
+    python preapproval.py --customers customers.csv --out preapproval.npy
+
+The table is an open-addressing hash table stored as a NumPy structured
+array, so it is memory-mapped rather than loaded, and a lookup touches only a
+slot or two. Each row keeps the income, existing EMI, score and rate it was
+computed from, so a reader can tell per customer whether the row still
+matches the live profile and card: signups and profile updates after the
+build only invalidate the rows they touch. A small ``<out>.json`` sidecar
+records the source store and build time. Rebuilds replace the table
+atomically; readers reopen it when it changes (``PreapprovalTable.is_stale``).
+
+When a credit bureau is configured (BFSI_BUREAU_URL or ``--bureau-url``),
+scores come from the bureau instead of the stored column, fetched in bulk
+requests per chunk rather than one call per customer.
+"""
+import argparse
+import csv
+import itertools
+import json
+import operator
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+import affordability
+from config import get_settings
+from customer_store import is_sqlite_path
+from rate_card import get_rate_card
+
+MIN_CREDIT_SCORE = 700
+INCOME_MULTIPLE = 12  # pre-approved limit = 12x monthly income ...
+MAX_TENURE = 84       # ... capped by what the EMI headroom supports over the longest tenure
+
+TABLE_DTYPE = np.dtype([
+    ("cid", "<u8"),          # 0 marks an empty slot
+    ("credit_score", "<u2"),
+    ("income", "<f8"),
+    ("existing_emi", "<f8"),
+    ("rate", "<f8"),
+    ("eligible", "u1"),
+    ("pre_approved", "<f4"),
+    ("emi_headroom", "<f4"),
+])
+
+
+def segment_rates(employment, credit_score, card=None):
+    """Annual rate per customer from the rate card (default: the configured
+    card): their employment and score band at the dearest amount tier, so a
+    limit priced at it stays affordable whatever the size of the loan.
+    Works on scalars or arrays."""
+    card = card or get_rate_card()
+    score = np.asarray(credit_score, dtype=np.int64)
+    if score.ndim == 0:
+        return card.rate_ceiling(employment, int(score))
+    names, code = np.unique(np.asarray(employment, dtype=object).astype(str), return_inverse=True)
+    keys, inverse = np.unique(code.astype(np.int64) << 32 | score, return_inverse=True)
+    rates = np.array([card.rate_ceiling(str(names[k >> 32]), int(k & 0xFFFFFFFF)) for k in keys.tolist()])
+    return rates[inverse.reshape(score.shape)]
+
+
+def evaluate(income, existing_emi, credit_score, rate):
+    """Vectorized eligibility rules; works on scalars or arrays. ``rate`` is
+    the annual rate to price the limit at (see ``segment_rates``).
+
+    Returns (eligible, pre_approved, emi_headroom).
+    """
+    income = np.asarray(income, dtype=float)
+    headroom = affordability.allowed_emi(income, existing_emi)
+    rate = np.asarray(rate, dtype=float)[..., None]
+    max_loan = affordability.max_principal(income, existing_emi, [MAX_TENURE], rate)[..., 0]
+    eligible = (np.asarray(credit_score) >= MIN_CREDIT_SCORE) & (headroom > 0)
+    limit = np.where(eligible, np.minimum(income * INCOME_MULTIPLE, max_loan), 0.0)
+    return eligible, limit, headroom
+
+
+# ------------------ Source streaming ------------------
+_UPDATE_COLUMNS = ("monthly_income", "existing_emi", "credit_score", "employment_type")
+
+
+def pending_updates(path):
+    """{cid: {column: value}} from a CSV store's update log (changes not yet
+    compacted into the base file), read straight from the log."""
+    updates = {}
+    try:
+        f = open(path + ".updates", "r", encoding="utf-8")
+    except FileNotFoundError:
+        return updates
+    with f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            changes = {k: v for k, v in rec["set"].items() if k in _UPDATE_COLUMNS}
+            if changes and rec["cid"].isdigit():
+                updates.setdefault(int(rec["cid"]), {}).update(changes)
+    return updates
+
+
+def iter_chunks(path, chunk_rows=200_000):
+    """Yield (cid, income, existing_emi, credit_score, employment) NumPy arrays per chunk."""
+    if is_sqlite_path(path):
+        conn = sqlite3.connect(path)
+        cur = conn.execute("SELECT customer_id, monthly_income, existing_emi, credit_score, employment_type "
+                           "FROM customers")
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield _to_arrays(rows)
+        conn.close()
+        return
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        cols = [header.index(c) for c in ("customer_id", "monthly_income", "existing_emi", "credit_score",
+                                          "employment_type")]
+        pick = operator.itemgetter(*cols)
+        while True:
+            rows = [pick(values) for values in itertools.islice(reader, chunk_rows) if values]
+            if not rows:
+                break
+            yield _to_arrays(rows)
+
+
+def _number(value):
+    # like row_to_customer: blanks count as 0; unparseable cells too
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _column(values):
+    try:
+        column = np.array(values, dtype=float)  # one C-level parse of the whole column
+    except (TypeError, ValueError):
+        return np.array([_number(v) for v in values], dtype=float)
+    return np.nan_to_num(column, copy=False, nan=0.0)  # SQLite NULLs
+
+
+def _to_arrays(rows):
+    cid, income, existing, score, employment = zip(*rows)
+    return (np.array([int(c) for c in cid], dtype=np.uint64), _column(income), _column(existing),
+            _column(score).astype(np.int64), np.array(employment, dtype=object))
+
+
+def _apply_updates(updates, cid, income, existing, score, employment):
+    """Overlay update-log values on a chunk (in place)."""
+    if not updates:
+        return
+    for i in np.flatnonzero(np.isin(cid, np.fromiter(updates, dtype=np.uint64, count=len(updates)))):
+        changes = updates[int(cid[i])]
+        if "monthly_income" in changes:
+            income[i] = _number(changes["monthly_income"])
+        if "existing_emi" in changes:
+            existing[i] = _number(changes["existing_emi"])
+        if "credit_score" in changes:
+            score[i] = int(_number(changes["credit_score"]))
+        if "employment_type" in changes:
+            employment[i] = changes["employment_type"]
+
+
+# ------------------ Hash table ------------------
+def _hash_slots(cids, mask):
+    # Fibonacci hashing spreads sequential IDs across the table
+    return ((cids * np.uint64(11400714819323198485)) >> np.uint64(32)) & np.uint64(mask)
+
+
+def build_table(cid, score, income, existing, rate, eligible, limit, headroom):
+    """Pack rows into a linear-probing hash table (load factor <= 0.5)."""
+    n = len(cid)
+    cap = 1 << max(4, int(2 * n).bit_length())
+    mask = cap - 1
+    table = np.zeros(cap, dtype=TABLE_DTYPE)
+    pos = _hash_slots(cid, mask).astype(np.int64)
+    occupied = np.zeros(cap, dtype=bool)
+    pending = np.arange(n)
+    while pending.size:
+        p = pos[pending]
+        free = ~occupied[p]
+        slots, first = np.unique(p[free], return_index=True)
+        winners = pending[free][first]
+        occupied[slots] = True
+        table["cid"][slots] = cid[winners]
+        table["credit_score"][slots] = score[winners]
+        table["income"][slots] = income[winners]
+        table["existing_emi"][slots] = existing[winners]
+        table["rate"][slots] = rate[winners]
+        table["eligible"][slots] = eligible[winners]
+        table["pre_approved"][slots] = limit[winners]
+        table["emi_headroom"][slots] = headroom[winners]
+        placed = np.zeros(n, dtype=bool)
+        placed[winners] = True
+        pending = pending[~placed[pending]]
+        pos[pending] = (pos[pending] + 1) & mask
+    return table
+
+
+def run(customers, out, chunk_rows=200_000, bureau=None):
+    """Build the table; ``bureau`` is an optional credit_bureau.BureauClient."""
+    start = time.perf_counter()
+    # Profile updates still sitting in a CSV store's update log are not in the base file
+    updates = {} if is_sqlite_path(customers) else pending_updates(customers)
+    parts = [_evaluate_chunk(*chunk, bureau=bureau, updates=updates) for chunk in iter_chunks(customers, chunk_rows)]
+    if not parts:
+        parts = [(np.zeros(0, np.uint64), np.zeros(0, np.int64), np.zeros(0), np.zeros(0), np.zeros(0),
+                  np.zeros(0, bool), np.zeros(0), np.zeros(0))]
+    columns = [np.concatenate(cols) for cols in zip(*parts)]
+
+    # First row wins for duplicate IDs, like the customer index
+    _, first = np.unique(columns[0], return_index=True)
+    keep = np.sort(first)
+    cid, score, income, existing, rate, eligible, limit, headroom = (a[keep] for a in columns)
+
+    table = build_table(cid, score, income, existing, rate, eligible, limit, headroom)
+    tmp = out + ".tmp.json"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.abspath(customers), "rows": int(len(cid)), "built_at": time.time()}, f)
+    os.replace(tmp, out + ".json")
+    tmp = out + ".tmp.npy"
+    np.save(tmp, table)
+    os.replace(tmp, out)  # readers reopen on the new inode
+    elapsed = time.perf_counter() - start
+    print(f"Pre-approval table: {len(cid):,} customers, {int(eligible.sum()):,} eligible, "
+          f"{table.nbytes / 1e6:.1f} MB, built in {elapsed:.2f}s")
+    return table
+
+
+def _bureau_scores(bureau, cid, score):
+    """Bureau scores for a chunk (bulk requests); stored scores where the bureau has none."""
+    fetched = bureau.scores(cid.tolist())
+    return np.array([fetched.get(str(c), s) for c, s in zip(cid.tolist(), score.tolist())], dtype=np.int64)
+
+
+def _evaluate_chunk(cid, income, existing, score, employment, bureau=None, updates=None):
+    _apply_updates(updates, cid, income, existing, score, employment)
+    if bureau is not None:
+        score = _bureau_scores(bureau, cid, score)
+    rate = segment_rates(employment, score)
+    eligible, limit, headroom = evaluate(income, existing, score, rate)
+    return cid, score, income, existing, rate, eligible, limit, headroom
+
+
+# ------------------ Lookup ------------------
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class PreapprovalTable:
+    """Memory-mapped lookup over a table written by ``run``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = _signature(path)  # taken first: a swap during the load shows up as stale
+        self.table = np.load(path, mmap_mode="r")
+        self.mask = len(self.table) - 1
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {}
+
+    def is_for(self, customers):
+        """True if the table was built from this customer store."""
+        return self.meta.get("source") == os.path.abspath(customers)
+
+    def is_stale(self):
+        """True once the file has been rebuilt (or removed) since it was opened."""
+        return _signature(self.path) != self.signature
+
+    def get(self, cid):
+        try:
+            key = int(cid)
+        except (TypeError, ValueError):
+            return None
+        slot = int(_hash_slots(np.array([key], dtype=np.uint64), self.mask)[0])
+        while True:
+            row = self.table[slot]
+            found = int(row["cid"])
+            if found == 0:
+                return None
+            if found == key:
+                return {
+                    "credit_score": int(row["credit_score"]),
+                    "income": float(row["income"]),
+                    "existing_emi": float(row["existing_emi"]),
+                    "rate": float(row["rate"]),
+                    "eligible": bool(row["eligible"]),
+                    "pre_approved": float(row["pre_approved"]),
+                    "emi_headroom": float(row["emi_headroom"]),
+                }
+            slot = (slot + 1) & self.mask
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Precompute pre-approval offers for every customer")
+    settings = get_settings()
+    ap.add_argument("--customers", default=settings.customer_file, help="customer store (CSV or SQLite)")
+    ap.add_argument("--out", default=settings.preapproval_file)
+    ap.add_argument("--chunk-rows", type=int, default=200_000)
+    ap.add_argument("--bureau-url", default=settings.bureau_url, help="take credit scores from this bureau")
+    args = ap.parse_args(argv)
+    bureau = None
+    if args.bureau_url:
+        from credit_bureau import BureauClient
+        bureau = BureauClient(args.bureau_url, settings.bureau_timeout, ttl=0)  # one pass; nothing to reuse
+    run(args.customers, args.out, args.chunk_rows, bureau)
+
+
+if __name__ == "__main__":
+    main()
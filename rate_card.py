@@ -0,0 +1,195 @@
+"""Rate-card pricing compiled from a config file (rate_card.json).
+
+The card lists a base rate plus adjustments by employment type, credit-score
+band and amount tier, and promotions with simple conditions (employment,
+min_score, min_amount). ``compile_card`` evaluates every rule once
+for every segment (employment x score band x amount tier, with
+promotion thresholds merged into the band edges) and stores the result in a
+nested lookup table. Every distinct rate gets a precomputed row of EMI
+factors for each tenure in the card's range, so pricing an application is
+two bisects, a few list indexings and one multiply.
+
+The card is reloaded when the file changes, so rates can be edited without a
+code change or restart. Point BFSI_RATE_CARD at another file to swap cards;
+products other than the personal loan name their own card in flows.json.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+from config import get_settings
+
+RELOAD_CHECK_SECONDS = 5.0
+CONDITIONS = frozenset({"employment", "min_score", "min_amount"})  # what an application carries
+
+
+class RateCardError(ValueError):
+    """The rate card file is missing fields or has invalid values."""
+
+
+def _edges(bands, extra):
+    """Ascending lower bounds of the segments, including promotion thresholds."""
+    return sorted({float(b["min"]) for b in bands} | {float(x) for x in extra} | {0.0})
+
+
+def _band_adjust(bands, value):
+    for band in sorted(bands, key=lambda b: -b["min"]):
+        if value >= band["min"]:
+            return band["adjust"]
+    return 0.0
+
+
+def _matches(when, employment, score, amount):
+    if "employment" in when and when["employment"] != employment:
+        return False
+    if score < when.get("min_score", float("-inf")):
+        return False
+    return amount >= when.get("min_amount", float("-inf"))
+
+
+class CompiledCard:
+    def __init__(self, card):
+        try:
+            self.product = card.get("product", "Personal Loan")
+            self.base_rate = float(card["base_rate"])
+            self.min_rate = float(card.get("min_rate", 0.0))
+            self.max_rate = float(card.get("max_rate", 100.0))
+            self.min_tenure, self.max_tenure = (int(x) for x in card.get("tenure_months", (6, 84)))
+            self.fee_pct = float(card.get("processing_fee_pct", 0.0))
+            self.employment_adjust = {k: float(v) for k, v in card.get("employment", {}).items()}
+            self.score_bands = card.get("credit_score_bands", [])
+            self.amount_tiers = card.get("amount_tiers", [])
+            self.promotions = card.get("promotions", [])
+            for promo in self.promotions:
+                unknown = set(promo.get("when", {})) - CONDITIONS
+                if unknown:
+                    raise RateCardError(f"Promotion {promo['name']!r} has unknown conditions {sorted(unknown)}")
+        except (KeyError, TypeError, ValueError) as e:
+            raise RateCardError(f"Invalid rate card: {e}") from e
+        self.card = card
+
+        # Segment axes
+        self.employments = list(self.employment_adjust) + [None]  # None: anything else
+        self._employment_index = {e: i for i, e in enumerate(self.employments)}
+        self.score_edges = _edges(self.score_bands, [p["when"]["min_score"] for p in self.promotions
+                                                     if "min_score" in p.get("when", {})])
+        self.amount_edges = _edges(self.amount_tiers, [p["when"]["min_amount"] for p in self.promotions
+                                                       if "min_amount" in p.get("when", {})])
+
+        # Evaluate the rules once per segment; cells hold (rate index, fee pct, promotion names)
+        rates, rate_index = [], {}
+        self.cells = []
+        for employment in self.employments:
+            by_score = []
+            for score in self.score_edges:
+                by_amount = []
+                for amount in self.amount_edges:
+                    by_amount.append(self._evaluate(employment, score, amount, rates, rate_index))
+                by_score.append(by_amount)
+            self.cells.append(by_score)
+        self.rates = rates
+
+        # EMI factor per unit principal, per rate, per tenure (index = months)
+        import affordability
+        months = list(range(self.max_tenure + 1))
+        self.factors = [affordability.emi_factor(months, rate).tolist() for rate in rates]
+
+    def _evaluate(self, employment, score, amount, rates, rate_index):
+        rate = self.base_rate + self.employment_adjust.get(employment, 0.0)
+        rate += _band_adjust(self.score_bands, score) + _band_adjust(self.amount_tiers, amount)
+        fee, names = self.fee_pct, []
+        for promo in self.promotions:
+            if _matches(promo.get("when", {}), employment, score, amount):
+                rate += float(promo.get("rate", 0.0))
+                fee *= 1 - float(promo.get("fee_discount_pct", 0.0)) / 100
+                names.append(promo["name"])
+        rate = round(min(self.max_rate, max(self.min_rate, rate)), 4)
+        if rate not in rate_index:
+            rate_index[rate] = len(rates)
+            rates.append(rate)
+        return rate_index[rate], fee, tuple(names)
+
+    def _by_amount(self, employment, score):
+        e = self._employment_index.get(employment, len(self.employments) - 1)
+        return self.cells[e][max(0, bisect_right(self.score_edges, score) - 1)]
+
+    def segment(self, employment=None, score=0, amount=0):
+        return self._by_amount(employment, score)[max(0, bisect_right(self.amount_edges, amount) - 1)]
+
+    def rate_for(self, employment=None, score=0, amount=0):
+        return self.rates[self.segment(employment, score, amount)[0]]
+
+    def rate_ceiling(self, employment=None, score=0):
+        """Highest rate any loan amount gets in this employment/score segment."""
+        return max(self.rates[cell[0]] for cell in self._by_amount(employment, score))
+
+    def quote(self, amount, months, employment=None, score=0):
+        """Price one application: {rate, emi, processing_fee, promotions}."""
+        rate_i, fee_pct, promos = self.segment(employment, score, amount)
+        months = int(months)
+        if 0 < months <= self.max_tenure:
+            factor = self.factors[rate_i][months]
+        else:
+            import affordability
+            factor = float(affordability.emi_factor(months, self.rates[rate_i]))
+        return {
+            "rate": self.rates[rate_i],
+            "emi": amount * factor,
+            "processing_fee": round(amount * fee_pct / 100, 2),
+            "promotions": list(promos),
+        }
+
+    def describe(self):
+        """Offer lines for the chat, generated from the card."""
+        lines = [f"• {self.product} from {min(self.rates):g}% p.a. (standard {self.base_rate:g}%, "
+                 f"processing fee {self.fee_pct:g}%)"]
+        for promo in self.promotions:
+            parts = []
+            if promo.get("rate"):
+                parts.append(f"{float(promo['rate']):+g}%")
+            if promo.get("fee_discount_pct"):
+                parts.append(f"{promo['fee_discount_pct']:g}% off processing fee")
+            lines.append(f"• {promo['name']}" + (f" ({', '.join(parts)})" if parts else ""))
+        return lines
+
+
+# ------------------ Loading ------------------
+def load_card(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            card = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RateCardError(f"Cannot read rate card {path}: {e}") from e
+    return CompiledCard(card)
+
+
+_cards = {}  # path -> [card, file signature, last checked]
+_card_lock = threading.Lock()
+
+
+def get_rate_card(path=None):
+    """Compiled card from ``path`` (default: config rate_card); recompiled
+    when the file changes. A broken edit keeps the last good card in service."""
+    path = path or get_settings().rate_card
+    now = time.monotonic()
+    entry = _cards.get(path)
+    if entry is not None and now - entry[2] < RELOAD_CHECK_SECONDS:
+        return entry[0]
+    with _card_lock:
+        entry = _cards.setdefault(path, [None, None, 0.0])
+        try:
+            st = os.stat(path)
+            sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            sig = None
+        if entry[0] is None or (sig is not None and sig != entry[1]):
+            try:
+                entry[0], entry[1] = load_card(path), sig
+            except RateCardError:
+                if entry[0] is None:
+                    del _cards[path]
+                    raise
+        entry[2] = now
+        return entry[0]
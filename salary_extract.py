@@ -0,0 +1,138 @@
+"""Bounded-memory salary figure extraction from uploaded salary slips.
+
+The upload is scanned through a memoryview in fixed-size windows, so no
+decoded copy of the whole file is ever made. For PDFs every content stream is
+located in place and FlateDecode streams are inflated one at a time with a
+per-stream output cap; only the string literals drawn by the page (the
+``(...) Tj`` operands) are searched. Figures are taken from next to labels
+such as "Net Pay" or "Gross", and each result carries a confidence score.
+"""
+import re
+import zlib
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_INFLATED_BYTES = 4 * 1024 * 1024   # per content stream
+CHUNK_SIZE = 64 * 1024
+OVERLAP = 256                          # carried between windows so a label+figure is never split
+
+# label pattern -> confidence when a figure is found next to it
+_LABELS = [
+    (rb"net\s*(?:pay|salary|amount)|take\s*home", 0.9),
+    (rb"gross\s*(?:pay|salary|earnings)?|total\s*earnings", 0.7),
+]
+_AMOUNT = rb"(?:rs\.?|inr|\xe2\x82\xb9)?\s*[:=\-]?\s*(\d{1,3}(?:,\d{2,3})+|\d{3,9})(?:\.\d{1,2})?"
+_LABELLED = [
+    (re.compile(rb"(?:" + label + rb")[^\d\n]{0,40}?" + _AMOUNT, re.IGNORECASE), conf)
+    for label, conf in _LABELS
+]
+_BARE_NUMBER = re.compile(rb"(?<![\d.])(\d{4,7})(?![\d.])")
+_PDF_STRING = re.compile(rb"\((?:\\.|[^\\)])*\)")
+_STREAM = re.compile(rb"stream\r?\n")
+UNLABELLED_CONFIDENCE = 0.3
+
+
+def _result(salary=None, confidence=0.0, source="none", label=None):
+    return {"salary": salary, "confidence": confidence, "source": source, "label": label}
+
+
+class _Best:
+    """Keeps the highest-confidence candidate seen so far (first one wins ties)."""
+
+    def __init__(self):
+        self.result = _result()
+        self.bare = None
+
+    def scan(self, data, source):
+        for pattern, conf in _LABELLED:
+            if conf <= self.result["confidence"]:
+                continue
+            m = pattern.search(data)
+            if m:
+                value = float(m.group(1).replace(b",", b""))
+                label = m.group(0)[:m.start(1) - m.start(0)].decode("latin-1").strip(" :=-")
+                self.result = _result(value, conf, source, label)
+        if self.result["confidence"] < UNLABELLED_CONFIDENCE:
+            for m in _BARE_NUMBER.finditer(data):
+                value = float(m.group(1))
+                if self.bare is None or len(m.group(1)) > len(str(int(self.bare))):
+                    self.bare = value
+
+    def done(self, source):
+        if self.result["salary"] is None and self.bare is not None:
+            return _result(self.bare, UNLABELLED_CONFIDENCE, source)
+        return self.result
+
+
+def _scan_windows(view, best, source):
+    n = len(view)
+    for start in range(0, n, CHUNK_SIZE):
+        best.scan(bytes(view[max(0, start - OVERLAP):start + CHUNK_SIZE]), source)
+        if best.result["confidence"] >= _LABELS[0][1]:
+            break
+
+
+def _inflate(view):
+    """Inflate one FlateDecode stream in bounded pieces; yields text windows."""
+    d = zlib.decompressobj()
+    produced, carry = 0, b""
+    for start in range(0, len(view), CHUNK_SIZE):
+        piece = d.decompress(bytes(view[start:start + CHUNK_SIZE]), MAX_INFLATED_BYTES - produced)
+        produced += len(piece)
+        data = carry + piece
+        # keep a possibly unterminated (...) literal for the next window
+        cut = data.rfind(b")") + 1
+        yield data[:cut]
+        carry = data[cut:][-OVERLAP:]
+        if produced >= MAX_INFLATED_BYTES or d.eof:
+            break
+
+
+def _pdf_streams(data, view):
+    """Yield (is_flate, memoryview) for each content stream, without copying."""
+    pos = 0
+    while True:
+        m = _STREAM.search(data, pos)
+        if not m:
+            return
+        start = m.end()
+        end = data.find(b"endstream", start)
+        if end < 0:
+            return
+        header = data[max(0, m.start() - 512):m.start()]
+        dict_start = header.rfind(b"<<")
+        yield b"/FlateDecode" in header[dict_start:], view[start:end]
+        pos = end + 9
+
+
+def _scan_pdf(data, view, best):
+    for is_flate, stream in _pdf_streams(data, view):
+        try:
+            windows = _inflate(stream) if is_flate else [bytes(stream)]
+            for window in windows:
+                text = b" ".join(s[1:-1] for s in _PDF_STRING.findall(window))
+                best.scan(text, "pdf")
+        except zlib.error:
+            continue  # damaged or non-Flate-compatible stream
+        if best.result["confidence"] >= _LABELS[0][1]:
+            return
+
+
+def extract_salary(file_bytes, max_bytes=MAX_UPLOAD_BYTES):
+    """Find the salary figure in an uploaded slip.
+
+    Returns {"salary", "confidence", "source", "label"}; salary is None when
+    the document shows no usable figure (a scanned image, say). Uploads over
+    ``max_bytes`` are not scanned.
+    """
+    if file_bytes is None or len(file_bytes) > max_bytes:
+        return _result(source="too_large" if file_bytes is not None else "none")
+    data = bytes(file_bytes) if not isinstance(file_bytes, bytes) else file_bytes
+    view = memoryview(data)
+    best = _Best()
+
+    if data[:5] == b"%PDF-":
+        # Raw PDF bytes are full of offsets and lengths; only page text counts
+        _scan_pdf(data, view, best)
+        return best.done("pdf")
+    _scan_windows(view, best, "text")
+    return best.done("text")
@@ -0,0 +1,262 @@
+"""Content-addressed store for issued sanction letters.
+
+Layout under the configured sanction_dir::
+
+    objects/ab/cd/<sha256>.pdf    letter bytes, one file per distinct content
+    index.db                      SQLite manifest: letters by customer and date
+
+Identical letters (same customer, terms and date) are stored once and
+reference-counted. Two-level hex sharding keeps every directory small, so
+writes and unlinks stay fast with millions of letters, and lookups go through
+the index rather than listing directories.
+
+Retention is applied with ``apply_retention``: letters older than the cutoff
+are either moved to cold storage (the same sharded layout under
+``cold_dir``) or deleted. Each pass walks the created_at index from the
+oldest letter and touches only what it evicts.
+
+    python sanction_archive.py find 100004 [--since 2026-01-01] [--until 2026-12-31]
+    python sanction_archive.py retain --days 365 [--delete]
+    python sanction_archive.py import            # fold old flat sanctions/*.pdf into the archive
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config import get_settings
+
+INDEX_FILE = "index.db"
+OBJECTS = "objects"
+_SELECT = "SELECT l.*, o.tier AS storage FROM letters l JOIN objects o ON o.sha256 = l.sha256"
+_LEGACY_NAME = re.compile(r"sanction_(.+?)_(\d{9,})(?:_[0-9a-f]+)?\.pdf$")
+
+
+def object_relpath(digest):
+    return os.path.join(OBJECTS, digest[:2], digest[2:4], digest + ".pdf")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class SanctionArchive:
+    def __init__(self, root, cold_dir=None):
+        self.root = root
+        self.cold_dir = cold_dir
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._local = threading.local()
+        os.makedirs(root, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS letters ("
+                "letter_id INTEGER PRIMARY KEY, cid TEXT NOT NULL, created_at REAL NOT NULL, "
+                "file_name TEXT NOT NULL, sha256 TEXT NOT NULL, size INTEGER NOT NULL, "
+                "tier TEXT NOT NULL DEFAULT 'hot')"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS letters_cid ON letters (cid, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS letters_age ON letters (tier, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS letters_sha ON letters (sha256, tier)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, refs INTEGER NOT NULL, "
+                "tier TEXT NOT NULL DEFAULT 'hot')"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, digest, tier="hot"):
+        base = self.cold_dir if tier == "cold" else self.root
+        return os.path.join(base, object_relpath(digest))
+
+    # ---------- write ----------
+    def put(self, cid, file_name, pdf_bytes, created_at=None):
+        """Archive one letter; returns its record (see ``find``)."""
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        created_at = time.time() if created_at is None else created_at
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            # Written before the index row, so an indexed letter always has its bytes
+            _write_atomic(path, pdf_bytes)
+        with self._conn() as conn:
+            # insert-or-ignore first: it takes the write lock, so a concurrent put of
+            # the same content waits here instead of failing on the primary key
+            cur = conn.execute("INSERT OR IGNORE INTO objects (sha256, size, refs) VALUES (?, ?, 1)",
+                               (digest, len(pdf_bytes)))
+            if cur.rowcount == 0:
+                row = conn.execute("SELECT tier FROM objects WHERE sha256 = ?", (digest,)).fetchone()
+                conn.execute("UPDATE objects SET refs = refs + 1, tier = 'hot' WHERE sha256 = ?", (digest,))
+                if row["tier"] == "cold":
+                    self._drop_file(self._object_path(digest, "cold"))
+            cur = conn.execute(
+                "INSERT INTO letters (cid, created_at, file_name, sha256, size) VALUES (?, ?, ?, ?, ?)",
+                (str(cid), created_at, file_name, digest, len(pdf_bytes)),
+            )
+        return {"letter_id": cur.lastrowid, "cid": str(cid), "created_at": created_at,
+                "file_name": file_name, "sha256": digest, "size": len(pdf_bytes), "tier": "hot",
+                "path": path}
+
+    # ---------- read ----------
+    def find(self, cid, since=None, until=None, limit=None):
+        """Letters for a customer, newest first; since/until are epoch seconds."""
+        sql = (f"{_SELECT} WHERE l.cid = ? AND l.created_at >= ? AND l.created_at < ? "
+               "ORDER BY l.created_at DESC")
+        args = [str(cid), since if since is not None else 0, until if until is not None else float("inf")]
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [self._record(row) for row in self._conn().execute(sql, args)]
+
+    def latest(self, cid):
+        found = self.find(cid, limit=1)
+        return found[0] if found else None
+
+    def get(self, letter_id):
+        """(file_name, pdf_bytes) for a letter, or None if it is unknown or evicted."""
+        row = self._conn().execute(f"{_SELECT} WHERE l.letter_id = ?", (letter_id,)).fetchone()
+        if row is None:
+            return None
+        with open(self._record(row)["path"], "rb") as f:
+            return row["file_name"], f.read()
+
+    def _record(self, row):
+        rec = dict(row)
+        # the object's tier says where the bytes are; a cold letter whose content
+        # was issued again shares the (hot) object
+        rec["path"] = self._object_path(rec["sha256"], rec.pop("storage"))
+        return rec
+
+    # ---------- retention ----------
+    def apply_retention(self, max_age_days, delete=False, batch=1000, now=None):
+        """Move letters older than ``max_age_days`` to cold_dir (or delete them
+        when ``delete`` is set or no cold_dir is configured). Returns the
+        number of letters evicted."""
+        delete = delete or not self.cold_dir
+        cutoff = (time.time() if now is None else now) - max_age_days * 86400
+        evicted = 0
+        while True:
+            with self._conn() as conn:
+                rows = conn.execute(
+                    "SELECT letter_id, sha256 FROM letters WHERE tier = 'hot' AND created_at < ? "
+                    "ORDER BY created_at LIMIT ?", (cutoff, batch),
+                ).fetchall()
+                if not rows:
+                    return evicted
+                ids = [(r["letter_id"],) for r in rows]
+                if delete:
+                    conn.executemany("DELETE FROM letters WHERE letter_id = ?", ids)
+                else:
+                    conn.executemany("UPDATE letters SET tier = 'cold' WHERE letter_id = ?", ids)
+                for digest in {r["sha256"] for r in rows}:
+                    self._settle_object(conn, digest, delete)
+            evicted += len(rows)
+
+    def _settle_object(self, conn, digest, delete):
+        """Drop or move an object once no hot letter references it."""
+        if delete:
+            refs = conn.execute("SELECT COUNT(*) FROM letters WHERE sha256 = ?", (digest,)).fetchone()[0]
+            if refs:
+                conn.execute("UPDATE objects SET refs = ? WHERE sha256 = ?", (refs, digest))
+            else:
+                conn.execute("DELETE FROM objects WHERE sha256 = ?", (digest,))
+                self._drop_file(self._object_path(digest))
+            return
+        still_hot = conn.execute(
+            "SELECT 1 FROM letters WHERE sha256 = ? AND tier = 'hot' LIMIT 1", (digest,)
+        ).fetchone()
+        if still_hot:
+            return  # a newer identical letter keeps the object hot
+        hot_path, cold_path = self._object_path(digest), self._object_path(digest, "cold")
+        if os.path.exists(hot_path):
+            os.makedirs(os.path.dirname(cold_path), exist_ok=True)
+            os.replace(hot_path, cold_path)
+        conn.execute("UPDATE objects SET tier = 'cold' WHERE sha256 = ?", (digest,))
+
+    @staticmethod
+    def _drop_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # ---------- migration ----------
+    def import_flat(self, directory):
+        """Archive legacy ``sanction_<cid>_<ts>.pdf`` files from a flat directory,
+        removing each once it is indexed. Returns the number imported."""
+        count = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                m = _LEGACY_NAME.match(entry.name)
+                if not m or not entry.is_file():
+                    continue
+                with open(entry.path, "rb") as f:
+                    self.put(m.group(1), entry.name, f.read(), created_at=float(m.group(2)))
+                os.remove(entry.path)
+                count += 1
+        return count
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM letters").fetchone()[0]
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Process-wide archive at the configured sanction_dir, opened on first use."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            settings = get_settings()
+            _archive = SanctionArchive(settings.sanction_dir, settings.sanction_cold_dir)
+        return _archive
+
+
+def _day(text):
+    return datetime.strptime(text, "%Y-%m-%d").timestamp() if text else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sanction letter archive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    find = sub.add_parser("find", help="list a customer's letters")
+    find.add_argument("cid")
+    find.add_argument("--since", help="YYYY-MM-DD")
+    find.add_argument("--until", help="YYYY-MM-DD (exclusive)")
+    retain = sub.add_parser("retain", help="evict old letters to cold storage")
+    retain.add_argument("--days", type=float, default=get_settings().sanction_retention_days)
+    retain.add_argument("--delete", action="store_true", help="delete instead of moving to cold storage")
+    sub.add_parser("import", help="archive flat sanction_*.pdf files in the sanction dir")
+    args = ap.parse_args(argv)
+
+    archive = get_archive()
+    if args.cmd == "find":
+        for rec in archive.find(args.cid, _day(args.since), _day(args.until)):
+            stamp = datetime.fromtimestamp(rec["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{rec['letter_id']}\t{stamp}\t{rec['tier']}\t{rec['file_name']}\t{rec['path']}")
+    elif args.cmd == "retain":
+        if args.days is None:
+            ap.error("--days is required (or set BFSI_SANCTION_RETENTION_DAYS)")
+        print(f"Evicted {archive.apply_retention(args.days, delete=args.delete)} letters")
+    else:
+        print(f"Imported {archive.import_flat(archive.root)} letters")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,152 @@
-import os
-from datetime import datetime
-from fpdf import FPDF
+import pickle
+import uuid
+from datetime import datetime, timezone
 
-SANCTION_DIR = "sanctions"
-os.makedirs(SANCTION_DIR, exist_ok=True)
+import metrics
 
-def generate_sanction_pdf(customer, kyc_info, loan_amount, tenure_months, emi):
-    """Create a simple, safe PDF sanction letter. Returns full file path."""
+# fpdf is imported on the first render and the archive (config sanction_dir)
+# is opened on the first save, so importing this module is cheap
+
+# Letter layout as a flat list of drawing ops. Text containing {placeholders}
+# is filled per letter; everything else is static and drawn once per process.
+_LAYOUT = [
+    # Header
+    ("font", ("Arial", "B", 16)),
+    ("cell", (0, 12, "TATA CAPITAL - LOAN SANCTION LETTER"), {"ln": True, "align": "C"}),
+    ("ln", 8),
+    # Date
+    ("font", ("Arial", "", 11)),
+    ("cell", (0, 8, "Date: {date}"), {"ln": True}),
+    ("ln", 5),
+    # Customer Details
+    ("font", ("Arial", "B", 12)),
+    ("cell", (0, 8, "CUSTOMER DETAILS:"), {"ln": True}),
+    ("font", ("Arial", "", 11)),
+    ("cell", (140, 7, "Name: {name}"), {"ln": True}),
+    ("cell", (140, 7, "Customer ID: {cid}"), {"ln": True}),
+    ("cell", (140, 7, "PAN/Aadhaar: {id_number}"), {"ln": True}),
+    ("cell", (140, 7, "DOB: {dob}"), {"ln": True}),
+    ("cell", (140, 7, "Income: INR {income:,.0f}"), {"ln": True}),
+    ("cell", (140, 7, "Employment: {employment}"), {"ln": True}),
+    ("ln", 8),
+    # Loan Details
+    ("font", ("Arial", "B", 12)),
+    ("cell", (0, 8, "LOAN DETAILS:"), {"ln": True}),
+    ("font", ("Arial", "", 11)),
+    ("cell", (140, 7, "Product: {product}"), {"ln": True}),
+    ("cell", (140, 7, "Amount: INR {amount:,.0f}"), {"ln": True}),
+    ("cell", (140, 7, "Tenure: {tenure} months"), {"ln": True}),
+    ("cell", (140, 7, "EMI: INR {emi:,.0f}"), {"ln": True}),
+    ("cell", (140, 7, "Interest Rate: {rate:g}% p.a."), {"ln": True}),
+    ("ln", 10),
+    # Terms
+    ("font", ("Arial", "", 10)),
+    ("cell", (0, 7, "This is a provisional sanction letter subject to final verification."), {"ln": True}),
+    ("cell", (0, 7, "Processing fees, taxes and final interest rates apply."), {"ln": True}),
+    ("cell", (0, 7, "Formal sanction pack will be provided post-document verification."), {"ln": True}),
+    ("ln", 10),
+    ("font", ("Arial", "B", 11)),
+    ("cell", (0, 8, "Thank you for choosing Tata Capital."), {"ln": True, "align": "C"}),
+    ("cell", (0, 8, "For queries, contact our support team."), {"ln": True, "align": "C"}),
+]
+
+_template = None
+
+
+def _compile_template():
+    """Lay out _LAYOUT once per process: static cells are drawn on a base
+    document (kept pickled), field cells are recorded with their position
+    and font and a pre-bound str.format. Returns (base, field_ops)."""
+    from fpdf import FPDF
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
+    font, fields = None, []
+    for op in _LAYOUT:
+        kind = op[0]
+        if kind == "font":
+            font = op[1]
+            pdf.set_font(*font)
+        elif kind == "ln":
+            pdf.ln(op[1])
+        else:
+            (w, h, text), kwargs = op[1], op[2]
+            if "{" not in text:
+                pdf.cell(w, h, text, **kwargs)
+                continue
+            cell_kwargs = {k: v for k, v in kwargs.items() if k != "ln"}
+            fields.append((pdf.get_x(), pdf.get_y(), font, w, h, text.format, cell_kwargs))
+            # leave the cursor where the drawn cell would have left it
+            if kwargs.get("ln"):
+                pdf.ln(h)
+            else:
+                pdf.set_x(pdf.get_x() + w)
+    return pickle.dumps(pdf, pickle.HIGHEST_PROTOCOL), fields
 
-    # Header
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 12, "TATA CAPITAL - LOAN SANCTION LETTER", ln=True, align="C")
-    pdf.ln(8)
 
-    # Date
-    pdf.set_font("Arial", size=11)
-    now = datetime.now().strftime("%d-%m-%Y")
-    pdf.cell(0, 8, f"Date: {now}", ln=True)
-    pdf.ln(5)
+def _letter_fields(customer, kyc_info, loan_amount, tenure_months, emi):
+    return {
+        "date": datetime.now().strftime("%d-%m-%Y"),
+        "name": customer.get("name", "N/A"),
+        "cid": customer.get("cid", "N/A"),
+        "id_number": str(kyc_info.get("id_number", "N/A"))[:20],
+        "dob": kyc_info.get("dob", "N/A"),
+        "income": kyc_info.get("income", 0),
+        "employment": kyc_info.get("employment", "N/A"),
+        "amount": float(loan_amount),
+        "tenure": tenure_months,
+        "emi": float(emi),
+        "rate": float(kyc_info.get("rate") or _default_rate()),
+        "product": kyc_info.get("product_label", "Personal Loan"),
+    }
 
-    # Customer Details
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "CUSTOMER DETAILS:", ln=True)
-    pdf.set_font("Arial", size=11)
-    
-    pdf.cell(140, 7, f"Name: {customer.get('name', 'N/A')}", ln=True)
-    pdf.cell(140, 7, f"Customer ID: {customer.get('cid', 'N/A')}", ln=True)
-    pdf.cell(140, 7, f"PAN/Aadhaar: {str(kyc_info.get('id_number', 'N/A'))[:20]}", ln=True)
-    pdf.cell(140, 7, f"DOB: {kyc_info.get('dob', 'N/A')}", ln=True)
-    pdf.cell(140, 7, f"Income: INR {kyc_info.get('income', 0):,.0f}", ln=True)
-    pdf.cell(140, 7, f"Employment: {kyc_info.get('employment', 'N/A')}", ln=True)
-    pdf.ln(8)
 
-    # Loan Details
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "LOAN DETAILS:", ln=True)
-    pdf.set_font("Arial", size=11)
-    pdf.cell(140, 7, f"Amount: INR {float(loan_amount):,.0f}", ln=True)
-    pdf.cell(140, 7, f"Tenure: {tenure_months} months", ln=True)
-    pdf.cell(140, 7, f"EMI: INR {float(emi):,.0f}", ln=True)
-    pdf.ln(10)
+def _default_rate():
+    # letters from callers that did not price the loan show the card's standard rate
+    from rate_card import get_rate_card
+    return get_rate_card().base_rate
 
-    # Terms
-    pdf.set_font("Arial", size=10)
-    terms = [
-        "This is a provisional sanction letter subject to final verification.",
-        "Processing fees, taxes and final interest rates apply.",
-        "Formal sanction pack will be provided post-document verification."
-    ]
-    for term in terms:
-        pdf.cell(0, 7, term, ln=True)
-    
-    pdf.ln(10)
-    pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 8, "Thank you for choosing Tata Capital.", ln=True, align="C")
-    pdf.cell(0, 8, "For queries, contact our support team.", ln=True, align="C")
-
-    # Safe filename
+
+def sanction_filename(customer):
+    # random suffix: two letters in the same second must not share a name
     safe_cid = str(customer.get("cid", "unknown"))[:10]
-    file_name = f"sanction_{safe_cid}_{int(datetime.now().timestamp())}.pdf"
-    full_path = os.path.join(SANCTION_DIR, file_name)
+    return f"sanction_{safe_cid}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}.pdf"
+
+
+@metrics.timed("sanction_render_seconds")
+def render_sanction_pdf(customer, kyc_info, loan_amount, tenure_months, emi):
+    """Render a sanction letter: a copy of the pre-laid-out base document
+    with only the per-letter fields drawn in. Returns PDF bytes."""
+    global _template
+    if _template is None:
+        _template = _compile_template()
+    base, field_ops = _template
+    fields = _letter_fields(customer, kyc_info, loan_amount, tenure_months, emi)
+
+    pdf = pickle.loads(base)
+    for x, y, font, w, h, fill, kwargs in field_ops:
+        pdf.set_font(*font)
+        pdf.set_xy(x, y)
+        pdf.cell(w, h, fill(**fields), **kwargs)
+    # creation date from the letter date (no time), so identical letters are
+    # byte-identical and the archive stores them once
+    pdf.set_creation_date(datetime.strptime(fields["date"], "%d-%m-%Y").replace(tzinfo=timezone.utc))
+    return bytes(pdf.output())
+
 
-    pdf.output(full_path)
-    return full_path
+def archive_sanction_pdf(pdf_bytes, file_name, cid="unknown"):
+    """Store rendered letter bytes in the sanction archive. Returns its record (letter_id, path, ...)."""
+    from sanction_archive import get_archive
+    return get_archive().put(cid, file_name, pdf_bytes)
+
+
+def save_sanction_pdf(pdf_bytes, file_name, cid="unknown"):
+    """Store rendered letter bytes in the sanction archive. Returns full file path."""
+    return archive_sanction_pdf(pdf_bytes, file_name, cid)["path"]
+
+
+@metrics.timed("sanction_generate_seconds")
+def generate_sanction_pdf(customer, kyc_info, loan_amount, tenure_months, emi):
+    """Create a simple, safe PDF sanction letter. Returns full file path."""
+    pdf_bytes = render_sanction_pdf(customer, kyc_info, loan_amount, tenure_months, emi)
+    return save_sanction_pdf(pdf_bytes, sanction_filename(customer), customer.get("cid", "unknown"))
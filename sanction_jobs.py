@@ -0,0 +1,144 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+from config import configure, get_settings
+from sanction_generator import archive_sanction_pdf, render_sanction_pdf, sanction_filename
+
+
+class QueueFull(Exception):
+    """Raised when the sanction queue is at capacity (backpressure)."""
+
+
+def _usable_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))  # respects CPU pinning in containers
+    return os.cpu_count() or 1
+
+
+def _init_worker(settings):
+    # Worker processes start clean: same storage locations as the parent. Their
+    # metrics would never be exported, so the parent times jobs instead
+    configure(**settings)
+    metrics.disable()
+
+
+def _warm():
+    # imports fpdf and lays out the letter template in the worker
+    import sanction_generator
+    if sanction_generator._template is None:
+        sanction_generator._template = sanction_generator._compile_template()
+
+
+def _render_with_retry(retries, backoff, persist, args):
+    # Runs inside the worker; module-level so it also works with a process pool
+    for attempt in range(retries + 1):
+        try:
+            file_name = sanction_filename(args[0])
+            pdf_bytes = render_sanction_pdf(*args)
+            if persist:
+                record = archive_sanction_pdf(pdf_bytes, file_name, args[0].get("cid", "unknown"))
+                return file_name, record["letter_id"], None  # the bytes stay in the archive
+            return file_name, None, pdf_bytes
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+class SanctionJob:
+    """Handle returned to the caller; poll ``status()`` / ``result()``."""
+
+    def __init__(self, job_id, cid, future):
+        self.id = job_id
+        self.cid = cid
+        self._future = future
+
+    def status(self):
+        if not self._future.done():
+            return "pending"
+        return "failed" if self._future.exception() else "done"
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """(file_name, letter_id, pdf_bytes) of the rendered letter: the archive ID
+        when the queue persists letters (pdf_bytes is then None), otherwise the
+        bytes (letter_id None). Raises the render error if it failed."""
+        return self._future.result(timeout)
+
+    def error(self):
+        return self._future.exception() if self._future.done() else None
+
+
+class SanctionQueue:
+    """Bounded pool that renders sanction letters off the request thread.
+
+    At most ``max_pending`` jobs may be queued or running; ``submit`` waits up
+    to ``submit_timeout`` seconds for a slot and then raises ``QueueFull``.
+    Failed renders are retried ``retries`` times with exponential backoff.
+    Letters are rendered in memory; ``persist`` also stores them in the sanction archive.
+
+    Rendering is CPU-bound, so with more than one CPU it runs in worker
+    processes by default, off the GIL that chat turns need. Workers come from
+    a forkserver (not a fork of a threaded server) and get the parent's
+    settings. On a single CPU there is nothing to gain from processes and the
+    IPC costs throughput, so the default there is threads; ``use_processes``
+    forces either.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32, retries=2, backoff=0.2,
+                 submit_timeout=0.5, use_processes=None, persist=True):
+        if use_processes is None:
+            use_processes = _usable_cpus() > 1
+        if use_processes:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method),
+                                             initializer=_init_worker, initargs=(get_settings().overrides(),))
+            # start the workers now, in the background, not inside the first sanction's chat turn
+            threading.Thread(target=lambda: [self._pool.submit(_warm) for _ in range(max_workers)],
+                             name="sanction-pool-warmup", daemon=True).start()
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.retries = retries
+        self.persist = persist
+        self.backoff = backoff
+        self.submit_timeout = submit_timeout
+        self._ids = itertools.count(1)
+
+    def submit(self, customer, kyc_info, loan_amount, tenure_months, emi):
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            raise QueueFull("Sanction queue is full")
+        args = (dict(customer), dict(kyc_info), loan_amount, tenure_months, emi)
+        try:
+            future = self._pool.submit(_render_with_retry, self.retries, self.backoff, self.persist, args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        if metrics.ENABLED:
+            start = time.perf_counter()
+            future.add_done_callback(lambda _: metrics.observe("sanction_job_seconds", time.perf_counter() - start))
+        return SanctionJob(next(self._ids), customer.get("cid"), future)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+def get_sanction_queue():
+    """Process-wide queue, created on first use."""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = SanctionQueue()
+        return _default_queue
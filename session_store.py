@@ -0,0 +1,297 @@
+"""Compact binary session state and pluggable session stores.
+
+A session blob holds one MasterAgent's state plus its chat history, packed
+with ``struct``: the dialogue state is a 1-byte index (or a name, for states
+of other product flows), optional application fields are flagged in a bitmap
+and stored as fixed-width numbers or length-prefixed UTF-8 (32-bit lengths:
+the dialogue puts no cap on what a customer types), fields outside that list
+travel as one small JSON string, and the history is zlib-compressed. A sanction letter is referenced by its archive ID, never
+carried as bytes. Any worker can load a blob and carry on the conversation.
+
+Stores share a tiny interface (``get``/``put``/``delete``) and are selected by
+a spec string: ``memory``, ``file:<dir>`` or ``sqlite:<path>``.
+"""
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Older blobs still load: 1 carried the letter bytes (the letter is dropped);
+# 1 and 2 had 16-bit lengths for application fields
+FORMAT_VERSION = 3
+
+STATES = (
+    "idle", "ask_amount", "ask_tenure", "ask_name", "ask_dob", "ask_id",
+    "ask_income", "ask_employment", "ask_existing_emi", "await_salary_upload", "confirm",
+)
+_STATE_INDEX = {s: i for i, s in enumerate(STATES)}
+_NAMED_STATE = 0xFF  # state name follows the customer ID
+
+# (temp key, kind) in bitmap order; d = float64, i = int32, s = string
+TEMP_FIELDS = (
+    ("loan_amount", "d"), ("tenure", "i"), ("full_name", "s"), ("dob", "s"),
+    ("id_number", "s"), ("income", "d"), ("employment", "s"), ("existing_emi", "d"),
+    ("emi", "d"), ("salary_confidence", "d"), ("application_id", "s"),
+    ("rate", "d"), ("product", "s"), ("extra", "s"),
+)
+_TEMP_KEYS = frozenset(key for key, _ in TEMP_FIELDS)
+
+_HEADER = struct.Struct("<BBH")  # version, state index, temp-field bitmap
+_LEN16 = struct.Struct("<H")
+_LEN32 = struct.Struct("<I")
+_NUM = {"d": struct.Struct("<d"), "i": struct.Struct("<i")}
+_LETTER_ID = struct.Struct("<q")
+
+
+def _pack_str(out, value, wide=False):
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    out.append((_LEN32 if wide else _LEN16).pack(len(data)))
+    out.append(data)
+
+
+def _unpack_str(buf, pos, wide=False, raw=False):
+    fmt = _LEN32 if wide else _LEN16
+    (n,) = fmt.unpack_from(buf, pos)
+    pos += fmt.size
+    data = bytes(buf[pos:pos + n])
+    return (data if raw else data.decode("utf-8")), pos + n
+
+
+def encode_agent(cid, state, temp, last_sanction=None):
+    """Pack agent state. ``last_sanction`` is an optional (file_name, archive letter_id)."""
+    bitmap, body = 0, []
+    extra = {k: v for k, v in temp.items() if k not in _TEMP_KEYS and v is not None}
+    if extra:
+        temp = {**temp, "extra": json.dumps(extra, separators=(",", ":"))}
+    for bit, (key, kind) in enumerate(TEMP_FIELDS):
+        value = temp.get(key)
+        if value is None:
+            continue
+        bitmap |= 1 << bit
+        if kind == "s":
+            _pack_str(body, str(value), wide=True)
+        else:
+            body.append(_NUM[kind].pack(value))
+    state_idx = _STATE_INDEX.get(state, _NAMED_STATE)
+    out = [_HEADER.pack(FORMAT_VERSION, state_idx, bitmap)]
+    _pack_str(out, str(cid))
+    if state_idx == _NAMED_STATE:
+        _pack_str(out, state)
+    out.extend(body)
+    if last_sanction:
+        out.append(b"\x01")
+        _pack_str(out, last_sanction[0])
+        out.append(_LETTER_ID.pack(last_sanction[1]))
+    else:
+        out.append(b"\x00")
+    return b"".join(out)
+
+
+def decode_agent(buf, pos=0):
+    """Inverse of encode_agent; returns (fields dict, next offset)."""
+    version, state_idx, bitmap = _HEADER.unpack_from(buf, pos)
+    if version not in (1, 2, FORMAT_VERSION):
+        raise ValueError(f"Unsupported session format {version}")
+    pos += _HEADER.size
+    cid, pos = _unpack_str(buf, pos)
+    if state_idx == _NAMED_STATE:
+        state, pos = _unpack_str(buf, pos)
+    else:
+        state = STATES[state_idx]
+    temp = {}
+    for bit, (key, kind) in enumerate(TEMP_FIELDS):
+        if not bitmap & (1 << bit):
+            continue
+        if kind == "s":
+            temp[key], pos = _unpack_str(buf, pos, wide=version >= 3)
+        else:
+            (temp[key],) = _NUM[kind].unpack_from(buf, pos)
+            pos += _NUM[kind].size
+    if "extra" in temp:
+        temp.update(json.loads(temp.pop("extra")))
+    last_sanction = None
+    has_letter = buf[pos]
+    pos += 1
+    if has_letter:
+        name, pos = _unpack_str(buf, pos)
+        if version == 1:
+            _, pos = _unpack_str(buf, pos, wide=True, raw=True)  # letter bytes; it is in the archive
+        else:
+            (letter_id,) = _LETTER_ID.unpack_from(buf, pos)
+            pos += _LETTER_ID.size
+            last_sanction = (name, letter_id)
+    return {"cid": cid, "state": state, "temp": temp, "last_sanction": last_sanction}, pos
+
+
+def encode_history(chat_history):
+    """Chat history [(sender, msg), ...] -> zlib-compressed blob."""
+    hist = []
+    for sender, msg in chat_history:
+        hist.append(b"u" if sender == "user" else b"b")
+        _pack_str(hist, msg, wide=True)
+    return zlib.compress(b"".join(hist), 1)
+
+
+def decode_history(blob):
+    raw = zlib.decompress(blob)
+    history, pos = [], 0
+    while pos < len(raw):
+        sender = "user" if raw[pos:pos + 1] == b"u" else "bot"
+        msg, pos = _unpack_str(raw, pos + 1, wide=True)
+        history.append((sender, msg))
+    return history
+
+
+def encode_session(agent_blob, chat_history):
+    """Agent blob + chat history [(sender, msg), ...] -> one session blob."""
+    return _LEN32.pack(len(agent_blob)) + agent_blob + encode_history(chat_history)
+
+
+def decode_session(blob):
+    """Returns (agent_blob, chat_history)."""
+    (n,) = _LEN32.unpack_from(blob, 0)
+    return blob[4:4 + n], decode_history(blob[4 + n:])
+
+
+def history_page_key(session_id, page):
+    """Store key for an archived page of older chat turns (see app.spill_history)."""
+    return f"{session_id}-p{page}"
+
+
+# ------------------ Stores ------------------
+class MemorySessionStore:
+    """Per-process LRU; evicts the least recently used session past max_sessions."""
+
+    def __init__(self, max_sessions=10_000):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, session_id):
+        with self._lock:
+            blob = self._data.get(session_id)
+            if blob is not None:
+                self._data.move_to_end(session_id)
+            return blob
+
+    def put(self, session_id, blob):
+        with self._lock:
+            self._data[session_id] = blob
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+
+    def add(self, session_id, blob):
+        """Put only if absent; True if this call stored it."""
+        with self._lock:
+            if session_id in self._data:
+                return False
+            self._data[session_id] = blob
+            return True
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+class FileSessionStore:
+    """One file per session under ``root`` (shared disk / NFS between workers)."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, session_id):
+        safe = "".join(ch for ch in str(session_id) if ch.isalnum() or ch in "-_")
+        return os.path.join(self.root, f"{safe}.session")
+
+    def get(self, session_id):
+        try:
+            with open(self._path(session_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id, blob):
+        path = self._path(session_id)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    def add(self, session_id, blob):
+        """Put only if absent; True if this call stored it (O_EXCL, so atomic across workers)."""
+        try:
+            fd = os.open(self._path(session_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        return True
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class SqliteSessionStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, updated_at REAL, blob BLOB)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT blob FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def put(self, session_id, blob):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, updated_at, blob) VALUES (?, ?, ?)",
+                (session_id, time.time(), blob),
+            )
+
+    def add(self, session_id, blob):
+        """Put only if absent; True if this call stored it."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, updated_at, blob) VALUES (?, ?, ?)",
+                (session_id, time.time(), blob),
+            )
+        return cur.rowcount == 1
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+def open_session_store(spec="memory"):
+    """``memory`` | ``file:<dir>`` | ``sqlite:<path>``"""
+    kind, _, arg = spec.partition(":")
+    if kind == "memory":
+        return MemorySessionStore(int(arg) if arg else 10_000)
+    if kind == "file":
+        return FileSessionStore(arg or "sessions")
+    if kind == "sqlite":
+        return SqliteSessionStore(arg or "sessions.db")
+    raise ValueError(f"Unknown session store: {spec}")
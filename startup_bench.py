@@ -0,0 +1,90 @@
+"""Cold-start benchmark: import and first-reply latency in fresh interpreters.
+
+    python startup_bench.py --runs 5 --out startup.json
+
+Each run starts a new Python process against a scratch copy of customers.csv
+(BFSI_DATA_DIR) and times, in order: ``import chatbot``, the first
+eligibility reply (opens the store, builds the index, loads NumPy), the first
+apply-flow turn up to the EMI check, and the first sanction letter render
+(loads fpdf). Medians across runs are printed and optionally written as JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import chatbot
+t1 = time.perf_counter()
+agent = chatbot.MasterAgent(sys.argv[1])
+agent.start_chat()
+agent.reply("check eligibility")
+t2 = time.perf_counter()
+for msg in ("apply loan", "100000", "24", "Bench User", "01-01-1990", "ABCDE1234F", "50000", "salaried", "0"):
+    agent.reply(msg)
+t3 = time.perf_counter()
+fpdf_loaded = "fpdf" in sys.modules
+import sanction_generator
+sanction_generator.render_sanction_pdf({"cid": sys.argv[1], "income": 50000}, {}, 100000, 24, 4661)
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_chatbot_ms": 1e3 * (t1 - t0),
+    "first_eligibility_reply_ms": 1e3 * (t2 - t1),
+    "first_apply_flow_ms": 1e3 * (t3 - t2),
+    "first_sanction_render_ms": 1e3 * (t4 - t3),
+    "fpdf_loaded_before_sanction": fpdf_loaded,
+}))
+"""
+
+
+def _first_cid(path):
+    with open(path, "r", encoding="utf-8") as f:
+        f.readline()
+        line = f.readline()
+    return line.split(",", 1)[0] if line else "100001"
+
+
+def run_once(data_dir, cid):
+    env = dict(os.environ, BFSI_DATA_DIR=data_dir, BFSI_METRICS="", PYTHONPATH=REPO_DIR)
+    out = subprocess.run([sys.executable, "-c", _PROBE, cid], env=env, cwd=data_dir,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Measure import and first-reply latency")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--customers", default=os.path.join(REPO_DIR, "customers.csv"),
+                    help="customer CSV to copy into the scratch data dir")
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="bfsi-startup-")
+    try:
+        shutil.copy(args.customers, os.path.join(scratch, "customers.csv"))
+        cid = _first_cid(args.customers)
+        runs = [run_once(scratch, cid) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    keys = [k for k in runs[0] if k.endswith("_ms")]
+    summary = {k: statistics.median(r[k] for r in runs) for k in keys}
+    for k in keys:
+        print(f"{k:<30}{summary[k]:>9.1f}")
+    eager = any(r["fpdf_loaded_before_sanction"] for r in runs)
+    print(f"fpdf imported before first sanction: {'yes' if eager else 'no'}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs, "median": summary, "python": sys.version.split()[0]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import audit_log  # noqa: E402
+import chatbot  # noqa: E402
+import config  # noqa: E402
+import credit_bureau  # noqa: E402
+import idempotency  # noqa: E402
+import sanction_archive  # noqa: E402
+import sanction_jobs  # noqa: E402
+
+
+def _reset():
+    chatbot._store = None
+    chatbot._preapproval = None
+    chatbot._verification_cache = None
+    idempotency._turn_cache = None
+    idempotency._ledger = None
+    audit_log._audit = None
+    sanction_archive._archive = None
+    credit_bureau._client = None
+    if sanction_jobs._default_queue is not None:
+        sanction_jobs._default_queue.shutdown()
+        sanction_jobs._default_queue = None
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Fresh data directory holding a copy of customers.csv, with every
+    process-wide store reopened against it."""
+    for name in ("BFSI_BUREAU_URL", "SESSION_STORE", "BFSI_IDEMPOTENCY_WINDOW"):
+        monkeypatch.delenv(name, raising=False)
+    shutil.copy(os.path.join(ROOT, "customers.csv"), tmp_path / "customers.csv")
+    _reset()
+    config.configure(data_dir=str(tmp_path), verification_cache="")
+    yield tmp_path
+    if audit_log._audit is not None:
+        audit_log._audit.flush()
+    _reset()
+    config.configure()
+
+
+def run_dialogue(agent, *messages):
+    """Send messages in order; the last reply."""
+    reply = None
+    for message in messages:
+        reply = agent.reply(message)
+    return reply
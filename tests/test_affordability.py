@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import affordability
+
+
+def scalar_emi(principal, months, rate):
+    # the chatbot's original per-application formula
+    r = rate / 100 / 12
+    if months <= 0:
+        return 0
+    return principal * r * (1 + r) ** months / ((1 + r) ** months - 1)
+
+
+@pytest.mark.parametrize("principal,months,rate", [
+    (100_000, 12, 11.0), (500_000, 84, 10.25), (2_530_000, 360, 8.5), (50_000, 6, 24.0), (1, 1, 11.0),
+])
+def test_emi_matches_the_scalar_formula(principal, months, rate):
+    assert float(affordability.emi(principal, months, rate)) == pytest.approx(scalar_emi(principal, months, rate))
+
+
+def test_emi_grid_matches_the_scalar_formula_everywhere():
+    amounts, tenures, rates = [100_000, 750_000, 1_200_000], [6, 24, 84], [9.5, 11.0, 13.75]
+    grid = affordability.emi_grid(amounts, tenures, rates)
+    assert grid.shape == (3, 3, 3)
+    for i, a in enumerate(amounts):
+        for j, t in enumerate(tenures):
+            for k, r in enumerate(rates):
+                assert grid[i, j, k] == pytest.approx(scalar_emi(a, t, r))
+
+
+def test_zero_rate_and_zero_tenure():
+    assert affordability.emi_factor(12, 0.0) == pytest.approx(1 / 12)
+    assert affordability.emi_factor([0, -3], 11.0).tolist() == [0.0, 0.0]
+    assert float(affordability.emi(120_000, 12, 0.0)) == pytest.approx(10_000)
+
+
+def test_allowed_emi_is_floored_at_zero():
+    headroom = affordability.allowed_emi([60_000, 40_000, 10_000], [5_000, 20_000, 9_000])
+    assert headroom.tolist() == [25_000, 0, 0]
+
+
+def test_max_principal_is_the_inverse_of_emi():
+    income = np.array([60_000.0, 90_000.0, 20_000.0])
+    existing = np.array([5_000.0, 0.0, 15_000.0])
+    tenures = [12, 36, 84]
+    loans = affordability.max_principal(income, existing, tenures, 11.0)
+    assert loans.shape == (3, 3)
+    headroom = affordability.allowed_emi(income, existing)
+    for i in range(2):
+        for j, t in enumerate(tenures):
+            assert scalar_emi(loans[i, j], t, 11.0) == pytest.approx(headroom[i])
+    assert loans[2].tolist() == [0, 0, 0]  # existing EMIs already use up half the income
+    assert affordability.max_eligible_loan(60_000, 5_000, 36, 11.0) == pytest.approx(loans[0, 1])
+
+
+def test_max_principal_takes_a_rate_per_customer():
+    rates = np.array([10.0, 12.0])[:, None]
+    loans = affordability.max_principal([60_000, 60_000], 0, [84], rates)
+    assert loans.shape == (2, 1) and loans[0, 0] > loans[1, 0]
+    assert loans[1, 0] == pytest.approx(affordability.max_eligible_loan(60_000, 0, 84, 12.0))
+
+
+@pytest.mark.parametrize("rate", [11.0, 0.0])
+def test_amortization_schedule_pays_off_the_principal(rate):
+    schedule = affordability.amortization_schedule(300_000, 24, rate)
+    assert schedule["month"].tolist() == list(range(1, 25))
+    assert schedule["emi"][0] == pytest.approx(scalar_emi(300_000, 24, rate) if rate else 12_500)
+    assert schedule["principal"].sum() == pytest.approx(300_000)
+    assert schedule["balance"][-1] == pytest.approx(0, abs=1e-6)
+    assert np.allclose(schedule["interest"] + schedule["principal"], schedule["emi"])
+    assert np.all(np.diff(schedule["balance"]) < 0)
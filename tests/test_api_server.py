@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+
+import api_server
+from api_server import ChatApi
+
+
+async def start(api):
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0, limit=api_server.MAX_HEADER_BYTES)
+    return server, server.sockets[0].getsockname()[1]
+
+
+class Client:
+    """One keep-alive connection speaking just enough HTTP/1.1."""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def send(self, method, target, body=b"", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        head = [f"{method} {target} HTTP/1.1", "Host: test", f"Content-Length: {len(body)}"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        return await self.response()
+
+    async def response(self):
+        lines = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = {k.strip().lower(): v.strip() for k, v in (line.split(":", 1) for line in lines[1:] if ":" in line)}
+        data = await self.reader.readexactly(int(headers["content-length"]))
+        if headers["content-type"] == "application/json":
+            data = json.loads(data)
+        return status, headers, data
+
+    async def closed(self):
+        return await asyncio.wait_for(self.reader.read(), 5) == b""
+
+    def close(self):
+        self.writer.close()
+
+
+def run(scenario, session_store="memory", apis=1):
+    """Run ``scenario(*ports)`` against fresh API servers sharing one session store spec."""
+    async def main():
+        instances = [ChatApi(session_store, workers=2) for _ in range(apis)]
+        servers = [await start(api) for api in instances]
+        try:
+            return await scenario(*(port for _, port in servers))
+        finally:
+            for (server, _), api in zip(servers, instances):
+                server.close()
+                api.executor.shutdown()
+    return asyncio.run(main())
+
+
+def test_signup_login_and_chat_share_one_connection(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        status, _, data = await client.send("POST", "/api/signup", {
+            "name": "Asha", "password": "pw", "income": 50000, "age": 30, "employment": "Salaried"})
+        assert status == 200
+        cid = data["customer_id"]
+        status, headers, data = await client.send("POST", "/api/login", {"customer_id": cid, "password": "pw"})
+        assert status == 200 and headers["connection"] == "keep-alive"
+        sid = data["session_id"]
+        status, _, data = await client.send("POST", "/api/chat", {"session_id": sid, "message": "check eligibility"})
+        assert status == 200 and data["state"] == "idle" and "Credit score" in data["reply"]
+        status, _, _ = await client.send("POST", "/api/logout", {"session_id": sid})
+        assert status == 200
+        status, _, _ = await client.send("POST", "/api/chat", {"session_id": sid, "message": "hi"})
+        assert status == 401
+        client.close()
+    run(scenario)
+
+
+def test_routing(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        assert (await client.send("POST", "/api/nope", {}))[0] == 404
+        assert (await client.send("DELETE", "/api/chat"))[0] == 405
+        assert (await client.send("POST", "/api/login", {"customer_id": "100004", "password": "wrong"}))[0] == 401
+        status, headers, body = await client.send("GET", "/metrics")
+        assert status == 200 and headers["content-type"].startswith("text/plain")
+        status, headers, body = await client.send("GET", "/")
+        assert status == 200 and headers["content-type"] == "text/html" and b'id="signup-panel"' in body
+        status, headers, _ = await client.send("GET", "/script.js")
+        assert status == 200 and "javascript" in headers["content-type"]
+        status, _, _ = await client.send("GET", "/api/sanction?session_id=unknown")
+        assert status == 401
+        client.close()
+    run(scenario)
+
+
+@pytest.mark.parametrize("path", ["/../api_server.py", "/../../etc/passwd", "//etc/passwd",
+                                  "/..%2fapi_server.py", "/missing.html"])
+def test_static_files_stay_inside_web_dir(data_dir, path):
+    async def scenario(port):
+        client = await Client.connect(port)
+        status, _, data = await client.send("GET", path)
+        assert status == 404 and data == {"error": "Not found"}
+        client.close()
+    run(scenario)
+
+
+def test_oversized_body_gets_413_and_closes(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        client.writer.write(b"POST /api/chat HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (api_server.MAX_JSON_BYTES + 1))
+        await client.writer.drain()
+        status, headers, _ = await client.response()
+        assert status == 413 and headers["connection"] == "close"
+        assert await client.closed()
+    run(scenario)
+
+
+def test_oversized_headers_get_413(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        status, headers, _ = await client.send("GET", "/", headers={"X-Padding": "a" * api_server.MAX_HEADER_BYTES})
+        assert status == 413 and headers["connection"] == "close"
+        assert await client.closed()
+    run(scenario)
+
+
+def test_bad_json_gets_400_and_closes(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        status, headers, data = await client.send("POST", "/api/login", b"{not json")
+        assert status == 400 and data == {"error": "Invalid JSON"} and headers["connection"] == "close"
+        assert await client.closed()
+    run(scenario)
+
+
+def test_connection_close_is_honoured(data_dir):
+    async def scenario(port):
+        client = await Client.connect(port)
+        status, headers, _ = await client.send("GET", "/", headers={"Connection": "close"})
+        assert status == 200 and headers["connection"] == "close"
+        assert await client.closed()
+    run(scenario)
+
+
+def test_another_worker_adopts_the_session(data_dir):
+    async def scenario(first, second):
+        a, b = await Client.connect(first), await Client.connect(second)
+        _, _, data = await a.send("POST", "/api/login", {"customer_id": "100004", "password": "manish@007"})
+        sid = data["session_id"]
+        status, _, data = await a.send("POST", "/api/chat", {"session_id": sid, "message": "apply loan"})
+        assert status == 200
+        state = data["state"]
+        # the second worker has never seen this session: it loads it from the shared store
+        status, _, data = await b.send("POST", "/api/chat", {"session_id": sid, "message": "300000"})
+        assert status == 200 and data["state"] != state
+        a.close()
+        b.close()
+    run(scenario, f"sqlite:{data_dir / 'sessions.db'}", apis=2)
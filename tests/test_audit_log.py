@@ -0,0 +1,27 @@
+import audit_log
+import chatbot
+from customer_store import open_store
+
+
+def test_customer_created_omits_password_and_replays_locked(data_dir):
+    cid = chatbot.create_customer("Asha", "s3cret!", 45000, 30, "Salaried")
+    chatbot.update_customer(cid, existing_emi=1200)
+    audit_log.get_audit_log().flush()
+    directory = str(data_dir / "audit")
+
+    assert not any("s3cret!" in open(p, encoding="utf-8").read() for p in audit_log.segments(directory))
+
+    rebuilt = open_store(str(data_dir / "rebuilt.csv"))
+    assert audit_log.replay_customers(directory, rebuilt) == (1, 1)
+    customer = rebuilt.get(cid)
+    assert customer["name"] == "Asha" and customer["existing_emi"] == 1200
+    assert customer["password"].startswith(audit_log.LOCKED_PASSWORD)
+
+
+def test_group_commit_keeps_order(data_dir):
+    log = audit_log.get_audit_log()
+    for i in range(500):
+        log.log("decision", "100001", n=i)
+    log.flush()
+    events = list(audit_log.iter_events(str(data_dir / "audit"), event="decision"))
+    assert [e["n"] for e in events] == list(range(500))
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+import affordability
+import batch_sanctions
+from customer_store import open_store
+from rate_card import get_rate_card
+
+
+def jobs(data_dir, *records):
+    path = data_dir / "apps.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in records))
+    skipped = {"resumed": 0, "unknown_customer": 0}
+    store = open_store(str(data_dir / "customers.csv"))
+    return list(batch_sanctions.iter_jobs(str(path), store, set(), skipped)), skipped
+
+
+def test_letters_are_priced_from_the_rate_card(data_dir):
+    (job,), _ = jobs(data_dir, {"cid": "100004", "loan_amount": 200000, "tenure": 24})
+    kyc, emi = job[3], job[6]
+    quote = get_rate_card().quote(200000, 24, "Salaried", 745)
+    assert kyc["rate"] == quote["rate"] and kyc["product_label"] == "Personal Loan"
+    assert emi == pytest.approx(quote["emi"])
+
+
+def test_explicit_rate_sets_emi_and_letter_rate(data_dir):
+    (job,), _ = jobs(data_dir, {"cid": "100004", "loan_amount": 200000, "tenure": 24, "rate": 13.5,
+                                "product": "home"})
+    assert job[3]["rate"] == 13.5 and job[3]["product_label"] == "Home Loan"
+    assert job[6] == pytest.approx(200000 * float(affordability.emi_factor(24, 13.5)))
+
+
+def test_unknown_customers_are_skipped(data_dir):
+    found, skipped = jobs(data_dir, {"cid": "999999", "loan_amount": 1, "tenure": 6})
+    assert found == [] and skipped["unknown_customer"] == 1
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import bureau_stub
+import config
+from bureau_stub import start_stub
+from credit_bureau import BureauClient, BureauUnavailable, lookup_score
+
+
+@pytest.fixture
+def stub():
+    server, url = start_stub(latency_ms=20)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_lookups_share_bulk_requests(stub):
+    server, url = stub
+    client = BureauClient(url)
+    ids = [str(200000 + i) for i in range(40)]
+    found = {}
+    threads = [threading.Thread(target=lambda c=c: found.update({c: client.score(c)})) for c in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert found == {c: bureau_stub.stub_score(c) for c in ids}
+    assert server.requests < len(ids)
+
+
+def test_answers_are_cached_for_the_ttl(stub):
+    server, url = stub
+    client = BureauClient(url, ttl=0.2)
+    assert client.scores(["100001", "100002"]) == client.scores(["100002", "100001"])
+    assert server.requests == 1
+    time.sleep(0.25)
+    client.score("100001")
+    assert server.requests == 2
+
+
+def test_unknown_ids_are_absent(stub):
+    server, url = stub
+    server.scores = {"100001": 777}
+    client = BureauClient(url)
+    assert client.scores(["100001", "999999"]) == {"100001": 777}
+    assert client.score("999999") is None
+
+
+def test_breaker_opens_then_closes_after_a_good_trial(stub, monkeypatch):
+    server, url = stub
+    client = BureauClient(url, ttl=0, breaker_threshold=2, breaker_reset=0.1)
+    monkeypatch.setattr(bureau_stub, "stub_score", lambda cid: None)  # {"scores": {"1": null}}
+    for _ in range(2):
+        with pytest.raises(BureauUnavailable):
+            client.score("100001")
+    requests = server.requests
+    with pytest.raises(BureauUnavailable, match="circuit open"):
+        client.score("100001")
+    assert server.requests == requests  # failed fast
+
+    time.sleep(0.15)
+    with pytest.raises(BureauUnavailable, match="failed"):
+        client.score("100001")  # half-open trial gets another malformed answer
+    with pytest.raises(BureauUnavailable, match="circuit open"):
+        client.score("100001")  # and the circuit opened again
+
+    monkeypatch.undo()
+    time.sleep(0.15)
+    assert client.score("100001") == bureau_stub.stub_score("100001")
+    assert client.score("100002") == bureau_stub.stub_score("100002")  # closed
+
+
+def test_unreachable_bureau_opens_the_breaker():
+    client = BureauClient("http://127.0.0.1:9", timeout=0.5, breaker_threshold=1, breaker_reset=60)
+    with pytest.raises(BureauUnavailable, match="failed"):
+        client.score("100001")
+    with pytest.raises(BureauUnavailable, match="circuit open"):
+        client.score("100001")
+
+
+def test_lookup_falls_back_on_a_malformed_answer(data_dir, stub, monkeypatch):
+    server, url = stub
+    config.configure(data_dir=str(data_dir), verification_cache="", bureau_url=url)
+    monkeypatch.setattr(bureau_stub, "stub_score", lambda cid: "n/a")
+    assert lookup_score("100001", fallback=701) == 701
@@ -0,0 +1,226 @@
+import os
+import threading
+
+import pytest
+
+from customer_store import CsvCustomerStore, open_store
+
+
+@pytest.fixture
+def csv_path(data_dir):
+    return str(data_dir / "customers.csv")
+
+
+def test_second_instance_sees_updates_and_appends(csv_path):
+    writer, reader = open_store(csv_path), open_store(csv_path)
+    assert reader.get("100004")["existing_emi"] == 3500
+    before = reader.version("100004")
+    writer.update("100004", {"existing_emi": "4200.5"})
+    assert reader.get("100004")["existing_emi"] == 4200.5
+    assert reader.version("100004") == before + 1
+    assert reader.version("100001") == 0
+    writer.add(["100099", "New", "pw", 1000, 30, "Salaried", 0, 700])
+    assert reader.get("100099")["name"] == "New" and len(reader) == len(writer)
+
+
+def test_update_rejects_unknown_columns(csv_path):
+    with pytest.raises(ValueError):
+        open_store(csv_path).update("100004", {"salary": 1})
+
+
+def test_compaction_folds_the_log_and_keeps_every_row(csv_path):
+    store = open_store(csv_path)
+    rows = {cid: store.get(cid) for cid in ("100001", "100002", "100003", "100004")}
+    store.update("100002", {"monthly_income": "99000"})
+    store.update("100002", {"existing_emi": "1500"})
+    version = store.version("100002")
+    other = open_store(csv_path)
+    other_version = other.version("100002")
+
+    assert store.compact()
+    assert os.path.getsize(csv_path + ".updates") == 0
+    assert not store.compact()  # nothing left to fold
+    for cid, row in rows.items():
+        expected = {**row, "income": 99000.0, "existing_emi": 1500.0} if cid == "100002" else row
+        assert store.get(cid) == expected and other.get(cid) == expected
+    # same values after the swap: versions (and snapshots taken on them) stay put
+    assert store.version("100002") == version and other.version("100002") == other_version
+    store.update("100002", {"existing_emi": "1600"})
+    assert other.version("100002") == other_version + 1 and other.get("100002")["existing_emi"] == 1600
+
+
+def test_background_compaction_once_the_log_is_large(csv_path):
+    store = CsvCustomerStore(csv_path, compact_bytes=200)
+    with open(csv_path, "rb") as f:
+        base = f.read()
+    for i in range(10):
+        store.update("100003", {"existing_emi": str(i)})
+    with store._compacting:  # waits for a running compaction
+        pass
+    with open(csv_path, "rb") as f:
+        assert f.read() != base  # folded into a new base file
+    assert os.path.getsize(csv_path + ".updates") < 200
+    assert store.get("100003")["existing_emi"] == 9 and open_store(csv_path).get("100003")["existing_emi"] == 9
+
+
+def test_concurrent_updates_are_not_lost(csv_path):
+    stores = [open_store(csv_path) for _ in range(4)]
+    cids = ["100001", "100002", "100003", "100004"]
+
+    def work(store, n):
+        for i in range(25):
+            store.update(cids[n], {"existing_emi": str(i), "age": str(30 + n)})
+
+    threads = [threading.Thread(target=work, args=(s, n)) for n, s in enumerate(stores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    fresh = open_store(csv_path)
+    with open(csv_path + ".updates", "rb") as f:
+        assert sum(1 for _ in f) == 100
+    for n, cid in enumerate(cids):
+        assert fresh.get(cid)["existing_emi"] == 24 and fresh.get(cid)["age"] == 30 + n
+        assert fresh.version(cid) >= 1
+
+
+# ---------- IDs and group commit ----------
+def _allocate(path, n, out):
+    from customer_store import IdAllocator
+    ids = IdAllocator(path, lambda: 100020, block_size=7)
+    out.put([ids.allocate() for _ in range(n)])
+
+
+def _add_then_die(path, rows):
+    store = open_store(path)
+    for row in rows:
+        store.add(row)
+    os._exit(0)  # no flush, no interpreter shutdown
+
+
+def test_ids_are_unique_across_processes(csv_path):
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    workers = [ctx.Process(target=_allocate, args=(csv_path, 40, out)) for _ in range(3)]
+    for w in workers:
+        w.start()
+    ids = [cid for _ in workers for cid in out.get(timeout=60)]
+    for w in workers:
+        w.join()
+    assert len(set(ids)) == 120 and min(int(c) for c in ids) == 100021
+
+
+def test_ids_start_above_the_highest_existing(csv_path):
+    store = open_store(csv_path)
+    first = int(store.allocate_id())
+    assert first > store.max_id() and int(store.allocate_id()) == first + 1
+    # a new process (new allocator) continues past the reserved block
+    assert int(open_store(csv_path).allocate_id()) >= first + 100
+
+
+def test_acknowledged_rows_survive_a_crash(csv_path):
+    import multiprocessing
+    rows = [[str(300000 + i), f"N{i}", "pw", 1000, 30, "Salaried", 0, 700] for i in range(20)]
+    proc = multiprocessing.get_context("spawn").Process(target=_add_then_die, args=(csv_path, rows))
+    proc.start()
+    proc.join(60)
+    store = open_store(csv_path)
+    assert all(store.get(row[0])["name"] == row[1] for row in rows)
+
+
+def test_fire_and_forget_rows_are_written_by_flush():
+    from customer_store import GroupCommitter
+    batches = []
+    committer = GroupCommitter(lambda rows: batches.append(list(rows)), max_batch=50)
+    for i in range(200):
+        committer.submit(i, wait=False)
+    committer.flush()
+    assert [row for batch in batches for row in batch] == list(range(200))
+    assert all(len(batch) <= 50 for batch in batches)
+
+
+def test_failed_batch_is_reported_to_every_waiter():
+    from customer_store import GroupCommitter
+    fail = threading.Event()
+    fail.set()
+
+    def write(rows):
+        if fail.is_set():
+            raise OSError("disk full")
+
+    committer = GroupCommitter(write)
+    with pytest.raises(OSError):
+        committer.submit("a")
+    fail.clear()
+    committer.submit("b")  # the writer thread carries on
+
+
+def test_signup_is_readable_at_once(data_dir):
+    import chatbot
+    cids = []
+    threads = [threading.Thread(target=lambda i=i: cids.append(
+        chatbot.create_customer(f"User{i}", "pw", 30000 + i, 30, "Salaried"))) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(cids)) == 10
+    fresh = open_store(str(data_dir / "customers.csv"))
+    for cid in cids:
+        assert chatbot.get_customer_by_cid(cid)["password"] == "pw"
+        assert fresh.get(cid)["name"].startswith("User")
+
+
+# ---------- SQLite backend ----------
+def test_migration_copies_every_row_once(csv_path, data_dir):
+    from customer_store import SqliteCustomerStore, migrate_csv_to_sqlite
+    db = str(data_dir / "customers.db")
+    csv_store = open_store(csv_path)
+    assert migrate_csv_to_sqlite(csv_path, db, batch_size=7) == len(csv_store)
+    assert migrate_csv_to_sqlite(csv_path, db) == 0  # re-run skips what is there
+    store = SqliteCustomerStore(db)
+    for cid in ("100001", "100004", str(csv_store.max_id())):
+        assert store.get(cid) == csv_store.get(cid)
+    assert store.max_id() == csv_store.max_id()
+
+
+def test_migrate_command(csv_path, data_dir):
+    import subprocess
+    import sys
+    from conftest import ROOT
+    db = str(data_dir / "cli.db")
+    out = subprocess.run([sys.executable, os.path.join(ROOT, "customer_store.py"), "migrate", csv_path, db],
+                         capture_output=True, text=True, check=True).stdout
+    assert f"Migrated {len(open_store(csv_path))} customers" in out
+
+
+def test_sqlite_update_and_version(data_dir):
+    store = open_store(str(data_dir / "customers.db"))
+    store.add(["100001", "Harini", "pw", 42000, 23, "Salaried", 0, 715])
+    assert store.version("100001") == 0 and store.version("100999") == 0
+    store.update("100001", {"existing_emi": 2500, "monthly_income": 45000})
+    store.update("100001", {"existing_emi": 3000})
+    customer = store.get("100001")
+    assert customer["existing_emi"] == 3000 and customer["income"] == 45000
+    assert store.version("100001") == 2
+    with pytest.raises(ValueError):
+        store.update("100001", {"version": 0})
+    assert store.get("100999") is None and len(store) == 1
+
+
+def test_backend_follows_the_configured_file(data_dir):
+    import chatbot
+    import config
+    from customer_store import CsvCustomerStore, SqliteCustomerStore, migrate_csv_to_sqlite
+    assert isinstance(chatbot.get_store(), CsvCustomerStore)
+    migrate_csv_to_sqlite(str(data_dir / "customers.csv"), str(data_dir / "customers.sqlite"))
+    chatbot._store = None
+    config.configure(data_dir=str(data_dir), verification_cache="", customer_file="customers.sqlite")
+    assert isinstance(chatbot.get_store(), SqliteCustomerStore)
+    cid = chatbot.create_customer("Asha", "pw", 45000, 30, "Salaried")
+    assert int(cid) > 100019 and chatbot.get_customer_by_cid(cid)["name"] == "Asha"
+    before = chatbot.get_customer_version("100004")
+    chatbot.update_customer("100004", existing_emi=4000)
+    assert chatbot.get_customer_version("100004") == before + 1
+    assert chatbot.get_customer_by_cid("100004")["existing_emi"] == 4000
@@ -0,0 +1,60 @@
+from chatbot import MasterAgent
+from conftest import run_dialogue
+
+KYC = ("Harini Rao", "01-01-1995", "ABCDE1234F")
+
+
+def home_application(agent, amount, months, property_value, income="42000"):
+    return run_dialogue(agent, "apply home loan", str(amount), str(months), str(property_value),
+                        *KYC, income, "salaried", "0")
+
+
+def test_ltv_rejects_before_salary_upload(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    reply = home_application(agent, 2_530_000, 360, 100_000)
+    assert "Loan rejected" in reply and "80% of the property" in reply
+    assert agent.state == "idle"
+
+
+def test_salary_upload_cannot_bypass_ltv(data_dir):
+    # within LTV but large against income: upload required, then confirm
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    reply = home_application(agent, 2_530_000, 360, 4_000_000)
+    assert agent.state == "await_salary_upload", reply
+    reply = agent.process_salary_upload(b"Net Pay: 42000", "slip.txt")
+    assert agent.state == "confirm", reply
+
+
+def test_low_score_rejected_before_salary_upload(data_dir):
+    agent = MasterAgent("100003")  # score 690, personal loans need 700
+    agent.start_chat()
+    reply = run_dialogue(agent, "apply loan", "900000", "24", *KYC, "38000", "self employed", "0")
+    assert "credit score 690 below minimum" in reply
+    assert agent.state == "idle"
+
+
+def test_gold_loan_score_floor_is_per_product(data_dir):
+    agent = MasterAgent("100003")
+    agent.start_chat()
+    reply = run_dialogue(agent, "apply gold loan", "50000", "12", "20", *KYC, "38000", "salaried", "0")
+    assert agent.state == "confirm", reply
+
+
+def test_unreadable_slip_goes_to_manual_review(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    home_application(agent, 2_530_000, 360, 4_000_000)
+    image = b"\x89PNG\r\n\x1a\n" + bytes(b for b in range(256) if not 0x30 <= b <= 0x39) * 16
+    reply = agent.process_salary_upload(image, "IMG_20240101.png")
+    assert "manual verification" in reply and "no legible salary figure" in reply
+    assert agent.temp["salary_verified"] == "manual_review"
+
+
+def test_bare_number_slip_is_checked_against_registered_income(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    home_application(agent, 2_530_000, 360, 4_000_000)
+    reply = agent.process_salary_upload(b"employee 4711 salary slip 42500", "slip.txt")
+    assert "Salary slip verified" in reply and agent.temp["salary_verified"] == "verified"
@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+import config
+import idempotency
+from chatbot import MasterAgent
+from idempotency import SanctionLedger, TurnCache, get_sanction_ledger
+from session_store import open_session_store
+
+
+def test_ledger_claims_once_and_survives_a_restart(data_dir):
+    ledger = get_sanction_ledger()
+    assert ledger.claim("app-1", "100001")
+    assert not ledger.claim("app-1", "100001")
+    reopened = SanctionLedger(open_session_store(config.get_settings().sanction_ledger))
+    assert not reopened.claim("app-1", "100001")
+    ledger.release("app-1")
+    assert reopened.claim("app-1", "100001")
+
+
+def test_ledger_is_not_the_session_lru(data_dir):
+    sessions = open_session_store("memory:2")
+    ledger = get_sanction_ledger()
+    assert ledger.claim("app-2", "100001")
+    for i in range(10):
+        sessions.put(f"s{i}", b"x")
+    assert not ledger.claim("app-2", "100001")
+
+
+def test_memory_ledger_is_refused(data_dir):
+    config.configure(data_dir=str(data_dir), sanction_ledger="memory")
+    idempotency._ledger = None
+    with pytest.raises(ValueError):
+        get_sanction_ledger()
+
+
+def test_concurrent_claims_have_one_winner(data_dir):
+    ledger = get_sanction_ledger()
+    wins = []
+    threads = [threading.Thread(target=lambda: wins.append(ledger.claim("app-3", "100001"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert wins.count(True) == 1
+
+
+def test_turn_cache_replays_only_the_last_turn():
+    cache = TurnCache(window=5)
+    cache.put("s", "d1", "reply", "ask_amount")
+    assert cache.get("s", "d1", "ask_amount") == "reply"
+    assert cache.get("s", "d1", "ask_tenure") is None  # conversation moved on
+    assert cache.get("other", "d1", "ask_amount") is None
+    cache.put("s", "d2", "second", "ask_amount")
+    assert cache.get("s", "d1", "ask_amount") is None  # another turn came in between
+    window_off = TurnCache(window=0)
+    window_off.put("s", "d1", "reply", "ask_amount")
+    assert window_off.get("s", "d1", "ask_amount") is None
+
+
+def test_repeated_turn_is_processed_once(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    first = agent.reply("apply loan")
+    assert agent.reply("apply loan") == first  # rerun of the same submission
+    assert agent.state == "ask_amount"
+    agent.reply("50000")
+    assert agent.state == "ask_tenure"
+    agent.reply("24")
+    assert agent.state == "ask_name"
+
+
+def test_racing_duplicate_yes_sanctions_once(data_dir, monkeypatch):
+    import sanction_jobs
+    submitted = []
+
+    class Queue:
+        def submit(self, *args):
+            submitted.append(args)
+            return type("Job", (), {"id": len(submitted)})()
+
+    monkeypatch.setattr(sanction_jobs, "get_sanction_queue", Queue)
+    agent = MasterAgent("100004")
+    agent.start_chat()
+    for message in ("apply loan", "100000", "24", "Manish Rao", "01-01-1997", "ABCDE1234F", "62000",
+                    "salaried", "0"):
+        agent.reply(message)
+    assert agent.state == "confirm"
+    replies = []
+    threads = [threading.Thread(target=lambda: replies.append(agent.reply("yes"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(submitted) == 1 and len(set(replies)) == 1
+
+
+def _confirming(cid="100004"):
+    agent = MasterAgent(cid)
+    agent.start_chat()
+    for message in ("apply loan", "100000", "24", "Manish Rao", "01-01-1997", "ABCDE1234F", "62000",
+                    "salaried", "0"):
+        agent.reply(message)
+    assert agent.state == "confirm"
+    return agent
+
+
+def test_yes_after_a_full_queue_is_not_swallowed(data_dir, monkeypatch):
+    import sanction_jobs
+    submitted = []
+
+    class Queue:
+        def submit(self, *args):
+            submitted.append(args)
+            if len(submitted) == 1:
+                raise sanction_jobs.QueueFull("busy")
+            return type("Job", (), {"id": len(submitted)})()
+
+    monkeypatch.setattr(sanction_jobs, "get_sanction_queue", Queue)
+    agent = _confirming()
+    assert "again in a moment" in agent.reply("yes")
+    assert "sanctioned successfully" in agent.reply("yes")
+    assert len(submitted) == 2
+
+
+def test_submission_id_replays_only_a_retry(data_dir, monkeypatch):
+    handled = []
+    original = MasterAgent._reply
+    monkeypatch.setattr(MasterAgent, "_reply", lambda self, message: handled.append(message) or original(self, message))
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    agent.reply("apply loan", submission_id="s1")
+    error = agent.reply("abc", submission_id="s2")
+    assert agent.reply("abc", submission_id="s2") == error  # retry of the same send
+    assert agent.reply("abc", submission_id="s3") == error  # sent again on purpose
+    assert handled == ["apply loan", "abc", "abc"]
+    agent.reply("50000")
+    agent.reply("50000")  # same text, state moved on: replayed
+    assert handled[-1] == "50000" and handled.count("50000") == 1 and agent.state == "ask_tenure"
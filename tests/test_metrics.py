@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import metrics
+from chatbot import MasterAgent
+
+
+@pytest.fixture
+def enabled():
+    was = metrics.ENABLED
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.ENABLED = was
+    metrics.reset()
+
+
+def histogram(name, **labels):
+    for h in metrics.snapshot()["histograms"]:
+        if h["name"] == name and h["labels"] == labels:
+            return h
+    return None
+
+
+def counter(name, **labels):
+    return next((c["value"] for c in metrics.snapshot()["counters"]
+                 if c["name"] == name and c["labels"] == labels), None)
+
+
+def test_counters_add_up_per_label_set(enabled):
+    metrics.inc("rows_scanned_total", 10)
+    metrics.inc("rows_scanned_total", 5)
+    metrics.inc("rows_scanned_total", store="sqlite")
+    metrics.transition("idle", "ask_amount")
+    assert counter("rows_scanned_total") == 15
+    assert counter("rows_scanned_total", store="sqlite") == 1
+    assert counter("chat_transitions_total", **{"from": "idle", "to": "ask_amount"}) == 1
+
+
+def test_histogram_buckets_are_upper_bounds(enabled):
+    for seconds in (0.00005, 0.001, 0.003, 10.0):
+        metrics.observe("lookup_seconds", seconds)
+    h = histogram("lookup_seconds")
+    assert h["count"] == 4 and h["sum"] == pytest.approx(10.00405)
+    assert h["buckets"]["0.0001"] == 1
+    assert h["buckets"]["0.001"] == 1  # a value on a bound falls in that bucket (le)
+    assert h["buckets"]["0.005"] == 1
+    assert h["buckets"]["+Inf"] == 1
+
+
+def test_timed_records_only_when_enabled(enabled):
+    @metrics.timed("work_seconds", kind="test")
+    def work(x):
+        return x * 2
+
+    assert work(2) == 4
+    metrics.disable()
+    assert work(3) == 6
+    assert histogram("work_seconds", kind="test")["count"] == 1
+
+
+def test_timed_records_failures_too(enabled):
+    @metrics.timed("fail_seconds")
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        fail()
+    assert histogram("fail_seconds")["count"] == 1
+
+
+def test_prometheus_exposition(enabled):
+    metrics.observe("reply_seconds", 0.002, state="idle")
+    metrics.observe("reply_seconds", 0.2, state="idle")
+    metrics.inc("letters_rendered_total", 3)
+    lines = metrics.render_prometheus().splitlines()
+    assert lines.count("# TYPE reply_seconds histogram") == 1
+    assert "# TYPE letters_rendered_total counter" in lines
+    assert 'reply_seconds_bucket{state="idle",le="0.001"} 0' in lines
+    assert 'reply_seconds_bucket{state="idle",le="0.005"} 1' in lines  # cumulative
+    assert 'reply_seconds_bucket{state="idle",le="+Inf"} 2' in lines
+    assert 'reply_seconds_sum{state="idle"} 0.202000' in lines
+    assert 'reply_seconds_count{state="idle"} 2' in lines
+    assert "letters_rendered_total 3" in lines
+
+
+def test_json_dump_round_trips(enabled, tmp_path):
+    metrics.inc("uploads_total", 2)
+    metrics.observe("upload_seconds", 0.03)
+    path = tmp_path / "metrics.json"
+    metrics.dump_json(str(path))
+    data = json.loads(path.read_text())
+    assert data["counters"] == [{"name": "uploads_total", "labels": {}, "value": 2}]
+    assert data["histograms"][0]["name"] == "upload_seconds" and data["histograms"][0]["count"] == 1
+    assert list(tmp_path.iterdir()) == [path]  # no temp file left behind
+
+
+def test_chat_turns_are_measured(enabled, data_dir):
+    agent = MasterAgent("100004")
+    agent.start_chat()
+    agent.reply("apply loan")
+    assert histogram("chat_reply_seconds", state="idle")["count"] == 1
+    assert counter("chat_transitions_total", **{"from": "idle", "to": agent.state}) == 1
+
+
+def test_disabled_records_nothing(data_dir):
+    metrics.reset()
+    assert not metrics.ENABLED
+    agent = MasterAgent("100004")
+    agent.start_chat()
+    agent.reply("apply loan")
+    assert metrics.snapshot()["histograms"] == [] and metrics.snapshot()["counters"] == []
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import chatbot
+import preapproval
+from chatbot import MasterAgent
+from rate_card import get_rate_card
+
+
+def build(data_dir):
+    out = str(data_dir / "preapproval.npy")
+    preapproval.run(str(data_dir / "customers.csv"), out)
+    return preapproval.PreapprovalTable(out)
+
+
+def test_table_matches_direct_evaluation(data_dir):
+    table = build(data_dir)
+    row = table.get("100004")
+    rate = preapproval.segment_rates("Salaried", 745)
+    eligible, limit, _ = preapproval.evaluate(62000, 3500, 745, rate)
+    assert row["rate"] == rate
+    assert row["eligible"] == bool(eligible) and row["pre_approved"] == pytest.approx(float(limit), rel=1e-6)
+    assert row["income"] == 62000 and row["existing_emi"] == 3500
+    assert table.get("999999") is None
+
+
+def test_update_log_is_folded_in_without_the_store(data_dir):
+    chatbot.update_customer("100004", existing_emi=9000)
+    chatbot.get_store()._log_committer.flush()
+    assert preapproval.pending_updates(str(data_dir / "customers.csv")) == {100004: {"existing_emi": "9000"}}
+    assert build(data_dir).get("100004")["existing_emi"] == 9000
+
+
+def test_signups_do_not_invalidate_other_rows(data_dir):
+    build(data_dir)
+    chatbot.create_customer("New", "pw", 30000, 30, "Salaried")
+    assert chatbot.get_preapproval("100004") is not None
+
+
+def test_changed_profile_is_recomputed(data_dir):
+    build(data_dir)
+    chatbot.update_customer("100004", existing_emi=40000)  # no headroom left
+    agent = MasterAgent("100004")
+    agent.start_chat()
+    assert "not available" in agent.reply("check eligibility")
+
+
+def test_limits_are_priced_from_the_rate_card():
+    card = get_rate_card()
+    employment = np.array(["Salaried", "Self-Employed", "Salaried", ""], dtype=object)
+    score = np.array([745, 745, 810, 720])
+    rate = preapproval.segment_rates(employment, score, card)
+    assert rate.tolist() == [card.rate_ceiling(e, int(s)) for e, s in zip(employment, score)]
+    assert rate[1] > rate[0] > rate[2]
+    income = np.full(4, 60_000.0)
+    eligible, limit, headroom = preapproval.evaluate(income, 25_000, score, rate)
+    assert limit[1] < limit[0]
+    for e, s, ok, amount, room in zip(employment, score, eligible, limit, headroom):
+        # the final quote at the longest tenure fits the headroom the limit was sized for
+        assert ok and card.quote(float(amount), preapproval.MAX_TENURE, e, int(s))["emi"] <= room + 0.01
+
+
+def test_rebuilt_table_is_reopened(data_dir):
+    build(data_dir)
+    assert chatbot.get_preapproval("100004")["existing_emi"] == 3500
+    chatbot.update_customer("100004", existing_emi=9000)
+    chatbot.get_store()._log_committer.flush()
+    build(data_dir)  # replaces the file under the running process
+    assert chatbot.get_preapproval("100004")["existing_emi"] == 9000
+    (data_dir / "preapproval.npy").unlink()
+    assert chatbot.get_preapproval("100004") is None
+
+
+def test_malformed_cells_count_as_zero():
+    assert preapproval._column(("1200", "", "abc", "7.5")).tolist() == [1200, 0, 0, 7.5]
+    assert preapproval._column((1200, None)).tolist() == [1200, 0]
+    assert preapproval._column(("1", "2")).dtype == np.float64
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import affordability
+from rate_card import CompiledCard, RateCardError, get_rate_card, load_card
+
+CARD = {
+    "product": "Test Loan",
+    "base_rate": 11.0,
+    "min_rate": 9.5,
+    "tenure_months": [6, 84],
+    "processing_fee_pct": 2.0,
+    "employment": {"Salaried": 0.0, "Self-Employed": 0.75},
+    "credit_score_bands": [{"min": 800, "adjust": -0.75}, {"min": 700, "adjust": 0.0}, {"min": 0, "adjust": 1.5}],
+    "promotions": [
+        {"name": "Fee discount", "fee_discount_pct": 50, "when": {"min_amount": 300000}},
+        {"name": "Prime", "rate": -0.25, "when": {"min_score": 800, "employment": "Salaried"}},
+    ],
+}
+
+
+def test_segments_match_direct_evaluation():
+    card = CompiledCard(CARD)
+    assert card.rate_for("Salaried", 820) == 10.0
+    assert card.rate_for("Self-Employed", 820) == 11.0
+    assert card.rate_for("Unknown", 650) == 12.5
+    quote = card.quote(400000, 24, "Salaried", 820)
+    assert quote["promotions"] == ["Fee discount", "Prime"]
+    assert quote["processing_fee"] == 4000.0
+    assert quote["emi"] == pytest.approx(400000 * float(affordability.emi_factor(24, 10.0)))
+
+
+def test_quote_outside_the_table_still_prices():
+    card = CompiledCard(CARD)
+    assert card.quote(100000, 120, "Salaried", 720)["emi"] == pytest.approx(
+        100000 * float(affordability.emi_factor(120, 11.0)))
+
+
+def test_describe_shows_reachable_floor_and_fee():
+    first = CompiledCard(CARD).describe()[0]
+    assert "from 10%" in first and "processing fee 2%" in first
+
+
+def test_unknown_promotion_condition_is_rejected():
+    card = dict(CARD, promotions=[{"name": "Women special", "rate": -0.5, "when": {"gender": "Female"}}])
+    with pytest.raises(RateCardError):
+        CompiledCard(card)
+
+
+@pytest.mark.parametrize("name", ["rate_card.json", "rate_card_home.json", "rate_card_gold.json"])
+def test_shipped_cards_compile(name):
+    from conftest import ROOT
+    load_card(f"{ROOT}/{name}")
+
+
+def test_reload_keeps_last_good_card(tmp_path, monkeypatch):
+    import rate_card
+    monkeypatch.setattr(rate_card, "RELOAD_CHECK_SECONDS", 0)
+    path = tmp_path / "card.json"
+    path.write_text(json.dumps(CARD))
+    assert get_rate_card(str(path)).base_rate == 11.0
+    path.write_text(json.dumps(dict(CARD, base_rate=12.0, note="x")))
+    assert get_rate_card(str(path)).base_rate == 12.0
+    path.write_text("{broken")
+    assert get_rate_card(str(path)).base_rate == 12.0
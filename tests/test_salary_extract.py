@@ -0,0 +1,74 @@
+import zlib
+
+import salary_extract
+from salary_extract import extract_salary
+
+
+def _pdf(*streams):
+    parts = [b"%PDF-1.4\n"]
+    for i, (content, flate) in enumerate(streams, start=1):
+        data = zlib.compress(content) if flate else content
+        filters = b" /Filter /FlateDecode" if flate else b""
+        parts.append(b"%d 0 obj\n<< /Length %d%s >>\nstream\n" % (i, len(data), filters) + data
+                     + b"\nendstream\nendobj\n")
+    return b"".join(parts) + b"%%EOF\n"
+
+
+def test_net_pay_beats_gross():
+    result = extract_salary(b"Gross Salary: 80,000\nDeductions 9,000\nNet Pay: Rs. 71,000.00\n")
+    assert result["salary"] == 71000 and result["confidence"] == 0.9 and result["source"] == "text"
+    assert result["label"].lower().startswith("net pay")
+
+
+def test_gross_when_there_is_no_net_figure():
+    result = extract_salary(b"TOTAL EARNINGS = INR 1,25,000")
+    assert result["salary"] == 125000 and result["confidence"] == 0.7
+
+
+def test_bare_number_is_low_confidence():
+    result = extract_salary(b"payslip for employee 48213 march 62000 thanks")
+    assert result["salary"] == 48213  # first of the longest; not trusted on its own
+    assert result["confidence"] == salary_extract.UNLABELLED_CONFIDENCE and result["label"] is None
+
+
+def test_nothing_legible_and_the_file_name_is_ignored():
+    result = extract_salary(bytes(range(256)) * 8)
+    assert result["salary"] is None and result["confidence"] == 0.0
+
+
+def test_label_split_across_windows(monkeypatch):
+    monkeypatch.setattr(salary_extract, "CHUNK_SIZE", 64)
+    text = b"x" * 60 + b"Net Pay: 53,500" + b" y" * 100
+    assert extract_salary(text)["salary"] == 53500
+
+
+def test_upload_over_the_cap_is_not_scanned():
+    result = extract_salary(b"Net Pay: 50000", max_bytes=8)
+    assert result["salary"] is None and result["source"] == "too_large"
+
+
+def test_pdf_reads_only_page_text_from_flate_streams():
+    pdf = _pdf((b"BT /F1 12 Tf 72 700 Td (Employee 100234) Tj ET", False),
+               (b"BT 72 680 Td (Net Salary) Tj 200 0 Td (45,250) Tj ET", True))
+    result = extract_salary(pdf)
+    assert result["salary"] == 45250 and result["confidence"] == 0.9 and result["source"] == "pdf"
+
+
+def test_pdf_numbers_outside_strings_are_ignored():
+    pdf = _pdf((b"0 0 612 792 re 123456 w", True))
+    assert extract_salary(pdf)["salary"] is None
+
+
+def test_inflated_stream_is_capped(monkeypatch):
+    monkeypatch.setattr(salary_extract, "MAX_INFLATED_BYTES", 1024)
+    monkeypatch.setattr(salary_extract, "CHUNK_SIZE", 256)
+    filler = b"(padding) Tj " * 2000
+    pdf = _pdf((filler + b"(Net Pay 61000) Tj", True))
+    assert extract_salary(pdf)["salary"] is None  # past the cap, never inflated
+
+
+def test_damaged_stream_is_skipped():
+    pdf = _pdf((b"not zlib at all", False), (b"(Gross Pay 39000) Tj", True))
+    pdf = pdf.replace(b"not zlib at all", b"\x78\x9c garbage")
+    pdf = pdf.replace(b"<< /Length 15 >>", b"<< /Length 15 /Filter /FlateDecode >>")
+    assert extract_salary(pdf)["salary"] == 39000
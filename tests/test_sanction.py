@@ -0,0 +1,127 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import audit_log
+import chatbot
+from chatbot import MasterAgent
+from conftest import run_dialogue
+
+KYC = ("Rahul Mehta", "01-01-1999", "ABCDE1234F")
+
+
+@pytest.fixture(autouse=True)
+def submitted(monkeypatch):
+    # the decision is under test, not the PDF; the list holds what was submitted
+    jobs = []
+
+    class Job:
+        id = 1
+
+    class Queue:
+        def submit(self, *args):
+            jobs.append(args)
+            return Job()
+
+    import sanction_jobs
+    monkeypatch.setattr(sanction_jobs, "get_sanction_queue", Queue)
+    return jobs
+
+
+def offer(cid, amount="400000", months="24", income="51000"):
+    agent = MasterAgent(cid)
+    agent.start_chat()
+    reply = run_dialogue(agent, "apply loan", amount, months, *KYC, income, "salaried", "0")
+    assert agent.state == "confirm", reply
+    return agent
+
+
+def test_second_session_rechecks_emi_headroom(data_dir):
+    first, second = offer("100002"), offer("100002")
+    emi = first.temp["emi"]
+    assert "sanctioned successfully" in first.reply("yes")
+    reply = second.reply("yes")
+    assert "exceeds allowed" in reply and second.state == "idle"
+    assert chatbot.get_customer_by_cid("100002")["existing_emi"] == pytest.approx(2000 + emi, abs=1)
+
+
+def test_concurrent_sessions_sanction_once(data_dir):
+    agents = [offer("100002") for _ in range(4)]
+    replies = []
+    threads = [threading.Thread(target=lambda a=a: replies.append(a.reply("yes"))) for a in agents]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum("sanctioned successfully" in r for r in replies) == 1
+    profile = chatbot.get_customer_by_cid("100002")
+    assert profile["existing_emi"] <= 0.5 * profile["income"]
+
+
+def test_stale_profile_with_headroom_still_sanctions(data_dir):
+    agent = offer("100004", amount="100000", months="24", income="62000")
+    offered = agent.temp["emi"]
+    chatbot.update_customer("100004", existing_emi=5000)
+    assert "sanctioned successfully" in agent.reply("yes")
+    assert chatbot.get_customer_by_cid("100004")["existing_emi"] == pytest.approx(5000 + offered, abs=1)
+
+
+def test_restored_session_is_rechecked(data_dir):
+    agent = offer("100002")
+    restored = MasterAgent.from_bytes(agent.to_bytes(), agent.session_id)
+    chatbot.update_customer("100002", existing_emi=20000)
+    reply = restored.reply("yes")
+    assert "exceeds allowed" in reply and restored.state == "idle"
+
+
+def test_application_sanctioned_once(data_dir):
+    agent = offer("100004", amount="100000", months="24", income="62000")
+    twin = MasterAgent.from_bytes(agent.to_bytes())  # same application, another worker
+    assert "sanctioned successfully" in agent.reply("yes")
+    assert "already been sanctioned" in twin.reply("yes")
+
+
+def test_requoted_terms_are_sanctioned_on_the_next_yes(data_dir, submitted):
+    agent = offer("100004", amount="100000", months="24", income="62000")
+    offered = agent.temp["emi"]
+    chatbot.update_customer("100004", credit_score=810)
+    reply = agent.reply("yes")
+    assert agent.state == "confirm" and "Eligible" in reply and round(agent.temp["emi"]) != round(offered)
+    assert not submitted
+    assert "sanctioned successfully" in agent.reply("yes")
+    assert len(submitted) == 1
+
+
+def test_recheck_does_not_log_the_application_again(data_dir):
+    agent = offer("100004", amount="100000", months="24", income="62000")
+    restored = MasterAgent.from_bytes(agent.to_bytes(), agent.session_id)
+    assert "sanctioned successfully" in restored.reply("yes")
+    audit_log.get_audit_log().flush()
+    events = list(audit_log.iter_events(str(data_dir / "audit"), cid="100004"))
+    assert sum(e["ev"] == "application" for e in events) == 1
+    assert [e["outcome"] for e in events if e["ev"] == "decision"] == ["eligible", "sanctioned"]
+
+
+def _hold_sanction_lock(data_dir, cid, held, seconds):
+    import config
+    config.configure(data_dir=data_dir, verification_cache="")
+    with chatbot.sanction_lock(cid):
+        held.set()
+        time.sleep(seconds)
+
+
+def test_sanction_waits_for_another_worker(data_dir):
+    agent = offer("100004", amount="100000", months="24", income="62000")
+    ctx = multiprocessing.get_context("spawn")
+    held = ctx.Event()
+    worker = ctx.Process(target=_hold_sanction_lock, args=(str(data_dir), "100004", held, 0.5))
+    worker.start()
+    try:
+        assert held.wait(30)
+        start = time.monotonic()
+        assert "sanctioned successfully" in agent.reply("yes")
+        assert time.monotonic() - start > 0.2
+    finally:
+        worker.join()
@@ -0,0 +1,50 @@
+import threading
+
+import sanction_generator
+from sanction_archive import SanctionArchive
+
+CUSTOMER = {"cid": "100004", "name": "Manish"}
+KYC = {"id_number": "ABCDE1234F", "dob": "01-01-1997", "income": 62000, "employment": "Salaried", "rate": 10.5}
+
+
+def test_identical_letters_are_stored_once(tmp_path):
+    archive = SanctionArchive(str(tmp_path))
+    first = sanction_generator.render_sanction_pdf(CUSTOMER, KYC, 100000, 24, 4600)
+    second = sanction_generator.render_sanction_pdf(CUSTOMER, KYC, 100000, 24, 4600)
+    a = archive.put("100004", "a.pdf", first)
+    b = archive.put("100004", "b.pdf", second)
+    assert a["sha256"] == b["sha256"] and a["letter_id"] != b["letter_id"]
+    refs = archive._conn().execute("SELECT refs FROM objects").fetchall()
+    assert [r["refs"] for r in refs] == [2]
+    assert archive.get(b["letter_id"]) == ("b.pdf", second)
+
+
+def test_concurrent_puts_of_the_same_content(tmp_path):
+    archive = SanctionArchive(str(tmp_path))
+    errors = []
+
+    def put(i):
+        try:
+            archive.put("100004", f"{i}.pdf", b"%PDF same bytes")
+        except Exception as e:  # noqa: BLE001 - any failure is the bug
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(archive) == 16
+    assert archive._conn().execute("SELECT refs FROM objects").fetchone()["refs"] == 16
+
+
+def test_retention_moves_old_letters_cold(tmp_path):
+    archive = SanctionArchive(str(tmp_path / "hot"), cold_dir=str(tmp_path / "cold"))
+    old = archive.put("100004", "old.pdf", b"%PDF old", created_at=1_000)
+    new = archive.put("100004", "new.pdf", b"%PDF new")
+    assert archive.apply_retention(30) == 1
+    assert [r["file_name"] for r in archive.find("100004")] == ["new.pdf", "old.pdf"]
+    assert archive.get(old["letter_id"]) == ("old.pdf", b"%PDF old")
+    assert "cold" in archive.find("100004")[1]["path"]
+    assert archive.get(new["letter_id"]) == ("new.pdf", b"%PDF new")
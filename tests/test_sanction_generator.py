@@ -0,0 +1,44 @@
+import re
+import zlib
+
+import sanction_generator
+
+CUSTOMER = {"cid": "100002", "name": "Rahul"}
+KYC = {"id_number": "ABCDE1234F", "dob": "01-01-1999", "income": 51000, "employment": "Salaried",
+       "rate": 10.75, "product_label": "Home Loan"}
+
+
+def text_ops(pdf_bytes):
+    stream = re.search(rb"stream\r?\n(.*?)\r?\nendstream", pdf_bytes, re.S).group(1)
+    # positioned text only; font switches are emitted differently but to the same effect
+    return sorted(re.findall(rb"BT [\d.]+ [\d.]+ Td .*? Tj ET", zlib.decompress(stream), re.S))
+
+
+def redraw(fields):
+    # the layout drawn cell by cell, as before the base document existed
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for op in sanction_generator._LAYOUT:
+        if op[0] == "font":
+            pdf.set_font(*op[1])
+        elif op[0] == "ln":
+            pdf.ln(op[1])
+        else:
+            (w, h, text), kwargs = op[1], op[2]
+            pdf.cell(w, h, text.format(**fields), **kwargs)
+    return bytes(pdf.output())
+
+
+def test_template_places_text_like_a_full_redraw():
+    letter = sanction_generator.render_sanction_pdf(CUSTOMER, KYC, 2_500_000, 240, 24_000)
+    fields = sanction_generator._letter_fields(CUSTOMER, KYC, 2_500_000, 240, 24_000)
+    assert text_ops(letter) == text_ops(redraw(fields))
+
+
+def test_letters_do_not_share_fields():
+    first = sanction_generator.render_sanction_pdf(CUSTOMER, KYC, 100_000, 12, 9_000)
+    second = sanction_generator.render_sanction_pdf({"cid": "100004", "name": "Manish"}, KYC, 100_000, 12, 9_000)
+    assert b"Rahul" in zlib.decompress(re.search(rb"stream\r?\n(.*?)\r?\nendstream", first, re.S).group(1))
+    assert b"Rahul" not in zlib.decompress(re.search(rb"stream\r?\n(.*?)\r?\nendstream", second, re.S).group(1))
@@ -0,0 +1,46 @@
+import sanction_archive
+from sanction_jobs import SanctionQueue
+
+CUSTOMER = {"cid": "100004", "name": "Manish"}
+KYC = {"id_number": "ABCDE1234F", "dob": "01-01-1997", "income": 62000, "employment": "Salaried", "rate": 10.5}
+
+
+def test_process_workers_archive_under_the_parent_settings(data_dir):
+    queue = SanctionQueue(max_workers=1, use_processes=True)
+    try:
+        job = queue.submit(CUSTOMER, KYC, 100000, 24, 4600)
+        file_name, letter_id, pdf_bytes = job.result(timeout=60)
+    finally:
+        queue.shutdown()
+    assert pdf_bytes is None  # the letter is only in the archive
+    archive = sanction_archive.SanctionArchive(str(data_dir / "sanctions"))
+    assert [r["file_name"] for r in archive.find("100004")] == [file_name]
+    name, data = archive.get(letter_id)
+    assert name == file_name and data.startswith(b"%PDF")
+
+
+def test_failed_render_is_reported(data_dir):
+    queue = SanctionQueue(max_workers=1, retries=0, use_processes=False)
+    try:
+        job = queue.submit(CUSTOMER, KYC, "not a number", 24, 4600)
+        job._future.exception(timeout=10)
+        assert job.status() == "failed"
+    finally:
+        queue.shutdown()
+
+
+def test_agent_keeps_a_reference_and_loads_the_letter(data_dir):
+    import sanction_jobs
+    from chatbot import MasterAgent
+    sanction_jobs._default_queue = SanctionQueue(max_workers=1, use_processes=False)
+    agent = MasterAgent("100004")
+    agent.start_chat()
+    for message in ("apply loan", "100000", "24", "Manish Rao", "01-01-1997", "ABCDE1234F", "62000",
+                    "salaried", "0", "yes"):
+        agent.reply(message)
+    agent.sanction_job._future.result(timeout=30)
+    assert agent.poll_sanction() == "done"
+    file_name, letter_id = agent.last_sanction
+    restored = MasterAgent.from_bytes(agent.to_bytes())
+    name, pdf_bytes = restored.sanction_letter()
+    assert name == file_name and pdf_bytes.startswith(b"%PDF")
@@ -0,0 +1,85 @@
+import struct
+
+import pytest
+
+from chatbot import MasterAgent
+from session_store import (FORMAT_VERSION, decode_agent, decode_session, encode_agent, encode_session,
+                           open_session_store)
+
+
+def test_agent_round_trip_with_named_state_and_extra_fields():
+    temp = {"loan_amount": 2_500_000.0, "tenure": 240, "application_id": "abc", "product": "home",
+            "property_value": 4_000_000.0, "salary_verified": "verified"}
+    blob = encode_agent("100004", "home:ask_name", temp, ("sanction_100004.pdf", 42))
+    fields, end = decode_agent(blob)
+    assert end == len(blob)
+    assert fields == {"cid": "100004", "state": "home:ask_name", "temp": temp,
+                      "last_sanction": ("sanction_100004.pdf", 42)}
+
+
+def test_letter_is_referenced_not_embedded():
+    blob = encode_agent("100004", "idle", {}, ("sanction_100004.pdf", 7))
+    assert len(blob) < 64
+
+
+def test_version_1_blobs_still_load_without_the_letter():
+    v2 = encode_agent("100004", "idle", {"tenure": 12})
+    pdf = b"%PDF" + b"x" * 1000
+    name = b"old.pdf"
+    v1 = (bytes([1]) + v2[1:-1] + b"\x01" + struct.pack("<H", len(name)) + name
+          + struct.pack("<I", len(pdf)) + pdf)
+    fields, end = decode_agent(v1)
+    assert end == len(v1) and fields["temp"] == {"tenure": 12} and fields["last_sanction"] is None
+
+
+def test_unknown_version_is_refused():
+    blob = encode_agent("100004", "idle", {})
+    with pytest.raises(ValueError):
+        decode_agent(bytes([FORMAT_VERSION + 1]) + blob[1:])
+
+
+def test_session_round_trip():
+    history = [("bot", "Hello"), ("user", "apply loan")]
+    agent_blob, restored = decode_session(encode_session(encode_agent("100001", "ask_amount", {}), history))
+    assert restored == history and decode_agent(agent_blob)[0]["state"] == "ask_amount"
+
+
+@pytest.mark.parametrize("spec", ["memory", "file:{dir}/s", "sqlite:{dir}/s.db"])
+def test_stores_put_if_absent(tmp_path, spec):
+    store = open_session_store(spec.format(dir=tmp_path))
+    assert store.add("k", b"1") and not store.add("k", b"2")
+    assert store.get("k") == b"1"
+    store.put("k", b"3")
+    assert store.get("k") == b"3"
+    store.delete("k")
+    assert store.get("k") is None
+
+
+def test_salary_slip_never_reaches_the_session(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    for message in ("apply home loan", "2530000", "360", "4000000", "Harini Rao", "01-01-1995", "ABCDE1234F",
+                    "42000", "salaried", "0"):
+        agent.reply(message)
+    slip = b"Net Pay: 42000 " + b"padding " * 500
+    agent.process_salary_upload(slip, "slip.txt")
+    assert agent.state == "confirm"
+    assert b"padding" not in agent.to_bytes()
+
+
+def test_version_2_blobs_still_load():
+    name = "Asha Rao".encode("utf-8")
+    v2 = (struct.pack("<BBH", 2, 3, 1 << 2) + struct.pack("<H", 6) + b"100004"
+          + struct.pack("<H", len(name)) + name + b"\x00")
+    fields, end = decode_agent(v2)
+    assert end == len(v2) and fields["state"] == "ask_name" and fields["temp"] == {"full_name": "Asha Rao"}
+
+
+def test_long_answers_fit_in_the_session(data_dir):
+    agent = MasterAgent("100001")
+    agent.start_chat()
+    for message in ("apply loan", "50000", "24", "a" * 70_000):
+        agent.reply(message)
+    assert agent.state == "ask_dob"
+    restored = MasterAgent.from_bytes(agent.to_bytes())
+    assert restored.temp["full_name"] == "A" + "a" * 69_999
@@ -0,0 +1,92 @@
+"""Cache of salary-slip verification results keyed by document hash + customer.
+
+Memory tier: LRU with TTL. Optional disk tier: a SQLite table that survives
+restarts and doubles as a record of what was extracted from each document.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def slip_key(file_bytes, cid):
+    """Cache key for one uploaded document and customer."""
+    digest = hashlib.blake2b(file_bytes or b"", digest_size=16).hexdigest()
+    return f"{cid}:{digest}"
+
+
+class VerificationCache:
+    def __init__(self, max_entries=10_000, ttl=24 * 3600, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._local = threading.local()
+        if disk_path:
+            with self._conn() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS verifications ("
+                    "key TEXT PRIMARY KEY, cid TEXT, stored_at REAL, value TEXT)"
+                )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                if now - hit[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return hit[1]
+                del self._entries[key]
+        if not self.disk_path:
+            return None
+        row = self._conn().execute(
+            "SELECT stored_at, value FROM verifications WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[0] > self.ttl:
+            return None
+        value = json.loads(row[1])
+        self._remember(key, row[0], value)
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        self._remember(key, now, value)
+        if self.disk_path:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO verifications (key, cid, stored_at, value) VALUES (?, ?, ?, ?)",
+                    (key, key.split(":", 1)[0], now, json.dumps(value)),
+                )
+
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self):
+        """Drop expired entries from both tiers (disk rows are kept for
+        ``ttl`` only; export them first if a longer audit trail is needed)."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in [k for k, (t, _) in self._entries.items() if t < cutoff]:
+                del self._entries[key]
+        if self.disk_path:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM verifications WHERE stored_at < ?", (cutoff,))
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,4 +1,5 @@
 let chatBox = document.getElementById("chat-box");
+let sessionId = sessionStorage.getItem("sessionId");
 
 function addMessage(message, sender) {
     let msgDiv = document.createElement("div");
@@ -8,7 +9,92 @@ function addMessage(message, sender) {
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
-function sendMessage() {
+function showError(message) {
+    document.getElementById("error").textContent = message || "";
+    document.getElementById("notice").textContent = "";
+}
+
+async function api(path, options) {
+    let res = await fetch(path, options);
+    let data = await res.json();
+    if (!res.ok) {
+        throw new Error(data.error || res.statusText);
+    }
+    return data;
+}
+
+function postJson(path, body) {
+    return api(path, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body)
+    });
+}
+
+function showChat(loggedIn) {
+    document.getElementById("login-panel").classList.toggle("hidden", loggedIn);
+    document.getElementById("signup-panel").classList.add("hidden");
+    document.getElementById("chat-panel").classList.toggle("hidden", !loggedIn);
+}
+
+function showSignup(visible) {
+    showError("");
+    document.getElementById("login-panel").classList.toggle("hidden", visible);
+    document.getElementById("signup-panel").classList.toggle("hidden", !visible);
+}
+
+// Apply the state returned with every bot turn
+function handleTurn(data) {
+    addMessage(data.reply, "bot");
+    document.getElementById("upload-container").classList.toggle("hidden", !data.awaiting_upload);
+    if (data.sanction === "pending" || data.sanction === "ready") {
+        pollSanction();
+    }
+}
+
+async function login() {
+    showError("");
+    try {
+        let data = await postJson("/api/login", {
+            customer_id: document.getElementById("login-cid").value.trim(),
+            password: document.getElementById("login-pwd").value
+        });
+        sessionId = data.session_id;
+        sessionStorage.setItem("sessionId", sessionId);
+        chatBox.innerHTML = "";
+        showChat(true);
+        handleTurn(data);
+    } catch (err) {
+        showError(err.message);
+    }
+}
+
+async function signup() {
+    showError("");
+    let name = document.getElementById("su-name").value.trim();
+    let password = document.getElementById("su-pwd").value;
+    if (!name || !password) {
+        showError("Enter name and password");
+        return;
+    }
+    try {
+        let data = await postJson("/api/signup", {
+            name: name,
+            password: password,
+            income: document.getElementById("su-income").value || 0,
+            age: document.getElementById("su-age").value || 18,
+            employment: document.getElementById("su-emp").value
+        });
+        document.getElementById("login-cid").value = data.customer_id;
+        document.getElementById("login-pwd").value = "";
+        showSignup(false);
+        document.getElementById("notice").textContent = "Account created successfully! Customer ID: " + data.customer_id;
+    } catch (err) {
+        showError(err.message);
+    }
+}
+
+async function sendMessage() {
     let input = document.getElementById("user-input");
     let text = input.value.trim();
 
@@ -17,9 +103,72 @@ function sendMessage() {
     addMessage(text, "user");
     input.value = "";
 
-    // Dummy bot response
-    setTimeout(() => {
-        addMessage("Thanks! Your message was: " + text, "bot");
-    }, 500);
+    // One ID per send: a retry after a dropped connection is answered once
+    let body = { session_id: sessionId, message: text, submission_id: newSubmissionId() };
+    try {
+        let data;
+        try {
+            data = await postJson("/api/chat", body);
+        } catch (err) {
+            if (!(err instanceof TypeError)) throw err;  // HTTP errors are not retried
+            data = await postJson("/api/chat", body);
+        }
+        handleTurn(data);
+    } catch (err) {
+        showError(err.message);
+    }
+}
+
+function newSubmissionId() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+async function uploadSalarySlip() {
+    let file = document.getElementById("salary-file").files[0];
+    if (!file) return;
+    let url = "/api/upload?session_id=" + encodeURIComponent(sessionId) +
+              "&filename=" + encodeURIComponent(file.name);
+    try {
+        // Raw body: the server streams it in chunks instead of parsing multipart
+        handleTurn(await api(url, { method: "POST", body: file }));
+    } catch (err) {
+        showError(err.message);
+    }
+}
+
+// Letters render in the background; poll until the PDF is ready
+async function pollSanction() {
+    let url = "/api/sanction?session_id=" + encodeURIComponent(sessionId);
+    let res = await fetch(url, { method: "GET" });
+    if (res.status === 202) {
+        setTimeout(pollSanction, 500);
+        return;
+    }
+    if (!res.ok) return;
+    let blob = await res.blob();
+    let link = document.getElementById("download-link");
+    let match = /filename="([^"]+)"/.exec(res.headers.get("Content-Disposition") || "");
+    link.href = URL.createObjectURL(blob);
+    link.download = match ? match[1] : "sanction.pdf";
+    document.getElementById("download-container").classList.remove("hidden");
 }
 
+async function logout() {
+    try {
+        await postJson("/api/logout", { session_id: sessionId });
+    } catch (err) {
+        // session already gone
+    }
+    sessionId = null;
+    sessionStorage.removeItem("sessionId");
+    chatBox.innerHTML = "";
+    document.getElementById("download-container").classList.add("hidden");
+    showChat(false);
+}
+
+document.getElementById("user-input").addEventListener("keydown", (e) => {
+    if (e.key === "Enter") sendMessage();
+});
+
+showChat(Boolean(sessionId));